@@ -0,0 +1,230 @@
+"""
+Bulk catalog ingestion.
+
+Fingerprints many audio files on a process pool and writes them through a single
+writer in large transactions.
+
+Usage:
+    python -m audio_fingerprint.bulk_ingest music.db path/to/audio_dir
+    python -m audio_fingerprint.bulk_ingest music.db manifest.csv --workers 8 --rebuild-index
+
+A directory is scanned recursively for audio files named "Artist1, Artist2 - Title.ext"
+(the layout produced by the server's downloader); files without " - " get the stem as
+title and no artists. A manifest is a CSV with columns path,name,artists (artists
+separated by ";") or a JSON-lines file with the same keys (artists as a list).
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from audio_fingerprint.database import Database
+from audio_fingerprint.fingerprint import HASH_MODES
+from audio_fingerprint.fingerprint_extracter import (DEFAULT_SAMPLE_RATE, ExtractionParams, FingerprintExtracter,
+                                                     extraction_settings)
+from audio_fingerprint.segments import SegmentedDatabase
+from audio_fingerprint.sharding import ShardedDatabase, open_database
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".flac", ".ogg", ".m4a", ".aac", ".opus"}
+
+
+class Track(NamedTuple):
+    path: str
+    name: str
+    artists: List[str]
+
+
+class IngestReport(NamedTuple):
+    songs: int
+    fingerprints: int
+    failures: List[Tuple[str, str]]
+    seconds: float
+
+    @property
+    def songs_per_second(self) -> float:
+        return self.songs / self.seconds if self.seconds > 0 else 0.0
+
+
+def track_from_filename(path: Path) -> Track:
+    """Derive (name, artists) from an "Artist1, Artist2 - Title" file name."""
+    stem = path.stem
+    if " - " in stem:
+        artists, name = stem.split(" - ", 1)
+        return Track(str(path), name.strip(), [a.strip() for a in artists.split(",") if a.strip()])
+    return Track(str(path), stem, [])
+
+
+def scan_directory(directory: str | Path) -> Iterator[Track]:
+    for path in sorted(Path(directory).rglob("*")):
+        if path.is_file() and path.suffix.lower() in AUDIO_EXTENSIONS:
+            yield track_from_filename(path)
+
+
+def read_manifest(manifest: str | Path) -> Iterator[Track]:
+    manifest = Path(manifest)
+    base = manifest.parent
+    with open(manifest, newline="", encoding="utf-8") as f:
+        if manifest.suffix.lower() in (".jsonl", ".json"):
+            entries: Iterable[Dict] = (json.loads(line) for line in f if line.strip())
+        else:
+            entries = csv.DictReader(f)
+        for entry in entries:
+            artists = entry.get("artists") or []
+            if isinstance(artists, str):
+                artists = [a.strip() for a in artists.split(";") if a.strip()]
+            path = Path(entry["path"])
+            if not path.is_absolute():
+                path = base / path
+            yield Track(str(path), entry["name"], list(artists))
+
+
+def collect_tracks(source: str | Path) -> Iterator[Track]:
+    """Tracks from a directory or a manifest file."""
+    return scan_directory(source) if Path(source).is_dir() else read_manifest(source)
+
+
+# Each worker process keeps its own extracter so windows and filterbanks are built once.
+_worker_extracter: Optional[FingerprintExtracter] = None
+
+
+def _init_worker(hash_mode: str, sample_rate: int, params: Optional[ExtractionParams]) -> None:
+    global _worker_extracter
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker_extracter = FingerprintExtracter(hash_mode=hash_mode, sample_rate=sample_rate, params=params)
+
+
+def _fingerprint_file(path: str) -> np.ndarray:
+    assert _worker_extracter is not None
+    return _worker_extracter.from_file(path)
+
+
+def ingest(db: Database | ShardedDatabase | SegmentedDatabase, tracks: Iterable[Track], workers: int | None = None,
+           batch_songs: int = 200, rebuild_index: bool = False,
+           sample_rate: int = DEFAULT_SAMPLE_RATE, params: ExtractionParams | None = None) -> IngestReport:
+    """
+    Fingerprint tracks in parallel and store them with one writer.
+
+    Args:
+        db (Database | ShardedDatabase | SegmentedDatabase): Target catalog; only this process writes to it.
+        tracks (Iterable[Track]): Files and metadata to ingest.
+        workers (int | None): Size of the process pool (defaults to the CPU count).
+        batch_songs (int): Songs written per transaction.
+        rebuild_index (bool): Drop idx_hash (and idx_song_id, if built) before loading and
+                              rebuild them afterwards.
+        sample_rate (int): Analysis sample rate; query with the same rate.
+        params (ExtractionParams | None): Extraction parameters; query with the same ones.
+    """
+    db.check_extraction_settings(extraction_settings(sample_rate, params))
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    failures: List[Tuple[str, str]] = []
+    songs = fingerprints = 0
+    pending_writes: List[Tuple[Track, np.ndarray]] = []
+
+    def flush() -> None:
+        nonlocal songs, fingerprints
+        with db.transaction():
+            for track, fps in pending_writes:
+                song_id = db.add_song(track.name, track.artists)
+                db.add_fingerprints(fps, song_id)
+                songs += 1
+                fingerprints += len(fps)
+        pending_writes.clear()
+        logger.info("Committed %d songs (%d fingerprints)", songs, fingerprints)
+
+    start = time.perf_counter()
+    if rebuild_index:
+        db.drop_hash_index()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(db.hash_mode, sample_rate, params)) as pool:
+            in_flight: Dict[Future, Track] = {}
+            track_iter = iter(tracks)
+            exhausted = False
+            while in_flight or not exhausted:
+                # Keep a bounded number of files in flight so results don't pile up in memory.
+                while not exhausted and len(in_flight) < max_in_flight:
+                    track = next(track_iter, None)
+                    if track is None:
+                        exhausted = True
+                        break
+                    in_flight[pool.submit(_fingerprint_file, track.path)] = track
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    track = in_flight.pop(future)
+                    try:
+                        fps = future.result()
+                    except Exception as e:
+                        logger.warning("Failed to fingerprint %s: %s", track.path, e)
+                        failures.append((track.path, str(e)))
+                        continue
+                    if len(fps) == 0:
+                        failures.append((track.path, "no fingerprints generated"))
+                        continue
+                    pending_writes.append((track, fps))
+                if len(pending_writes) >= batch_songs:
+                    flush()
+        if pending_writes:
+            flush()
+    finally:
+        if rebuild_index:
+            logger.info("Rebuilding fingerprint indexes")
+            db.create_hash_index()
+
+    return IngestReport(songs, fingerprints, failures, time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fingerprint and store many audio files at once.")
+    parser.add_argument("db", help="Catalog to write to (music.db or a sharded catalog directory)")
+    parser.add_argument("source", help="Directory of audio files or a CSV/JSON-lines manifest")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--batch-songs", type=int, default=200, help="Songs per write transaction")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Drop the fingerprint indexes during the load and rebuild them at the end")
+    parser.add_argument("--hash-mode", choices=HASH_MODES, default=None,
+                        help="Hash mode for a new catalog (an existing one keeps its own)")
+    parser.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE,
+                        help="Analysis sample rate audio is resampled to (queries must use the same)")
+    parser.add_argument("--params", default=None,
+                        help="JSON file of extraction parameters, e.g. from benchmarks.sweep "
+                             "(queries must use the same)")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="Treat db as a sharded catalog directory with this many shards")
+    parser.add_argument("--segmented", action="store_true",
+                        help="Treat db as a segmented catalog directory (created if missing)")
+    args = parser.parse_args()
+
+    if args.shards:
+        db = ShardedDatabase(args.db, n_shards=args.shards, hash_mode=args.hash_mode)
+    elif args.segmented:
+        db = SegmentedDatabase(args.db, hash_mode=args.hash_mode)
+    else:
+        db = open_database(args.db, hash_mode=args.hash_mode, readonly=False)
+    report = ingest(db, collect_tracks(args.source), workers=args.workers,
+                    batch_songs=args.batch_songs, rebuild_index=args.rebuild_index,
+                    sample_rate=args.sample_rate,
+                    params=ExtractionParams.load(args.params) if args.params else None)
+    db.close()
+
+    print(f"Ingested {report.songs} songs / {report.fingerprints} fingerprints "
+          f"in {report.seconds:.1f}s ({report.songs_per_second:.2f} songs/sec)")
+    for path, error in report.failures:
+        print(f"  failed: {path}: {error}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,67 +1,390 @@
 import json
+import logging
+import os
 import sqlite3
-from typing import List, Tuple, Dict
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, List, NamedTuple, Sequence, Tuple, Dict
+import numpy as np
+from audio_fingerprint.fingerprint import HASH_MODE_PACKED, HASH_MODE_SHA1, HASH_MODES, fingerprint_dtype
+
+logger = logging.getLogger(__name__)
+
+# SQLite caps the number of host parameters per statement (999 on older builds).
+MAX_SQL_VARIABLES = 900
+
+# Default number of rows per block yielded by Database.iter_fingerprints / iter_songs.
+EXPORT_BLOCK_SIZE = 100_000
+
+# Column type used for the fingerprints.hash column in each hash mode.
+HASH_COLUMN_TYPES = {HASH_MODE_SHA1: "TEXT", HASH_MODE_PACKED: "INTEGER"}
+
+# Columns of the song rows returned by Database (see Database._song_row).
+SONG_COLUMNS = "song_id, name, artists, youtube_url, youtube_url_updated_at, youtube_url_retry_at"
+
+# Columns added to `songs` after the original schema; older catalogs get them on open.
+SONG_COLUMN_MIGRATIONS = {
+    "youtube_url": "TEXT",
+    # Unix time at which youtube_url was resolved.
+    "youtube_url_updated_at": "REAL",
+    # Unix time before which a failed lookup is not retried.
+    "youtube_url_retry_at": "REAL",
+}
+
+# Catalogs already warned about by Database.check_extraction_settings.
+_UNCHECKED_CATALOGS: set = set()
+
+
+class FingerprintBlock(NamedTuple):
+    """
+    A block of exported fingerprint rows: `fingerprints` has the fingerprint_dtype of the
+    catalog's hash mode (the layout add_fingerprints accepts), `song_ids` is aligned with it.
+    """
+    song_ids: np.ndarray
+    fingerprints: np.ndarray
+
 
 class Database:
-    def __init__(self, db_name="music.db"):
+    def __init__(self, db_name="music.db", hash_mode: str | None = None, wal: bool = False,
+                 create_tables: bool = True, check_same_thread: bool = True, timeout: float = 30.0,
+                 stop_df: int | None = None, readonly: bool = False):
+        """
+        Args:
+            db_name (str): Path of the SQLite file.
+            hash_mode (str | None): Hash mode for a new catalog ("sha1" or "packed").
+                                    An existing catalog keeps the mode of its schema; passing
+                                    a conflicting mode raises ValueError.
+            wal (bool): Switch the file to write-ahead logging so readers never block on,
+                        and never block, a concurrent writer.
+            create_tables (bool): Run the schema DDL. Connections opened after the schema
+                                  exists (e.g. by DatabasePool) can skip it.
+            check_same_thread (bool): Passed to sqlite3.connect.
+            timeout (float): Seconds to wait for a lock held by another connection.
+            stop_df (int | None): Stop-hash threshold. Hashes found in more than this many songs
+                                  are no longer stored for new songs, and recognizers built on
+                                  this catalog ignore them in queries. None keeps every hash.
+            readonly (bool): Open an existing file with SQLite's mode=ro; implies
+                             create_tables=False and no WAL switch.
+        """
+        if hash_mode is not None and hash_mode not in HASH_MODES:
+            raise ValueError(f"Unknown hash_mode {hash_mode!r}, expected one of {HASH_MODES}")
         self.db_name = db_name
-        self.conn = sqlite3.connect(db_name)
+        self.stop_df = stop_df
+        self.readonly = readonly
+        if readonly:
+            self.conn = sqlite3.connect(f"{Path(db_name).resolve().as_uri()}?mode=ro", uri=True,
+                                        timeout=timeout, check_same_thread=check_same_thread)
+        else:
+            self.conn = sqlite3.connect(db_name, timeout=timeout, check_same_thread=check_same_thread)
         self.cursor = self.conn.cursor()
-        self._create_tables()
+        self._in_transaction = False
+        # Set when drop_hash_index dropped idx_song_id, so create_hash_index restores it.
+        self._rebuild_song_index = False
+
+        if wal and not readonly:
+            self.conn.execute("PRAGMA journal_mode=WAL;")
+            self.conn.execute("PRAGMA synchronous=NORMAL;")
+
+        existing_mode = self._detect_hash_mode()
+        if existing_mode and hash_mode and existing_mode != hash_mode:
+            raise ValueError(f"{db_name} stores {existing_mode} hashes, not {hash_mode}")
+        self.hash_mode = existing_mode or hash_mode or HASH_MODE_SHA1
+        if create_tables and not readonly:
+            self._create_tables()
+
+    def close(self):
+        self.conn.close()
+
+    def _detect_hash_mode(self) -> str | None:
+        """Infer the hash mode from the declared type of an existing fingerprints.hash column."""
+        columns = self.conn.execute("PRAGMA table_info(fingerprints)").fetchall()
+        for _, name, col_type, *_ in columns:
+            if name == "hash":
+                return HASH_MODE_PACKED if col_type.upper() == "INTEGER" else HASH_MODE_SHA1
+        return None
 
     def _execute(self, query, params=None):
         if params:
             self.cursor.execute(query, params)
         else:
             self.cursor.execute(query)
-        self.conn.commit()
+        if not self._in_transaction:
+            self.conn.commit()
         return self.cursor
 
 
+    def _query(self, query, params=None):
+        """Run a read-only statement; unlike _execute it never commits."""
+        if params:
+            self.cursor.execute(query, params)
+        else:
+            self.cursor.execute(query)
+        return self.cursor
+
     def _executemany(self, query, data):
         self.cursor.executemany(query, data)
-        self.conn.commit()
+        if not self._in_transaction:
+            self.conn.commit()
         return self.cursor
 
+    @contextmanager
+    def transaction(self) -> Iterator["Database"]:
+        """
+        Group writes into a single transaction: commit once on exit, roll back on error.
+        """
+        if self._in_transaction:
+            yield self
+            return
+        self._in_transaction = True
+        try:
+            yield self
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+
+    def drop_hash_index(self):
+        """
+        Drop idx_hash, and idx_song_id if it was built, e.g. to speed up a large bulk load.
+        create_hash_index rebuilds both.
+        """
+        if self._has_index("idx_song_id"):
+            self._execute("DROP INDEX idx_song_id;")
+            self._rebuild_song_index = True
+        self._execute("DROP INDEX IF EXISTS idx_hash;")
+
+    def create_hash_index(self):
+        self._execute("CREATE INDEX IF NOT EXISTS idx_hash ON fingerprints (hash);")
+        if self._rebuild_song_index:
+            self.create_song_index()
+            self._rebuild_song_index = False
+
+    def create_song_index(self):
+        """
+        Build idx_song_id, which lets by-song reads seek instead of sorting the table. It is
+        built on first use (see iter_fingerprints) rather than when a catalog is opened,
+        because on a large catalog that takes a while.
+        """
+        self._execute("CREATE INDEX IF NOT EXISTS idx_song_id ON fingerprints (song_id);")
+
+    def _has_index(self, name: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone() is not None
+
 
     def _create_tables(self):
         self._execute("""
             CREATE TABLE IF NOT EXISTS songs (
                 song_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
-                artists TEXT NOT NULL
+                artists TEXT NOT NULL,
+                youtube_url TEXT,
+                youtube_url_updated_at REAL,
+                youtube_url_retry_at REAL
             );
         """)
-        self._execute("""
+        self._migrate_song_columns()
+        self._execute(f"""
             CREATE TABLE IF NOT EXISTS fingerprints (
-                hash TEXT NOT NULL,
+                hash {HASH_COLUMN_TYPES[self.hash_mode]} NOT NULL,
                 song_id INTEGER NOT NULL,
                 anchor_time INTEGER NOT NULL,
                 FOREIGN KEY(song_id) REFERENCES songs(song_id)
             );
         """)
-        self._execute("CREATE INDEX IF NOT EXISTS idx_hash ON fingerprints (hash);")
+        self.create_hash_index()
 
-    def add_song(self, song_name: str, artists: list):
-        self.cursor = self._execute("INSERT INTO songs (name, artists) VALUES (?, ?)", (song_name, json.dumps(artists)))
-    
-    def add_fingerprints(self, fingerprints: List[Tuple[str, int]], song_id: int):
-        data = [(h, song_id, t) for h, t in fingerprints]
-        self._executemany("INSERT INTO fingerprints (hash, song_id, anchor_time) VALUES (?, ?, ?)", data)
+        # Document frequency of every hash: the number of songs it occurs in.
+        has_stats = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'hash_stats'").fetchone()
+        self._execute(f"""
+            CREATE TABLE IF NOT EXISTS hash_stats (
+                hash {HASH_COLUMN_TYPES[self.hash_mode]} PRIMARY KEY,
+                df INTEGER NOT NULL
+            );
+        """)
+        if not has_stats:
+            self.rebuild_hash_stats()
+
+        # Catalog-wide settings as JSON values, e.g. the extraction settings it was built with.
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS catalog_info (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+    def rebuild_hash_stats(self):
+        """Recompute hash_stats from the fingerprints table (e.g. after songs were deleted)."""
+        with self.transaction():
+            self._execute("DELETE FROM hash_stats;")
+            self._execute("""
+                INSERT INTO hash_stats (hash, df)
+                SELECT hash, COUNT(DISTINCT song_id) FROM fingerprints GROUP BY hash;
+            """)
+
+    def extraction_settings(self) -> Dict[str, Any]:
+        """Settings recorded by check_extraction_settings (empty for catalogs that predate them)."""
+        try:
+            rows = self._query("SELECT key, value FROM catalog_info").fetchall()
+        except sqlite3.OperationalError:  # opened with create_tables=False on an older catalog
+            return {}
+        return {key: json.loads(value) for key, value in rows}
+
+    def check_extraction_settings(self, settings: Dict[str, Any]) -> None:
+        """
+        Check that fingerprints extracted with `settings` (see
+        FingerprintExtracter.settings) are comparable with the ones stored here.
+
+        A new catalog records the settings it is first used with. Raises ValueError if a
+        recorded setting differs. Catalogs filled before settings were recorded cannot be
+        checked; that is logged once per catalog.
+        """
+        settings = json.loads(json.dumps(settings))  # tuples become lists, as when stored
+        recorded = self.extraction_settings()
+        missing = [key for key in settings if key not in recorded]
+        if missing and self.song_count() == 0:
+            try:
+                with self.transaction():
+                    # OR IGNORE: if another process recorded first, its settings win below.
+                    self._executemany("INSERT OR IGNORE INTO catalog_info (key, value) VALUES (?, ?)",
+                                      [(key, json.dumps(settings[key], sort_keys=True)) for key in missing])
+                recorded = self.extraction_settings()
+            except sqlite3.OperationalError as e:  # read-only file or schema
+                logger.debug("Could not record extraction settings in %s: %s", self.db_name, e)
+            missing = [key for key in settings if key not in recorded]
+
+        for key, value in settings.items():
+            if key in recorded and recorded[key] != value:
+                raise ValueError(f"{self.db_name} was fingerprinted with {key}={recorded[key]!r}, "
+                                 f"not {value!r}")
+        if missing and self.db_name not in _UNCHECKED_CATALOGS:
+            _UNCHECKED_CATALOGS.add(self.db_name)
+            logger.warning("%s does not record its %s; cannot check them against this extracter",
+                           self.db_name, ", ".join(sorted(missing)))
+
+    def _migrate_song_columns(self):
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(songs)").fetchall()}
+        for name, col_type in SONG_COLUMN_MIGRATIONS.items():
+            if name not in existing:
+                self._execute(f"ALTER TABLE songs ADD COLUMN {name} {col_type};")
 
-    def get_song_by_id(self, song_id: int) ->  Dict[str, list]:
+    def add_song(self, song_name: str, artists: list, youtube_url: str | None = None) -> int:
+        """Insert song metadata (and the video it was ingested from, if known) and return the new song_id."""
         self.cursor = self._execute(
-           "SELECT name, artists FROM songs WHERE song_id = ?",
+            "INSERT INTO songs (name, artists, youtube_url, youtube_url_updated_at) VALUES (?, ?, ?, ?)",
+            (song_name, json.dumps(artists), youtube_url, time.time() if youtube_url else None),
+        )
+        return self.cursor.lastrowid
+
+    def set_youtube_url(self, song_id: int, youtube_url: str):
+        """Store a freshly resolved video URL for a song."""
+        self._execute(
+            "UPDATE songs SET youtube_url = ?, youtube_url_updated_at = ?, youtube_url_retry_at = NULL "
+            "WHERE song_id = ?",
+            (youtube_url, time.time(), song_id),
+        )
+
+    def defer_youtube_lookup(self, song_id: int, retry_at: float):
+        """Record a failed or empty lookup: the song's URL is left as is and not retried before retry_at."""
+        self._execute("UPDATE songs SET youtube_url_retry_at = ? WHERE song_id = ?", (retry_at, song_id))
+
+    def get_stale_youtube_urls(self, max_age: float, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Songs whose video URL is missing or older than max_age seconds, oldest first,
+        skipping those whose last failed lookup is still backing off.
+        """
+        now = time.time()
+        self.cursor = self._query(
+            f"""
+            SELECT {SONG_COLUMNS} FROM songs
+            WHERE (youtube_url_updated_at IS NULL OR youtube_url_updated_at < ?)
+              AND (youtube_url_retry_at IS NULL OR youtube_url_retry_at <= ?)
+            ORDER BY COALESCE(youtube_url_updated_at, 0) LIMIT ?
+            """,
+            (now - max_age, now, limit),
+        )
+        return [self._song_row(row) for row in self.cursor.fetchall()]
+
+    @staticmethod
+    def _song_row(row) -> Dict[str, Any]:
+        song_id, name, artists, youtube_url, updated_at, retry_at = row
+        return {"song_id": song_id, "name": name, "artists": artists,
+                "youtube_url": youtube_url, "youtube_url_updated_at": updated_at,
+                "youtube_url_retry_at": retry_at}
+    
+    def add_fingerprints(self, fingerprints: np.ndarray | List[Tuple[str | int, int]], song_id: int):
+        """
+        Store a song's fingerprints and count each distinct hash once in hash_stats.
+
+        With a stop_df threshold, postings of hashes that are (now) in more than stop_df
+        songs are not stored; their document frequency is still counted.
+        """
+        if not isinstance(fingerprints, np.ndarray):
+            fingerprints = np.array([tuple(fp) for fp in fingerprints], dtype=fingerprint_dtype(self.hash_mode))
+        if len(fingerprints) == 0:
+            return
+        distinct = np.unique(fingerprints["hash"])
+
+        with self.transaction():
+            self._executemany(
+                "INSERT INTO hash_stats (hash, df) VALUES (?, 1) ON CONFLICT(hash) DO UPDATE SET df = df + 1",
+                [(h,) for h in distinct.tolist()],
+            )
+            if self.stop_df is not None:
+                df = self.document_frequencies(distinct.tolist())
+                stop = distinct[df > self.stop_df]
+                if stop.size:
+                    fingerprints = fingerprints[~np.isin(fingerprints["hash"], stop)]
+            data = [(h, song_id, t) for h, t in fingerprints.tolist()]
+            self._executemany("INSERT INTO fingerprints (hash, song_id, anchor_time) VALUES (?, ?, ?)", data)
+
+    def document_frequencies(self, query_hashes: Sequence) -> np.ndarray:
+        """Number of songs containing each query hash (0 for unknown hashes), aligned with the input."""
+        position = {h: i for i, h in enumerate(query_hashes)}
+        df = np.zeros(len(query_hashes), dtype=np.int64)
+        keys = list(position)
+        for start in range(0, len(keys), MAX_SQL_VARIABLES):
+            chunk = keys[start:start + MAX_SQL_VARIABLES]
+            placeholders = ",".join("?" for _ in chunk)
+            self.cursor = self._query(f"SELECT hash, df FROM hash_stats WHERE hash IN ({placeholders})", chunk)
+            for hash_val, count in self.cursor.fetchall():
+                df[position[hash_val]] = count
+        return df
+
+    def song_count(self) -> int:
+        self.cursor = self._query("SELECT COUNT(*) FROM songs")
+        return self.cursor.fetchone()[0]
+
+    def prune_stop_hashes(self, max_df: int | None = None) -> int:
+        """
+        Delete the stored postings of every hash found in more than max_df songs
+        (default: this catalog's stop_df). Returns the number of postings removed.
+        """
+        max_df = self.stop_df if max_df is None else max_df
+        if max_df is None:
+            raise ValueError("No stop-hash threshold given")
+        cursor = self._execute(
+            "DELETE FROM fingerprints WHERE hash IN (SELECT hash FROM hash_stats WHERE df > ?)", (max_df,))
+        return cursor.rowcount
+
+    def get_song_by_id(self, song_id: int) ->  Dict[str, Any]:
+        self.cursor = self._query(
+           f"SELECT {SONG_COLUMNS} FROM songs WHERE song_id = ?",
            (song_id,),
         )
         row = self.cursor.fetchone()
         if row:
-           return {"name": row[0], "artists": row[1]}
+           return self._song_row(row)
         else:
            raise ValueError(f"Song not found by this id: {song_id}")
 
     def get_song_id(self, name: str, artists: list) -> int:
-        self.cursor = self._execute(
+        self.cursor = self._query(
            "SELECT song_id FROM songs WHERE name = ? AND artists = ?",
            (name, json.dumps(artists)),
         )
@@ -71,33 +394,113 @@ class Database:
         else:
            raise ValueError(f"Song not found: {name} by {artists}")
         
-    def get_all_fingerprint(self):
-        """Fetch all data from the fingerprints table."""
-        self.cursor = self._execute("SELECT * FROM fingerprints")
-        rows = self.cursor.fetchall()
-    
-        db_data = {}
-        for song_id, h, offset in rows:
-          if song_id not in db_data:
-            db_data[song_id] = []
-          db_data[song_id].append((h, offset))
+    def iter_fingerprints(self, block_size: int = EXPORT_BLOCK_SIZE,
+                          by_song: bool = False) -> Iterator[FingerprintBlock]:
+        """
+        Stream the fingerprints table as NumPy blocks, in constant memory.
 
-        return db_data
-    
-    def get_all_songs(self):
-        """Fetch all data from the fingerprints table."""
-        self.cursor = self._execute("SELECT * FROM songs")
-        rows = self.cursor.fetchall()
-    
-        db_data = {}
-        for song_id, h, offset in rows:
-          if song_id not in db_data:
-            db_data[song_id] = []
-          db_data[song_id].append((h, offset))
+        By default blocks hold up to `block_size` rows in insertion (rowid) order. With
+        by_song=True every block holds all the rows of one song, in song_id order; memory is
+        bounded by the larger of `block_size` and the biggest song. Either way rows are read
+        `block_size` at a time with keyset queries, so no read transaction stays open between
+        them and nothing is sorted in SQLite. The by-song order needs idx_song_id, which the
+        first by_song export builds (a read-only connection falls back to one sorted scan).
+        """
+        if block_size < 1:
+            raise ValueError("block_size must be >= 1")
+        if not by_song:
+            last_rowid = 0
+            while True:
+                rows = self.conn.execute(
+                    "SELECT rowid, hash, song_id, anchor_time FROM fingerprints "
+                    "WHERE rowid > ? ORDER BY rowid LIMIT ?", (last_rowid, block_size)).fetchall()
+                if not rows:
+                    return
+                last_rowid = rows[-1][0]
+                yield self._fingerprint_block([row[1:] for row in rows])
 
-        return db_data  
+        pending: List[FingerprintBlock] = []
+        for rows in self._song_ordered_rows(block_size):
+            block = self._fingerprint_block(rows)
+            # Runs of one song in this batch; the first may continue a song from the previous
+            # batch and the last may continue in the next one.
+            starts = np.flatnonzero(np.diff(block.song_ids)) + 1
+            for start, end in zip([0, *starts.tolist()], [*starts.tolist(), len(rows)]):
+                if pending and pending[-1].song_ids[0] != block.song_ids[start]:
+                    yield self._concat_blocks(pending)
+                    pending = []
+                pending.append(FingerprintBlock(block.song_ids[start:end], block.fingerprints[start:end]))
+        if pending:
+            yield self._concat_blocks(pending)
 
-    def find_matches(self, query_hashes: List[str]) -> Dict[int, Dict[str, List[int]]] | None:
+    def _song_ordered_rows(self, block_size: int) -> Iterator[List[Tuple]]:
+        """(hash, song_id, anchor_time) rows in (song_id, rowid) order, `block_size` at a time."""
+        if not self._has_index("idx_song_id") and not self.readonly:
+            logger.info("Building idx_song_id on %s", self.db_name)
+            self.create_song_index()
+        if not self._has_index("idx_song_id"):
+            logger.warning("%s has no idx_song_id and is open read-only; sorting the whole table", self.db_name)
+            cursor = self.conn.execute(
+                "SELECT hash, song_id, anchor_time FROM fingerprints ORDER BY song_id, rowid")
+            while True:
+                rows = cursor.fetchmany(block_size)
+                if not rows:
+                    return
+                yield rows
+
+        last_key = (0, 0)
+        while True:
+            rows = self.conn.execute(
+                "SELECT song_id, rowid, hash, song_id, anchor_time FROM fingerprints "
+                "WHERE (song_id, rowid) > (?, ?) ORDER BY song_id, rowid LIMIT ?",
+                (*last_key, block_size)).fetchall()
+            if not rows:
+                return
+            last_key = rows[-1][:2]
+            yield [row[2:] for row in rows]
+
+    def _fingerprint_block(self, rows: List[Tuple]) -> FingerprintBlock:
+        hashes, song_ids, anchor_times = zip(*rows)
+        fingerprints = np.empty(len(rows), dtype=fingerprint_dtype(self.hash_mode))
+        fingerprints["hash"] = hashes
+        fingerprints["anchor_time"] = anchor_times
+        return FingerprintBlock(np.asarray(song_ids, dtype=np.int64), fingerprints)
+
+    @staticmethod
+    def _concat_blocks(blocks: List[FingerprintBlock]) -> FingerprintBlock:
+        if len(blocks) == 1:
+            return blocks[0]
+        return FingerprintBlock(np.concatenate([b.song_ids for b in blocks]),
+                                np.concatenate([b.fingerprints for b in blocks]))
+
+    def iter_songs(self, block_size: int = EXPORT_BLOCK_SIZE) -> Iterator[Dict[str, Any]]:
+        """Stream the songs table in song_id order, `block_size` rows per query."""
+        last_song_id = 0
+        while True:
+            rows = self.conn.execute(
+                f"SELECT {SONG_COLUMNS} FROM songs "
+                "WHERE song_id > ? ORDER BY song_id LIMIT ?", (last_song_id, block_size)).fetchall()
+            if not rows:
+                return
+            last_song_id = rows[-1][0]
+            for row in rows:
+                yield self._song_row(row)
+
+    def get_all_fingerprint(self) -> Dict[int, List[Tuple[str | int, int]]]:
+        """
+        All fingerprints as song_id -> [(hash, anchor_time), ...].
+
+        Builds Python objects for the whole table; prefer iter_fingerprints on large catalogs.
+        """
+        return {int(block.song_ids[0]): list(zip(block.fingerprints["hash"].tolist(),
+                                                 block.fingerprints["anchor_time"].tolist()))
+                for block in self.iter_fingerprints(by_song=True)}
+
+    def get_all_songs(self) -> Dict[int, Dict[str, Any]]:
+        """All songs as song_id -> song row (see get_song_by_id)."""
+        return {song["song_id"]: song for song in self.iter_songs()}
+
+    def find_matches(self, query_hashes: List[str | int]) -> Dict[int, Dict[str | int, List[int]]] | None:
         if not query_hashes:
             return None
 
@@ -107,13 +510,13 @@ class Database:
             FROM fingerprints
             WHERE hash IN ({placeholders})
         """
-        self.cursor = self._execute(sql, query_hashes)
+        self.cursor = self._query(sql, query_hashes)
         results = self.cursor.fetchall()
 
         if not results:
             return None
 
-        matches: Dict[int, Dict[str, List[int]]] = {}
+        matches: Dict[int, Dict[str | int, List[int]]] = {}
 
         for hash_val, song_id, anchor_time in results:
             if song_id not in matches:
@@ -124,7 +527,90 @@ class Database:
 
         return matches
 
+    def lookup(self, query_hashes: Sequence) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched posting lookup for a set of distinct query hashes.
+
+        Returns three aligned arrays (query_idx, song_ids, anchor_times), one entry per
+        posting, where query_idx is the position of the posting's hash in query_hashes.
+        """
+        position = {h: i for i, h in enumerate(query_hashes)}
+        query_idx: List[int] = []
+        song_ids: List[int] = []
+        anchor_times: List[int] = []
+
+        keys = list(position)
+        for start in range(0, len(keys), MAX_SQL_VARIABLES):
+            chunk = keys[start:start + MAX_SQL_VARIABLES]
+            placeholders = ",".join("?" for _ in chunk)
+            self.cursor = self._query(
+                f"SELECT hash, song_id, anchor_time FROM fingerprints WHERE hash IN ({placeholders})",
+                chunk,
+            )
+            for hash_val, song_id, anchor_time in self.cursor.fetchall():
+                query_idx.append(position[hash_val])
+                song_ids.append(song_id)
+                anchor_times.append(anchor_time)
+
+        return (np.asarray(query_idx, dtype=np.int64),
+                np.asarray(song_ids, dtype=np.int64),
+                np.asarray(anchor_times, dtype=np.int64))
+
     def clear(self):
+        self._execute("DROP TABLE IF EXISTS catalog_info;")
+        self._execute("DROP TABLE IF EXISTS hash_stats;")
         self._execute("DROP TABLE IF EXISTS fingerprints;")
         self._execute("DROP TABLE IF EXISTS songs;")
-        self._create_tables()
\ No newline at end of file
+        self._create_tables()
+
+
+class DatabasePool:
+    """
+    Long-lived, thread-safe access to one catalog file.
+
+    The schema is created once when the pool is built; afterwards every thread gets its
+    own connection (SQLite connections must not be shared across threads) opened in WAL
+    mode, so ingestion writes do not block concurrent recognition reads. `close()` shuts
+    every connection the pool handed out.
+
+    Only single-file catalogs are supported; sharded and segmented catalog directories
+    are served by the command-line tools (see sharding.open_database).
+    """
+
+    def __init__(self, db_name: str = "music.db", hash_mode: str | None = None,
+                 stop_df: int | None = None) -> None:
+        if os.path.isdir(db_name):
+            raise ValueError(f"{db_name} is a catalog directory; DatabasePool needs a single-file "
+                             f"catalog (sharded and segmented catalogs are command-line only)")
+        self.db_name = db_name
+        self.stop_df = stop_df
+        bootstrap = Database(db_name, hash_mode=hash_mode, wal=True)
+        self.hash_mode = bootstrap.hash_mode
+        bootstrap.close()
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[Database] = []
+        self._closed = False
+
+    def get(self) -> Database:
+        """The calling thread's Database, opened on first use."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("DatabasePool is closed")
+                # check_same_thread=False only so close() can run from the shutdown thread;
+                # each connection is still used by a single thread.
+                db = Database(self.db_name, hash_mode=self.hash_mode, wal=True,
+                              create_tables=False, check_same_thread=False, stop_df=self.stop_df)
+                self._connections.append(db)
+            self._local.db = db
+        return db
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            for db in self._connections:
+                db.close()
+            self._connections.clear()
@@ -1,10 +1,50 @@
 import logging
 import numpy as np
 import hashlib
-from typing import List, Tuple
+from typing import Tuple
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+
+# Hash modes. "sha1" keeps the original truncated SHA-1 hex digests; "packed" bit-packs
+# (anchor_freq, target_freq, dt) into a single unsigned 32-bit integer.
+HASH_MODE_SHA1 = "sha1"
+HASH_MODE_PACKED = "packed"
+HASH_MODES = (HASH_MODE_SHA1, HASH_MODE_PACKED)
+
+# Bit layout of a packed hash: | anchor_freq (10) | target_freq (10) | dt (12) |
+FREQ_BITS = 10
+DT_BITS = 12
+FREQ_MASK = (1 << FREQ_BITS) - 1
+DT_MASK = (1 << DT_BITS) - 1
+
+
+# Length of the truncated SHA-1 hex digest.
+SHA1_HASH_DTYPE = "U20"
+
+
+def fingerprint_dtype(hash_mode: str) -> np.dtype:
+    """Structured dtype of the fingerprint arrays produced in a given hash mode."""
+    hash_type = np.uint32 if hash_mode == HASH_MODE_PACKED else SHA1_HASH_DTYPE
+    return np.dtype([("hash", hash_type), ("anchor_time", np.int64)])
+
+
+def pack_hash(freq1: int, freq2: int, dt: int) -> int:
+    """Bit-pack a (freq1, freq2, dt) triple into a 32-bit integer key."""
+    freq1, freq2, dt = int(freq1), int(freq2), int(dt)
+    if not (0 <= freq1 <= FREQ_MASK and 0 <= freq2 <= FREQ_MASK and 0 <= dt <= DT_MASK):
+        raise ValueError(f"Cannot pack freq1={freq1}, freq2={freq2}, dt={dt} into 32 bits")
+    return (freq1 << (FREQ_BITS + DT_BITS)) | (freq2 << DT_BITS) | dt
+
+
+def unpack_hash(h: int) -> Tuple[int, int, int]:
+    """Inverse of pack_hash."""
+    return (h >> (FREQ_BITS + DT_BITS)) & FREQ_MASK, (h >> DT_BITS) & FREQ_MASK, h & DT_MASK
+
+
+def sha1_hash(freq1: int, freq2: int, dt: int) -> str:
+    """Truncated SHA-1 hex digest of a (freq1, freq2, dt) triple."""
+    hash_input = f"{int(freq1)}|{int(freq2)}|{int(dt)}".encode('utf-8')
+    return hashlib.sha1(hash_input).hexdigest()[:20]
 
 class Fingerprinter:
     """
@@ -25,7 +65,8 @@ class Fingerprinter:
     def __init__(self, fanout_size: int = DEFAULT_FANOUT_SIZE,
                  target_t_min: int = DEFAULT_TARGET_T_MIN,
                  target_t_max: int = DEFAULT_TARGET_T_MAX,
-                 target_f_range: int = DEFAULT_TARGET_F_RANGE):
+                 target_f_range: int = DEFAULT_TARGET_F_RANGE,
+                 hash_mode: str = HASH_MODE_SHA1):
         """
         Initializes the Fingerprinter with specific parameters.
 
@@ -35,21 +76,32 @@ class Fingerprinter:
             target_t_max (int): The maximum time offset (in frames) for the target zone.
             target_f_range (int): The range of frequency bins (+/-) around an anchor's frequency
                                   to search for target peaks.
+            hash_mode (str): "sha1" for truncated SHA-1 hex strings or "packed" for
+                             32-bit integer keys.
         """
+        if hash_mode not in HASH_MODES:
+            raise ValueError(f"Unknown hash_mode {hash_mode!r}, expected one of {HASH_MODES}")
+        if hash_mode == HASH_MODE_PACKED and target_t_max > DT_MASK:
+            raise ValueError(f"target_t_max={target_t_max} does not fit in {DT_BITS} bits")
+
         self.fanout_size = fanout_size
         self.target_t_min = target_t_min
         self.target_t_max = target_t_max
         self.target_f_range = target_f_range
+        self.hash_mode = hash_mode
 
-        logger.debug(f"Initialized Fingerprinter with fanout={fanout_size}, "
-                    f"t_min={target_t_min}, t_max={target_t_max}, f_range={target_f_range}")
+        logger.debug("Initialized Fingerprinter with fanout=%s, t_min=%s, t_max=%s, f_range=%s, "
+                     "hash_mode=%s", fanout_size, target_t_min, target_t_max, target_f_range, hash_mode)
 
-    def generate_fingerprints(self, peaks: np.ndarray) -> List[Tuple[str, int]]:
+    def generate_fingerprints(self, peaks: np.ndarray) -> np.ndarray:
         """
-        Takes an array of peaks and generates a list of fingerprints.
+        Takes an array of peaks and generates a structured array of fingerprints.
 
-        Each fingerprint is a tuple containing a unique hash and the absolute
-        time offset of the anchor peak that generated it.
+        Each fingerprint holds a hash of an (anchor, target) peak pair and the absolute
+        time offset of the anchor peak that generated it. Every peak, in time order, is
+        used as an anchor and paired with up to `fanout_size` later peaks whose time delta
+        lies in [target_t_min, target_t_max] and whose frequency lies within
+        +/- target_f_range bins, taken in time order.
 
         Args:
             peaks (np.ndarray): A 2D array of peaks, where each row is
@@ -57,60 +109,67 @@ class Fingerprinter:
                                 It's assumed to be the output of the PeakPicker.
 
         Returns:
-            List[Tuple[str, int]]: A list of fingerprints. Each fingerprint is a
-                                   tuple of (hash_hex_string, anchor_time_frame).
+            np.ndarray: A structured array with fields ("hash", "anchor_time"), where hash
+                        is a hex string or a packed integer depending on hash_mode. Rows
+                        unpack like (hash, anchor_time_frame) tuples.
         """
         if peaks.shape[0] < 2:
             logger.warning("Not enough peaks to generate fingerprints.")
-            return []
+            return np.empty(0, dtype=fingerprint_dtype(self.hash_mode))
 
-        # Sort peaks by time index for efficient processing. This is a crucial optimization.
+        # Sort peaks by time index so each anchor's target zone is a contiguous slice.
         peaks = peaks[peaks[:, 0].argsort()]
-        logger.info(f"Generating fingerprints from {len(peaks)} peaks")
-
-        fingerprints = []
-        
-        # Iterate through each peak, treating it as an anchor
-        for i in range(len(peaks)):
-            anchor_time, anchor_freq, _ = peaks[i]
-            logger.debug(f"Anchor peak @time={anchor_time}, freq={anchor_freq}")
-            
-            targets_found = 0
-            
-            # Iterate through subsequent peaks to find targets in the zone
-            for j in range(i + 1, len(peaks)):
-                target_time, target_freq, _ = peaks[j]
-                
-                dt = target_time - anchor_time
-                
-                # Check if we are outside the max time delta; if so, we can break
-                # early since the peaks are time-sorted.
-                if dt > self.target_t_max:
-                    break
-                
-                # Check if the target is within the valid time and frequency zone
-                if self.target_t_min <= dt <= self.target_t_max:
-                    df = abs(target_freq - anchor_freq)
-                    if df <= self.target_f_range:
-                        # If a valid target is found, create the hash
-                        h = self._create_hash(anchor_freq, target_freq, dt)
-                        
-                        # Store the hash along with the anchor's absolute time
-                        fingerprints.append((h, int(anchor_time)))
-                        logger.debug(f" ↳ Target peak @time={target_time}, freq={target_freq}, "
-                                     f"dt={dt}, df={df}, hash={h}")
-                        
-                        targets_found += 1
-                        # Enforce the fanout limit
-                        if targets_found >= self.fanout_size:
-                            break
-
-        logger.info(f"Generated {len(fingerprints)} fingerprints total")                 
+        times = peaks[:, 0]
+        freqs = peaks[:, 1]
+        n = len(peaks)
+        logger.debug("Generating fingerprints from %d peaks", n)
+
+        # Target window of each anchor: later peaks with t_min <= dt <= t_max.
+        lo = np.maximum(np.arange(1, n + 1), np.searchsorted(times, times + self.target_t_min, side="left"))
+        hi = np.searchsorted(times, times + self.target_t_max, side="right")
+        counts = np.clip(hi - lo, 0, None)
+
+        # Expand into candidate (anchor, target) pairs, anchor-major and time-ordered.
+        anchor_idx = np.repeat(np.arange(n), counts)
+        pair_starts = np.cumsum(counts) - counts
+        target_idx = lo[anchor_idx] + np.arange(anchor_idx.size) - np.repeat(pair_starts, counts)
+
+        # Frequency zone
+        in_zone = np.abs(freqs[target_idx] - freqs[anchor_idx]) <= self.target_f_range
+        anchor_idx = anchor_idx[in_zone]
+        target_idx = target_idx[in_zone]
+
+        # Fanout: keep the first fanout_size in-zone targets of every anchor.
+        rank = np.arange(anchor_idx.size) - np.searchsorted(anchor_idx, anchor_idx, side="left")
+        keep = rank < self.fanout_size
+        anchor_idx = anchor_idx[keep]
+        target_idx = target_idx[keep]
+
+        f1 = freqs[anchor_idx].astype(np.int64)
+        f2 = freqs[target_idx].astype(np.int64)
+        dt = (times[target_idx] - times[anchor_idx]).astype(np.int64)
+
+        fingerprints = np.empty(anchor_idx.size, dtype=fingerprint_dtype(self.hash_mode))
+        fingerprints["hash"] = self._create_hashes(f1, f2, dt)
+        fingerprints["anchor_time"] = times[anchor_idx].astype(np.int64)
+
+        logger.debug("Generated %d fingerprints total", len(fingerprints))
         return fingerprints
-    
-    def _create_hash(self, freq1: int, freq2: int, dt: int) -> str:
+
+    def _create_hashes(self, freq1: np.ndarray, freq2: np.ndarray, dt: np.ndarray) -> np.ndarray:
         """
-        Creates a SHA-1 hash from the frequencies of two peaks and their time delta.
+        Vectorized hashing of (freq1, freq2, dt) triples.
         """
-        hash_input = f"{int(freq1)}|{int(freq2)}|{int(dt)}".encode('utf-8')
-        return hashlib.sha1(hash_input).hexdigest()[:20] 
\ No newline at end of file
+        if self.hash_mode == HASH_MODE_PACKED:
+            if freq1.size and (min(freq1.min(), freq2.min(), dt.min()) < 0
+                               or max(freq1.max(), freq2.max()) > FREQ_MASK or dt.max() > DT_MASK):
+                raise ValueError("Peak coordinates do not fit in a packed 32-bit hash")
+            return (freq1 << (FREQ_BITS + DT_BITS)) | (freq2 << DT_BITS) | dt
+
+        # SHA-1 is computed once per distinct triple; songs repeat triples heavily.
+        keys = (freq1 << 42) | (freq2 << 21) | dt
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        mask = (1 << 21) - 1
+        digests = np.array([sha1_hash(k >> 42, (k >> 21) & mask, k & mask) for k in unique_keys.tolist()],
+                           dtype=SHA1_HASH_DTYPE)
+        return digests[inverse]
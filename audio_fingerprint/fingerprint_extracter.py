@@ -1,47 +1,199 @@
-from typing import List, Tuple
+import json
+from typing import Any, Dict, List, NamedTuple, Tuple
 from audio_fingerprint.loader import AudioLoader
-from audio_fingerprint.stft import STFT
+from audio_fingerprint.stft import STFT, StreamingSTFT
 from audio_fingerprint.mel_filterbank import MelFilterBank
-from audio_fingerprint.peaks import PeakPicker
-from audio_fingerprint.fingerprint import Fingerprinter
+from audio_fingerprint.peaks import BACKGROUND_MEDIAN, PeakPicker
+from audio_fingerprint.fingerprint import Fingerprinter, HASH_MODE_SHA1
+from audio_fingerprint.metrics import metrics
 import numpy as np
+import soxr
+
+DEFAULT_SAMPLE_RATE = 44100
+# FFT and hop sizes at DEFAULT_SAMPLE_RATE; other rates scale them to keep the same
+# frame duration (~46 ms windows, ~86 frames/s) and FFT bin width (~21.5 Hz).
+FFT_SIZE = 2048
+HOP_SIZE = 512
+
+
+
+class ExtractionParams(NamedTuple):
+    """
+    Tunable peak picking and hashing parameters (see PeakPicker and Fingerprinter).
+
+    They set the fingerprint density, so they trade index size and ingest cost against
+    query latency and robustness. Like the sample rate, they are recorded in the catalog
+    (see extraction_settings): songs must be ingested and queried with the same values.
+    """
+    fanout_size: int = Fingerprinter.DEFAULT_FANOUT_SIZE
+    target_t_min: int = Fingerprinter.DEFAULT_TARGET_T_MIN
+    target_t_max: int = Fingerprinter.DEFAULT_TARGET_T_MAX
+    target_f_range: int = Fingerprinter.DEFAULT_TARGET_F_RANGE
+    neighborhood_size: Tuple[int, int] = (15, 7)
+    median_filter_size: Tuple[int, int] = (41, 21)
+    offset_db: float = 7.0
+    peaks_per_band: int = 30
+    max_peaks_per_second: int = 35
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "ExtractionParams":
+        """Build from a (JSON) mapping; missing keys keep their defaults, unknown keys are errors."""
+        unknown = set(values) - set(cls._fields)
+        if unknown:
+            raise ValueError(f"Unknown extraction parameters: {sorted(unknown)}")
+        values = {k: tuple(v) if isinstance(v, list) else v for k, v in values.items()}
+        return cls(**values)
+
+    @classmethod
+    def load(cls, path: str) -> "ExtractionParams":
+        """Read parameters from a JSON file, e.g. one written by benchmarks.sweep."""
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def extraction_settings(sample_rate: int = DEFAULT_SAMPLE_RATE,
+                        params: ExtractionParams | None = None) -> Dict[str, Any]:
+    """
+    The extraction settings a catalog must be built and queried with, as recorded in it
+    (see Database.check_extraction_settings).
+    """
+    return {"sample_rate": sample_rate, "params": (params or ExtractionParams())._asdict()}
 
 
 class FingerprintExtracter:
-    def __init__(self,) -> None:
-        self.loader = AudioLoader(mono=True)
-        self.stft = STFT(fft_size=2048)
-        self.mel_fb = MelFilterBank(sr=44100, n_fft=2048)
-        self.peak_picker = PeakPicker()
-        self.fingerprinter = Fingerprinter()
+    def __init__(self, hash_mode: str = HASH_MODE_SHA1, peak_background: str = BACKGROUND_MEDIAN,
+                 sample_rate: int = DEFAULT_SAMPLE_RATE, params: ExtractionParams | None = None) -> None:
+        """
+        Args:
+            hash_mode (str): Fingerprint hash format.
+            peak_background (str): Peak picker background estimate.
+            sample_rate (int): Analysis sample rate. Audio is resampled to it before the
+                               STFT; a lower rate (e.g. 11025) makes every stage cheaper
+                               but drops content above its Nyquist frequency. Catalogs must
+                               be built and queried at the same rate.
+            params (ExtractionParams | None): Peak picking and hashing parameters
+                                              (defaults when None).
+        """
+        params = params or ExtractionParams()
+        self.params = params
+        self.sample_rate = sample_rate
+        fft_size = round(FFT_SIZE * sample_rate / DEFAULT_SAMPLE_RATE)
+        hop_size = round(HOP_SIZE * sample_rate / DEFAULT_SAMPLE_RATE)
+        self.loader = AudioLoader(sr=sample_rate, mono=True)
+        self.stft = STFT(fft_size=fft_size, hop_size=hop_size)
+        self.mel_fb = MelFilterBank(sr=sample_rate, n_fft=fft_size)
+        self.peak_picker = PeakPicker(neighborhood_size=params.neighborhood_size,
+                                      median_filter_size=params.median_filter_size,
+                                      offset_db=params.offset_db, peaks_per_band=params.peaks_per_band,
+                                      max_peaks_per_second=params.max_peaks_per_second,
+                                      sr=sample_rate, hop_size=hop_size, background=peak_background)
+        self.fingerprinter = Fingerprinter(fanout_size=params.fanout_size, target_t_min=params.target_t_min,
+                                           target_t_max=params.target_t_max,
+                                           target_f_range=params.target_f_range, hash_mode=hash_mode)
     
+    def settings(self) -> Dict[str, Any]:
+        """This extracter's extraction_settings."""
+        return extraction_settings(self.sample_rate, self.params)
+
     def from_file(self, filepath: str):
-        """Load audio from file and extract fingerprint."""
-        audio, _ = self.loader.load(filepath)
-        return self._extract(audio)
+        """
+        Load audio from file and extract fingerprint.
 
-    def from_pcm(self, pcm_array: np.ndarray):
-        """Use already captured PCM data and extract fingerprint."""
-        return self._extract(pcm_array)
+        The file is decoded and resampled block by block and each block goes straight
+        through a StreamingSTFT and the mel projection, so the full-rate signal is never
+        held in memory at once.
+        """
+        stft = StreamingSTFT(self.stft.fft_size, self.stft.hop_size, self.stft.window_type)
+        mel_blocks = []
+        blocks = self.loader.iter_blocks(filepath)
+        while True:
+            with metrics.timer("load"):
+                block = next(blocks, None)
+            if block is None:
+                break
+            with metrics.timer("stft"):
+                spec = stft.process(block)
+            if spec.shape[0]:
+                mel_blocks.append(self.log_mel(spec))
 
-    def _extract(self, audio: np.ndarray) -> List[Tuple[str, int]]:
+        if not mel_blocks:
+            return self.fingerprinter.generate_fingerprints(np.empty((0, 3)))
+        return self.from_log_mel(np.concatenate(mel_blocks, axis=1))
+
+    def from_pcm(self, pcm_array: np.ndarray, sample_rate: int | None = None):
+        """
+        Use already captured PCM data and extract fingerprint.
+
+        Args:
+            sample_rate (int | None): Rate of `pcm_array`, if it differs from the analysis rate.
+        """
+        return self._extract(self.resample(pcm_array, sample_rate))
+
+    def resample(self, pcm_array: np.ndarray, sample_rate: int | None) -> np.ndarray:
+        """Resample mono PCM from `sample_rate` to the analysis rate (no-op if they match)."""
+        if sample_rate is None or sample_rate == self.sample_rate:
+            return pcm_array
+        return soxr.resample(pcm_array, sample_rate, self.sample_rate)
+
+    def from_pcm_batch(self, pcm_arrays: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Extract fingerprints for several clips at once.
+
+        The frames of all clips go through one FFT and one mel projection; peak picking
+        and hashing then run per clip. Returns one fingerprint array per input clip.
+        """
+        with metrics.timer("stft"):
+            spec, frame_counts = self.stft.compute_stft_batch(pcm_arrays)
+        mel_spec_db = self.log_mel(spec)
+
+        results = []
+        bounds = np.cumsum([0] + frame_counts)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if end == start:
+                results.append(self.fingerprinter.generate_fingerprints(np.empty((0, 3))))
+                continue
+            results.append(self.from_log_mel(mel_spec_db[:, start:end]))
+        return results
+
+    def warm_up(self) -> np.ndarray:
+        """
+        Run two seconds of noise through the pipeline so state built on first use (mel
+        filterbank, FFT plans, the scipy.ndimage import) is ready before a real query.
+
+        Returns:
+            np.ndarray: The fingerprints of the noise.
+        """
+        noise = np.random.default_rng(0).standard_normal(2 * self.sample_rate).astype(np.float32)
+        return self._extract(0.1 * noise)
+
+    def _extract(self, audio: np.ndarray) -> np.ndarray:
         # 2. Apply STFT
-        spec = self.stft.compute_stft(audio)
+        with metrics.timer("stft"):
+            spec = self.stft.compute_stft(audio)
+
+        return self.from_log_mel(self.log_mel(spec))
 
+    def log_mel(self, spec: np.ndarray) -> np.ndarray:
+        """Power spectrum (frames, freq_bins) -> log-mel spectrogram (n_mels, frames)."""
         # 3. Apply mel filterbank 
-        m = self.mel_fb.mel_filter_bank()
-        
-        # We need M @ P where P has shape (freq_bins, frames). So we use .T
-        # (128, 1025) @ (1025, 351) -> (128, 351)
-        mel_spec = np.dot(m, spec.T)
+        # M @ P.T where P has shape (frames, freq_bins):
+        # (128, 1025) @ (1025, 351) -> (128, 351), using only the nonzero band of each filter
+        with metrics.timer("mel"):
+            mel_spec = self.mel_fb.apply(spec)
 
-        # Apply log compression (log-mel spectrogram)
-        mel_spec_db = 10 * np.log10(mel_spec + 1e-10)
+            # Apply log compression (log-mel spectrogram)
+            return 10 * np.log10(mel_spec + 1e-10)
 
+    def from_log_mel(self, mel_spec_db: np.ndarray) -> np.ndarray:
+        """Fingerprints of a log-mel spectrogram (n_mels, frames)."""
         # 4. Apply peak picker
-        peaks = self.peak_picker.find_peaks(mel_spec_db)
+        with metrics.timer("peaks"):
+            peaks = self.peak_picker.find_peaks(mel_spec_db)
+        metrics.count("peaks", len(peaks))
 
         # 5. Apply fingerprinting
-        fingerprints = self.fingerprinter.generate_fingerprints(peaks)
+        with metrics.timer("hashing"):
+            fingerprints = self.fingerprinter.generate_fingerprints(peaks)
+        metrics.count("fingerprints", len(fingerprints))
 
-        return fingerprints
\ No newline at end of file
+        return fingerprints
@@ -0,0 +1,282 @@
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+import numpy as np
+
+from audio_fingerprint.database import Database
+from audio_fingerprint.fingerprint import HASH_MODE_PACKED, SHA1_HASH_DTYPE
+
+logger = logging.getLogger(__name__)
+
+LOAD_BATCH_SIZE = 100_000
+
+
+class _Postings(NamedTuple):
+    """
+    Immutable CSR snapshot: postings of keys[i] live in [indptr[i], indptr[i + 1]),
+    sorted by song_id; df[i] is the number of distinct songs containing keys[i] (at
+    least the number among its postings). `songs` holds the distinct song ids, sorted.
+    """
+    keys: np.ndarray
+    indptr: np.ndarray
+    song_ids: np.ndarray
+    anchor_times: np.ndarray
+    df: np.ndarray
+    songs: np.ndarray
+    last_rowid: int
+
+    @property
+    def n_songs(self) -> int:
+        return int(self.songs.size)
+
+
+def find_postings(keys: np.ndarray, indptr: np.ndarray, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batched search of a CSR posting table with sorted `keys`.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: For every posting of a query hash, the position of
+                                       that hash in `query` and the posting's row.
+    """
+    if query.size == 0 or keys.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    pos = np.searchsorted(keys, query)
+    pos_clipped = np.minimum(pos, keys.size - 1)
+    found = np.flatnonzero((pos < keys.size) & (keys[pos_clipped] == query))
+
+    starts = indptr[pos_clipped[found]]
+    counts = indptr[pos_clipped[found] + 1] - starts
+    query_idx = np.repeat(found, counts)
+    offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    rows = np.repeat(starts, counts) + offsets
+    return query_idx.astype(np.int64), rows
+
+
+def key_frequencies(keys: np.ndarray, df: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """df of each query hash in a table with sorted `keys` (0 for hashes not in it)."""
+    out = np.zeros(query.size, dtype=np.int64)
+    if query.size == 0 or keys.size == 0:
+        return out
+    pos = np.minimum(np.searchsorted(keys, query), keys.size - 1)
+    found = keys[pos] == query
+    out[found] = df[pos[found]]
+    return out
+
+
+class InMemoryIndex:
+    """
+    Read-only inverted index over the `fingerprints` table, held in memory.
+
+    The table is loaded once into a sorted array of distinct hashes plus contiguous
+    song_id / anchor_time posting arrays (CSR layout). Batched lookups are answered with
+    a vectorized binary search, so recognition no longer touches SQLite. Call `refresh()`
+    after songs are added to fold the new rows in: they are sorted on their own and merged
+    into the existing arrays, and only their hashes' df (plus that of stop hashes, whose
+    df grows without new postings when db.stop_df is the catalog's threshold) is reread.
+
+    Exposes the same `find_matches` and `lookup` interface as Database.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self.hash_mode = db.hash_mode
+        self._hash_dtype = np.int64 if self.hash_mode == HASH_MODE_PACKED else SHA1_HASH_DTYPE
+        self._lock = threading.Lock()
+        self._postings = self._build(np.empty(0, dtype=self._hash_dtype), np.empty(0, dtype=np.int64),
+                                     np.empty(0, dtype=np.int64), last_rowid=0)
+        self.refresh()
+
+    def __len__(self) -> int:
+        return int(self._postings.indptr[-1])
+
+    def refresh(self, full: bool = False) -> int:
+        """
+        Load fingerprints added since the last refresh (or everything when full=True).
+
+        Readers keep using the previous snapshot until the new one is swapped in. Use
+        full=True after rows were deleted or the catalog was cleared and refilled.
+
+        Returns:
+            int: The number of postings loaded.
+        """
+        with self._lock:
+            current = self._postings
+            max_rowid = self.db.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM fingerprints").fetchone()[0]
+            if full or max_rowid < current.last_rowid:
+                # Full rebuild, also needed when the table was cleared and rowids restarted.
+                current = self._build(current.keys[:0], current.song_ids[:0], current.anchor_times[:0], 0)
+
+            hashes, song_ids, anchor_times, last_rowid = self._load_since(current.last_rowid)
+            if hashes.size == 0:
+                self._postings = current
+                return 0
+
+            order = np.lexsort((song_ids, hashes))
+            run = self._build(hashes[order], song_ids[order], anchor_times[order], last_rowid)
+            merged = self._merge(current, run) if current.keys.size else None
+            if merged is None:
+                # First load, or new rows that do not sort after the old ones: rebuild
+                # everything, with df from the whole hash_stats table.
+                hashes = np.concatenate((np.repeat(current.keys, np.diff(current.indptr)), hashes))
+                song_ids = np.concatenate((current.song_ids, song_ids))
+                anchor_times = np.concatenate((current.anchor_times, anchor_times))
+                order = np.lexsort((song_ids, hashes))
+                merged = self._build(hashes[order], song_ids[order], anchor_times[order], last_rowid)
+                stat_keys, stat_df = self._load_hash_stats()
+            else:
+                stat_keys, stat_df = self._load_hash_stats(run.keys)
+
+            # With a stop-hash threshold, postings stop being stored once a hash is a stop
+            # hash, so counting them caps df at stop_df; hash_stats keeps the true counts.
+            df = merged.df.copy()
+            pos = np.minimum(np.searchsorted(merged.keys, stat_keys), max(merged.keys.size - 1, 0))
+            found = merged.keys[pos] == stat_keys
+            df[pos[found]] = np.maximum(df[pos[found]], stat_df[found])
+
+            self._postings = merged._replace(df=df)
+            logger.info("Index refreshed: %d new postings, %d total, %d distinct hashes",
+                        run.song_ids.size, merged.song_ids.size, merged.keys.size)
+            return int(run.song_ids.size)
+
+    @staticmethod
+    def _build(hashes: np.ndarray, song_ids: np.ndarray, anchor_times: np.ndarray, last_rowid: int) -> _Postings:
+        """CSR postings of rows already sorted by (hash, song_id)."""
+        keys, starts = np.unique(hashes, return_index=True)
+        indptr = np.append(starts, hashes.size).astype(np.int64)
+        # Each new song within a hash is a change of (hash, song_id).
+        new_song = np.ones(hashes.size, dtype=np.int64)
+        new_song[1:] = (hashes[1:] != hashes[:-1]) | (song_ids[1:] != song_ids[:-1])
+        df = np.add.reduceat(new_song, starts) if hashes.size else np.empty(0, dtype=np.int64)
+        return _Postings(keys, indptr, song_ids, anchor_times, df, np.unique(song_ids), last_rowid)
+
+    @staticmethod
+    def _merge(old: _Postings, run: _Postings) -> _Postings | None:
+        """
+        Merge a run of new postings into `old` in linear time, appending each key's new
+        postings after its old ones. Returns None when that would break the song_id order
+        within a key (new rows of an older song), which needs a full rebuild.
+        """
+        pos = np.searchsorted(old.keys, run.keys)
+        existing = np.zeros(run.keys.size, dtype=bool)
+        in_range = pos < old.keys.size
+        existing[in_range] = old.keys[pos[in_range]] == run.keys[in_range]
+
+        first_new = run.song_ids[run.indptr[:-1][existing]]
+        last_old = old.song_ids[old.indptr[pos[existing] + 1] - 1]
+        if np.any(first_new < last_old):
+            return None
+
+        added = ~existing
+        keys = np.insert(old.keys, pos[added], run.keys[added])
+        old_counts = np.insert(np.diff(old.indptr), pos[added], 0)
+        slot = np.searchsorted(keys, run.keys)
+        run_counts = np.diff(run.indptr)
+        counts = old_counts.copy()
+        counts[slot] += run_counts
+        indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        # Destination of every new posting; old postings fill the remaining slots in order.
+        dest = (np.repeat(indptr[slot] + old_counts[slot] - run.indptr[:-1], run_counts)
+                + np.arange(run.song_ids.size))
+        is_old = np.ones(int(indptr[-1]), dtype=bool)
+        is_old[dest] = False
+        song_ids = np.empty(is_old.size, dtype=np.int64)
+        anchor_times = np.empty(is_old.size, dtype=np.int64)
+        song_ids[is_old], song_ids[dest] = old.song_ids, run.song_ids
+        anchor_times[is_old], anchor_times[dest] = old.anchor_times, run.anchor_times
+
+        # A song whose rows straddle two refreshes is counted once.
+        df = np.insert(old.df, pos[added], 0)
+        df[slot] += run.df
+        df[slot[existing]] -= (first_new == last_old).astype(np.int64)
+        return _Postings(keys, indptr, song_ids, anchor_times, df,
+                         np.union1d(old.songs, run.songs), run.last_rowid)
+
+    def _load_since(self, rowid: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        cursor = self.db.conn.execute(
+            "SELECT rowid, hash, song_id, anchor_time FROM fingerprints WHERE rowid > ? ORDER BY rowid",
+            (rowid,),
+        )
+        hashes: List[np.ndarray] = []
+        song_ids: List[np.ndarray] = []
+        anchor_times: List[np.ndarray] = []
+        last_rowid = rowid
+        while True:
+            rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+            if not rows:
+                break
+            rowids, h, s, t = zip(*rows)
+            hashes.append(np.asarray(h, dtype=self._hash_dtype))
+            song_ids.append(np.asarray(s, dtype=np.int64))
+            anchor_times.append(np.asarray(t, dtype=np.int64))
+            last_rowid = rowids[-1]
+
+        if not hashes:
+            return (np.empty(0, dtype=self._hash_dtype), np.empty(0, dtype=np.int64),
+                    np.empty(0, dtype=np.int64), last_rowid)
+        return np.concatenate(hashes), np.concatenate(song_ids), np.concatenate(anchor_times), last_rowid
+
+    def _load_hash_stats(self, keys: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        hash_stats as (keys, df) arrays sorted by key: every row, or only those of `keys`
+        and of the stop hashes (df > db.stop_df).
+        """
+        if keys is not None:
+            df = self.db.document_frequencies(keys.tolist())
+            if self.db.stop_df is None:
+                return keys, df
+            stop = self.db.conn.execute("SELECT hash, df FROM hash_stats WHERE df > ?", (self.db.stop_df,)).fetchall()
+            stop_keys = np.asarray([h for h, _ in stop], dtype=self._hash_dtype)
+            stop_df = np.asarray([d for _, d in stop], dtype=np.int64)
+            keys_arr, df_arr = np.concatenate((keys, stop_keys)), np.concatenate((df, stop_df))
+        else:
+            cursor = self.db.conn.execute("SELECT hash, df FROM hash_stats")
+            chunks: List[np.ndarray] = [np.empty(0, dtype=self._hash_dtype)]
+            df_chunks: List[np.ndarray] = [np.empty(0, dtype=np.int64)]
+            while True:
+                rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+                if not rows:
+                    break
+                h, d = zip(*rows)
+                chunks.append(np.asarray(h, dtype=self._hash_dtype))
+                df_chunks.append(np.asarray(d, dtype=np.int64))
+            keys_arr, df_arr = np.concatenate(chunks), np.concatenate(df_chunks)
+        order = np.argsort(keys_arr, kind="stable")
+        return keys_arr[order], df_arr[order]
+
+    def lookup(self, query_hashes: Sequence) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched posting lookup for a set of distinct query hashes.
+
+        Returns three aligned arrays (query_idx, song_ids, anchor_times), one entry per
+        posting, where query_idx is the position of the posting's hash in query_hashes.
+        """
+        postings = self._postings
+        query = np.asarray(query_hashes, dtype=self._hash_dtype)
+        query_idx, rows = find_postings(postings.keys, postings.indptr, query)
+        return query_idx, postings.song_ids[rows], postings.anchor_times[rows]
+
+    def document_frequencies(self, query_hashes: Sequence) -> np.ndarray:
+        """Number of indexed songs containing each query hash (0 for unknown hashes)."""
+        postings = self._postings
+        return key_frequencies(postings.keys, postings.df, np.asarray(query_hashes, dtype=self._hash_dtype))
+
+    def song_count(self) -> int:
+        return self._postings.n_songs
+
+    def find_matches(self, query_hashes: List[str | int]) -> Dict[int, Dict[str | int, List[int]]] | None:
+        """Same contract as Database.find_matches, served from memory."""
+        if not query_hashes:
+            return None
+
+        query_idx, song_ids, anchor_times = self.lookup(query_hashes)
+        if query_idx.size == 0:
+            return None
+
+        matches: Dict[int, Dict[str | int, List[int]]] = {}
+        for i, song_id, anchor_time in zip(query_idx.tolist(), song_ids.tolist(), anchor_times.tolist()):
+            hash_val = query_hashes[i]
+            matches.setdefault(song_id, {}).setdefault(hash_val, []).append(anchor_time)
+        return matches
@@ -1,8 +1,8 @@
-import audiofile as af
 import numpy as np
 import logging
+import soxr
 from pathlib import Path
-from typing import Tuple
+from typing import Iterator, Tuple
 
 
 logger = logging.getLogger(__name__)
@@ -12,43 +12,106 @@ class AudioLoader:
     A class to handle loading and preprocessing of audio files.
     """
     
-    def __init__(self, sr: float = 44100, mono: bool = True) -> None:
+    def __init__(self, sr: float | None = 44100, mono: bool = True, block_seconds: float = 10.0) -> None:
       """
       Initialize the AudioLoader.
 
       Args:
-          sr (int): Target sample rate.
+          sr (int | None): Target sample rate; audio at another rate is resampled.
+                           None keeps the file's native rate.
           mono (bool): Convert to mono if True.
+          block_seconds (float): Length of the blocks `iter_blocks` decodes at a time.
       
       """
       self.sr = sr
       self.mono = mono
+      self.block_seconds = block_seconds
 
     def load(self, filepath: str | Path) -> Tuple[np.ndarray, int]:
         """
         Load an audio file and preprocess it.
+
+        Returns:
+            Tuple[np.ndarray, int]: The samples (1-D if mono, else (channels, samples)) and their rate.
+        """
+        blocks = list(self.iter_blocks(filepath))
+        audio = np.concatenate(blocks, axis=-1)
+        sr = self.sr or self._native_rate(filepath)
+        logger.debug("Audio loaded successfully: %d samples at %d Hz", audio.shape[-1], sr)
+        return audio, sr
+
+    def iter_blocks(self, filepath: str | Path) -> Iterator[np.ndarray]:
         """
+        Decode a file block by block, downmixed and resampled to the target rate.
+
+        Only one block of the source is in memory at a time. Formats libsndfile cannot
+        read (e.g. m4a) fall back to decoding the whole file with audiofile.
+        """
+        # Decoders are imported on first use: recognition from PCM never needs them.
+        import soundfile as sf
+
         filepath = Path(filepath)
 
         if not filepath.exists():
-          logger.error(f"File not found: {filepath}")
+          logger.error("File not found: %s", filepath)
           raise FileNotFoundError(f"Audio file not found: {filepath}")
        
         try:
-          logger.info(f"Loading audio file: {filepath}")
-          audio, sr = af.read(str(filepath))
-        
-          if audio.size == 0:
-              logger.error("Loaded audio is empty")
-              raise ValueError("Audio file containes no data")
-          
-          # Convert stereo to mono if required
-          if self.mono and audio.ndim > 1:
-                audio = np.mean(audio, axis=0)
-          
-          logger.info(f"Audio loaded successfully: {audio.shape[0]} samples at {sr} Hz")
-          return audio, sr
+          logger.debug("Loading audio file: %s", filepath)
+          try:
+              source = sf.SoundFile(str(filepath))
+          except sf.LibsndfileError:
+              yield from self._iter_whole_file(filepath)
+              return
+
+          with source:
+              if source.frames == 0:
+                  logger.error("Loaded audio is empty")
+                  raise ValueError("Audio file containes no data")
+
+              channels = 1 if self.mono else source.channels
+              resampler = None
+              if self.sr and source.samplerate != self.sr:
+                  resampler = soxr.ResampleStream(source.samplerate, self.sr, channels, dtype="float32")
+
+              blocksize = max(1, int(self.block_seconds * source.samplerate))
+              for block in source.blocks(blocksize=blocksize, dtype="float32", always_2d=True):
+                  # Convert stereo to mono if required
+                  block = block.mean(axis=1) if self.mono else block
+                  if resampler is not None:
+                      block = resampler.resample_chunk(block)
+                  yield self._to_output(block)
+              if resampler is not None:
+                  yield self._to_output(resampler.resample_chunk(np.zeros((0,) + block.shape[1:], dtype=np.float32),
+                                                                 last=True))
        
         except Exception as e:
-            logger.exception(f"Error loading audio file {filepath}: {e}")
-            raise ValueError(f"Failed to load audio file {filepath}: {e}") from e
\ No newline at end of file
+            logger.exception("Error loading audio file %s: %s", filepath, e)
+            raise ValueError(f"Failed to load audio file {filepath}: {e}") from e
+
+    def _iter_whole_file(self, filepath: Path) -> Iterator[np.ndarray]:
+        import audiofile as af
+        audio, sr = af.read(str(filepath))
+        if audio.size == 0:
+            logger.error("Loaded audio is empty")
+            raise ValueError("Audio file containes no data")
+
+        # Convert stereo to mono if required
+        if self.mono and audio.ndim > 1:
+            audio = np.mean(audio, axis=0)
+        if self.sr and sr != self.sr:
+            audio = soxr.resample(audio.T, sr, self.sr).T
+        yield audio.astype(np.float32, copy=False)
+
+    def _to_output(self, block: np.ndarray) -> np.ndarray:
+        # Mono blocks are 1-D; multichannel blocks are (channels, samples) like audiofile returns.
+        return block if block.ndim == 1 else block.T
+
+    @staticmethod
+    def _native_rate(filepath: str | Path) -> int:
+        import audiofile as af
+        import soundfile as sf
+        try:
+            return sf.info(str(filepath)).samplerate
+        except sf.LibsndfileError:
+            return af.sampling_rate(str(filepath))
@@ -0,0 +1,239 @@
+import logging
+from typing import NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+from audio_fingerprint.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Match(NamedTuple):
+    """Outcome of matching a query against the catalog."""
+    song_id: Optional[int]
+    offset: int            # Aligned offset of the query inside the song (in frames)
+    score: int             # Number of postings agreeing on that offset
+    confidence: float      # score normalized by the number of query fingerprints, in [0, 1]
+
+
+NO_MATCH = Match(None, 0, 0, 0.0)
+
+
+class OffsetHistogramMatcher:
+    """
+    Scores candidate songs with a histogram of time offsets.
+
+    Every query fingerprint (hash, t_query) that also appears in the catalog as
+    (hash, song_id, t_db) votes for the pair (song_id, t_db - t_query). The true song
+    accumulates its votes on a single offset, while chance collisions spread out, so the
+    tallest histogram bin identifies both the song and where the clip starts in it.
+
+    All postings for the query are fetched with one batched `lookup` call and the
+    histogram is built with array operations, so the cost is linear in the number of
+    postings.
+
+    Hashes that occur in many songs (steady tones, silence artifacts) carry little
+    evidence. With `stop_df`, query hashes found in more than that many songs are dropped
+    before the lookup, which bounds the postings scanned per query. With `idf_weighting`,
+    each vote counts log((1 + N) / (1 + df)) + 1 for a catalog of N songs, and the best bin
+    is the one with the most weighted evidence.
+    """
+
+    def __init__(self, backend, offset_bin: int = 1, min_score: int = 1,
+                 stop_df: int | None = None, idf_weighting: bool = False) -> None:
+        """
+        Args:
+            backend: Object exposing `lookup(query_hashes)` (e.g. a Database), plus
+                     `document_frequencies(query_hashes)` and `song_count()` when stop_df
+                     or idf_weighting is used.
+            offset_bin (int): Width of an offset histogram bin, in frames.
+            min_score (int): Minimum number of aligned votes required to report a match.
+            stop_df (int | None): Ignore query hashes found in more than this many songs.
+            idf_weighting (bool): Weight votes by the rarity of their hash.
+        """
+        if offset_bin < 1:
+            raise ValueError("offset_bin must be >= 1")
+        self.backend = backend
+        self.offset_bin = offset_bin
+        self.min_score = min_score
+        self.stop_df = stop_df
+        self.idf_weighting = idf_weighting
+
+    def match(self, fingerprints: Sequence[Tuple]) -> Match:
+        """Find the best matching song for a list of (hash, anchor_time) fingerprints."""
+        if len(fingerprints) == 0:
+            return NO_MATCH
+
+        hashes, times = self._split(fingerprints)
+        unique_hashes, query_hash_idx = np.unique(hashes, return_inverse=True)
+
+        with metrics.timer("lookup"):
+            hash_weights = None
+            kept = np.arange(unique_hashes.size)
+            if self.stop_df is not None or self.idf_weighting:
+                df = self.backend.document_frequencies(unique_hashes.tolist())
+                if self.stop_df is not None:
+                    kept = np.flatnonzero(df <= self.stop_df)
+                    metrics.count("stop_hashes_dropped", unique_hashes.size - kept.size)
+                if self.idf_weighting:
+                    n_songs = self.backend.song_count()
+                    hash_weights = np.log((1.0 + n_songs) / (1.0 + df)) + 1.0
+
+            post_idx, post_songs, post_times = self.backend.lookup(unique_hashes[kept].tolist())
+            post_idx = kept[post_idx]
+        metrics.count("postings_scanned", int(post_idx.size))
+        if post_idx.size == 0:
+            return NO_MATCH
+
+        with metrics.timer("scoring"):
+            return self._vote(query_hash_idx, times, post_idx, post_songs, post_times,
+                              n_query=len(hashes), hash_weights=hash_weights)
+
+    def _vote(self, query_hash_idx: np.ndarray, query_times: np.ndarray, post_idx: np.ndarray,
+              post_songs: np.ndarray, post_times: np.ndarray, n_query: int,
+              hash_weights: Optional[np.ndarray]) -> Match:
+        """Score every song that shares a hash with the query."""
+        song_ids, offsets, vote_hash_idx = self._join(query_hash_idx, query_times, post_idx, post_songs, post_times)
+        weights = hash_weights[vote_hash_idx] if hash_weights is not None else None
+        return self._score(song_ids, offsets, n_query=n_query, weights=weights)
+
+    @staticmethod
+    def _split(fingerprints: Sequence[Tuple]) -> Tuple[np.ndarray, np.ndarray]:
+        if isinstance(fingerprints, np.ndarray) and fingerprints.dtype.names:
+            first, second = fingerprints.dtype.names[:2]
+            return fingerprints[first], fingerprints[second].astype(np.int64)
+        hashes, times = zip(*fingerprints)
+        return np.asarray(hashes), np.asarray(times, dtype=np.int64)
+
+    @staticmethod
+    def _join(query_hash_idx: np.ndarray, query_times: np.ndarray,
+              post_idx: np.ndarray, post_songs: np.ndarray,
+              post_times: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Pair every posting with every query occurrence of the same hash and return the
+        resulting (song_id, db_time - query_time) votes, plus the hash index of each vote.
+        """
+        # Group query times by hash so each hash owns a contiguous slice.
+        order = np.argsort(query_hash_idx, kind="stable")
+        grouped_times = query_times[order]
+        counts = np.bincount(query_hash_idx, minlength=int(post_idx.max()) + 1)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        per_posting = counts[post_idx]
+        total = int(per_posting.sum())
+        posting_of_vote = np.repeat(np.arange(post_idx.size), per_posting)
+        vote_starts = np.cumsum(per_posting) - per_posting
+        within = np.arange(total) - np.repeat(vote_starts, per_posting)
+        q_times = grouped_times[starts[post_idx][posting_of_vote] + within]
+
+        return post_songs[posting_of_vote], post_times[posting_of_vote] - q_times, post_idx[posting_of_vote]
+
+    def _score(self, song_ids: np.ndarray, offsets: np.ndarray, n_query: int,
+               weights: Optional[np.ndarray] = None) -> Match:
+        bins = np.floor_divide(offsets, self.offset_bin)
+
+        # Fold (song_id, bin) into one integer key so a single 1-D unique builds the histogram.
+        min_bin = bins.min()
+        span = int(bins.max() - min_bin) + 1
+        keys = song_ids * span + (bins - min_bin)
+        if weights is None:
+            unique_keys, votes = np.unique(keys, return_counts=True)
+            best = int(np.argmax(votes))
+        else:
+            # Pick the bin with the most weighted evidence; score stays a plain vote count.
+            unique_keys, key_idx, votes = np.unique(keys, return_inverse=True, return_counts=True)
+            best = int(np.argmax(np.bincount(key_idx, weights=weights)))
+        score = int(votes[best])
+        if score < self.min_score:
+            return NO_MATCH
+
+        song_id = int(unique_keys[best] // span)
+        offset = int(unique_keys[best] % span + min_bin) * self.offset_bin
+        confidence = min(1.0, score / n_query)
+        logger.debug("Best match: song_id=%d offset=%d score=%d confidence=%.3f",
+                     song_id, offset, score, confidence)
+        return Match(song_id, offset, score, confidence)
+
+
+class TwoStageMatcher(OffsetHistogramMatcher):
+    """
+    Offset-histogram matching restricted to the most promising songs.
+
+    Stage one counts, per song, the votes it would receive from shared hashes
+    regardless of their offset (weighted the same way as the final score) and keeps the
+    `top_k` songs. Stage two builds the offset histogram of those candidates only, in
+    decreasing order of their count. A song's aligned score can never exceed its stage-one
+    count, so verification stops as soon as the next candidate's count cannot beat the
+    best aligned score found so far. The cost of verification is bounded by `top_k`,
+    however many songs happen to share a common hash with the query.
+    """
+
+    def __init__(self, backend, top_k: int = 10, offset_bin: int = 1, min_score: int = 1,
+                 stop_df: int | None = None, idf_weighting: bool = False) -> None:
+        """
+        Args:
+            top_k (int): Number of candidate songs verified by offset alignment.
+            Other arguments as for OffsetHistogramMatcher.
+        """
+        if top_k < 1:
+            raise ValueError("top_k must be >= 1")
+        super().__init__(backend, offset_bin=offset_bin, min_score=min_score,
+                         stop_df=stop_df, idf_weighting=idf_weighting)
+        self.top_k = top_k
+
+    def _vote(self, query_hash_idx: np.ndarray, query_times: np.ndarray, post_idx: np.ndarray,
+              post_songs: np.ndarray, post_times: np.ndarray, n_query: int,
+              hash_weights: Optional[np.ndarray]) -> Match:
+        # Stage 1: offset-free vote totals per song, an upper bound on its aligned score.
+        occurrences = np.bincount(query_hash_idx, minlength=int(post_idx.max()) + 1)
+        posting_votes = occurrences[post_idx].astype(np.float64)
+        if hash_weights is not None:
+            posting_votes *= hash_weights[post_idx]
+        # Song ids are catalog row ids; while they are dense relative to the postings a
+        # bincount over them avoids sorting all postings, otherwise compact them first.
+        if int(post_songs.max()) <= 4 * post_songs.size:
+            song_labels = None
+            song_of_posting = post_songs
+        else:
+            song_labels, song_of_posting = np.unique(post_songs, return_inverse=True)
+        bounds = np.bincount(song_of_posting, weights=posting_votes)
+        n_songs = int(np.count_nonzero(bounds))
+
+        k = min(self.top_k, n_songs)
+        candidates = np.argpartition(-bounds, k - 1)[:k]
+        candidates = candidates[np.argsort(-bounds[candidates], kind="stable")]
+
+        # Only the candidates' postings are gathered and grouped by song.
+        is_candidate = np.zeros(bounds.size, dtype=bool)
+        is_candidate[candidates] = True
+        sel = np.flatnonzero(is_candidate[song_of_posting])
+        sel = sel[np.argsort(song_of_posting[sel], kind="stable")]
+        song_starts = np.searchsorted(song_of_posting[sel], candidates, side="left")
+        song_ends = np.searchsorted(song_of_posting[sel], candidates, side="right")
+
+        best_song, best_bin, best_votes, best_evidence = None, 0, 0, -np.inf
+        verified = 0
+        for c, start, end in zip(candidates.tolist(), song_starts.tolist(), song_ends.tolist()):
+            if bounds[c] <= best_evidence:
+                break  # no remaining candidate can overtake the best one
+            verified += 1
+            rows = sel[start:end]
+            _, offsets, vote_hash_idx = self._join(query_hash_idx, query_times, post_idx[rows],
+                                                   post_songs[rows], post_times[rows])
+            bins, bin_idx, votes = np.unique(np.floor_divide(offsets, self.offset_bin),
+                                             return_inverse=True, return_counts=True)
+            if hash_weights is None:
+                evidence = votes
+            else:
+                evidence = np.bincount(bin_idx, weights=hash_weights[vote_hash_idx])
+            j = int(np.argmax(evidence))
+            if evidence[j] > best_evidence:
+                song_id = int(song_labels[c]) if song_labels is not None else c
+                best_song, best_bin, best_votes, best_evidence = song_id, int(bins[j]), int(votes[j]), evidence[j]
+        metrics.count("candidates_verified", verified)
+
+        if best_song is None or best_votes < self.min_score:
+            return NO_MATCH
+        confidence = min(1.0, best_votes / n_query)
+        logger.debug("Best match: song_id=%d offset=%d score=%d confidence=%.3f (%d/%d candidates verified)",
+                     best_song, best_bin * self.offset_bin, best_votes, confidence, verified, n_songs)
+        return Match(best_song, best_bin * self.offset_bin, best_votes, confidence)
@@ -1,8 +1,9 @@
 import numpy as np
 import logging
+from functools import lru_cache
+from typing import Tuple
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 class MelFilterBank:
     def __init__(self, sr: float, n_fft: int, n_mels: int=128, fmin: int=0, fmax=None) -> None:
@@ -22,51 +23,93 @@ class MelFilterBank:
         """Convert Mel scale back to Hz."""
         return 700 * (10**(mel / 2595.0) - 1)
 
-    def mel_filter_bank(self):
-        """Create a Mel filter bank."""
+    def _validate(self):
+        if self.sr <= 0:
+            raise ValueError("Sample rate must be positive")
+        if self.n_fft <= 0:
+            raise ValueError("FFT size must be positive")
+        if self.n_mels <= 0:
+            raise ValueError("Number of mel bands must be positive")
+
+        if self.fmax is None:
+            self.fmax = self.sr / 2
+
+        if self.fmax > self.sr / 2:
+            raise ValueError("fmax cannot exceed Nyquist frequency (sr/2)")
+
+    def _key(self) -> Tuple:
+        return (float(self.sr), int(self.n_fft), int(self.n_mels), float(self.fmin), float(self.fmax))
+
+    def mel_filter_bank(self) -> np.ndarray:
+        """
+        Create a Mel filter bank of shape (n_mels, n_fft // 2 + 1).
+
+        Filterbanks are built once per (sr, n_fft, n_mels, fmin, fmax) and cached; the
+        returned array is shared and read-only.
+        """
         try:
-            if self.sr <= 0:
-                raise ValueError("Sample rate must be positive")
-            if self.n_fft <= 0:
-                raise ValueError("FFT size must be positive")
-            if self.n_mels <= 0:
-                raise ValueError("Number of mel bands must be positive")
+            self._validate()
+            return _build_filters(*self._key())
+
+        except Exception as e:
+            logger.error("Error creating mel filter bank: %s", e)
+            raise
 
-            if self.fmax is None:
-                self.fmax = self.sr / 2
+    def apply(self, power_spec: np.ndarray) -> np.ndarray:
+        """
+        Project a power spectrum (frames, freq_bins) onto the mel bands -> (n_mels, frames).
 
-            if self.fmax > self.sr / 2:
-                raise ValueError("fmax cannot exceed Nyquist frequency (sr/2)")
+        Equivalent to `mel_filter_bank() @ power_spec.T`, but each filter only touches the
+        contiguous run of FFT bins where it is nonzero.
+        """
+        self._validate()
+        bands = _build_bands(*self._key())
+        mel_spec = np.zeros((self.n_mels, power_spec.shape[0]))
+        for m, lo, hi, weights in bands:
+            mel_spec[m] = power_spec[:, lo:hi] @ weights
+        return mel_spec
 
-            logger.info(f"Creating mel filter bank: sr={self.sr}, n_fft={self.n_fft}, "
-                        f"n_mels={self.n_mels}, fmin={self.fmin}, fmax={self.fmax}")
 
-            # Hz -> Mel
-            mel_min = self.hz_to_mel(self.fmin)
-            mel_max = self.hz_to_mel(self.fmax)
+@lru_cache(maxsize=None)
+def _build_filters(sr: float, n_fft: int, n_mels: int, fmin: float, fmax: float) -> np.ndarray:
+    logger.debug("Creating mel filter bank: sr=%s, n_fft=%s, n_mels=%s, fmin=%s, fmax=%s",
+                 sr, n_fft, n_mels, fmin, fmax)
 
-            # Mel points -> Hz points
-            mel_points = np.linspace(mel_min, mel_max, self.n_mels + 2)
-            hz_points = self.mel_to_hz(mel_points)
+    # Hz -> Mel
+    mel_min = MelFilterBank.hz_to_mel(fmin)
+    mel_max = MelFilterBank.hz_to_mel(fmax)
 
-            # Hz -> FFT bin indices
-            bin_points = np.floor((self.n_fft + 1) * hz_points / self.sr).astype(int)
+    # Mel points -> Hz points
+    mel_points = np.linspace(mel_min, mel_max, n_mels + 2)
+    hz_points = MelFilterBank.mel_to_hz(mel_points)
 
-            # Build filters
-            filters = np.zeros((self.n_mels, self.n_fft // 2 + 1))
-            for m in range(1, self.n_mels + 1):
-                f_m_minus = bin_points[m - 1]
-                f_m = bin_points[m]
-                f_m_plus = bin_points[m + 1]
+    # Hz -> FFT bin indices
+    bin_points = np.floor((n_fft + 1) * hz_points / sr).astype(int)
 
-                for k in range(f_m_minus, f_m):
-                    filters[m - 1, k] = (k - f_m_minus) / (f_m - f_m_minus)
-                for k in range(f_m, f_m_plus):
-                    filters[m - 1, k] = (f_m_plus - k) / (f_m_plus - f_m)
+    # Build all triangles at once: rising edge on [left, center), falling edge on [center, right)
+    left = bin_points[:-2, None]
+    center = bin_points[1:-1, None]
+    right = bin_points[2:, None]
+    k = np.arange(n_fft // 2 + 1)[None, :]
 
-            logger.info("Mel filter bank created successfully")
-            return filters
+    rising = (k >= left) & (k < center)
+    falling = (k >= center) & (k < right)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        filters = np.where(rising, (k - left) / (center - left), 0.0)
+        filters = np.where(falling, (right - k) / (right - center), filters)
 
-        except Exception as e:
-            logger.error(f"Error creating mel filter bank: {e}")
-            raise
+    filters.flags.writeable = False
+    return filters
+
+
+@lru_cache(maxsize=None)
+def _build_bands(sr: float, n_fft: int, n_mels: int, fmin: float, fmax: float) -> Tuple[Tuple[int, int, int, np.ndarray], ...]:
+    """(mel_index, first_bin, end_bin, weights) for every non-empty filter."""
+    filters = _build_filters(sr, n_fft, n_mels, fmin, fmax)
+    bands = []
+    for m, row in enumerate(filters):
+        nonzero = np.flatnonzero(row)
+        if nonzero.size:
+            lo, hi = int(nonzero[0]), int(nonzero[-1]) + 1
+            bands.append((m, lo, hi, np.ascontiguousarray(row[lo:hi])))
+    return tuple(bands)
@@ -0,0 +1,155 @@
+"""
+Low-overhead instrumentation of the fingerprinting pipeline.
+
+Stages (load, stft, mel, peaks, hashing, lookup, scoring, ...) are timed into latency
+histograms and work done is tallied in counters (peaks, fingerprints, postings scanned).
+Everything is off until `metrics.enable()` is called; while disabled, `metrics.timer()`
+returns a shared no-op context manager and `metrics.count()` returns after one attribute
+check, so instrumented code pays almost nothing.
+
+    from audio_fingerprint.metrics import metrics
+
+    with metrics.timer("stft"):
+        spec = stft.compute_stft(audio)
+    metrics.count("peaks", len(peaks))
+
+`metrics.render_prometheus()` returns the Prometheus text exposition format.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+METRIC_PREFIX = "audiodna"
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("registry", "stage", "start")
+
+    def __init__(self, registry: "Metrics", stage: str) -> None:
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _Histogram:
+    __slots__ = ("bucket_counts", "total", "count")
+
+    def __init__(self, n_buckets: int) -> None:
+        self.bucket_counts = [0] * (n_buckets + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """Thread-safe registry of stage latency histograms and counters."""
+
+    def __init__(self, enabled: bool = False, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, _Histogram] = {}
+        self._counters: Dict[str, int] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def timer(self, stage: str):
+        """Context manager recording the duration of its block under `stage`."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = _Histogram(len(self.buckets))
+            histogram.bucket_counts[i] += 1
+            histogram.total += seconds
+            histogram.count += 1
+
+    def count(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Plain-dict copy of the current values, e.g. for JSON reports."""
+        with self._lock:
+            return {
+                "stages": {
+                    stage: {"count": h.count, "sum_seconds": h.total,
+                            "buckets": dict(zip(self.buckets + (float("inf"),), h.bucket_counts))}
+                    for stage, h in self._histograms.items()
+                },
+                "counters": dict(self._counters),
+            }
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            histograms = sorted((stage, list(h.bucket_counts), h.total, h.count)
+                                for stage, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines: List[str] = [
+            f"# HELP {name} Time spent in each pipeline stage.",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, bucket_counts, total, count in histograms:
+            cumulative = 0
+            for bound, n in zip(self.buckets, bucket_counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.9g}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        for counter, value in counters:
+            counter_name = f"{METRIC_PREFIX}_{counter}_total"
+            lines.append(f"# TYPE {counter_name} counter")
+            lines.append(f"{counter_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by the library and the server.
+metrics = Metrics()
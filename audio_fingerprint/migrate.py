@@ -0,0 +1,183 @@
+"""
+Convert a catalog from truncated SHA-1 hashes to packed 32-bit integer hashes.
+
+SHA-1 is one-way, but a fingerprint hash only ever encodes a (freq1, freq2, dt) triple
+from a small domain (mel bins x mel bins x frame deltas). The migration enumerates that
+domain once, builds a digest -> triple table and rewrites every fingerprint with its
+packed integer key, so existing catalogs can be converted without the source audio.
+
+Usage:
+    python -m audio_fingerprint.migrate music.db music_packed.db
+"""
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import time
+from typing import Dict, List
+
+from audio_fingerprint.database import SONG_COLUMNS, Database
+from audio_fingerprint.fingerprint import (
+    Fingerprinter,
+    HASH_MODE_PACKED,
+    HASH_MODE_SHA1,
+    pack_hash,
+    sha1_hash,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50_000
+
+
+def build_reverse_table(n_mels: int, t_min: int, t_max: int, f_range: int | None) -> Dict[str, int]:
+    """
+    Map every reachable SHA-1 digest to its packed integer hash.
+
+    Args:
+        n_mels (int): Number of mel bins the catalog was built with.
+        t_min (int): Smallest anchor/target frame delta.
+        t_max (int): Largest anchor/target frame delta.
+        f_range (int | None): Max |freq1 - freq2|; None enumerates every frequency pair.
+    """
+    table = {}
+    for f1 in range(n_mels):
+        lo, hi = (0, n_mels) if f_range is None else (max(0, f1 - f_range), min(n_mels, f1 + f_range + 1))
+        for f2 in range(lo, hi):
+            for dt in range(t_min, t_max + 1):
+                table[sha1_hash(f1, f2, dt)] = pack_hash(f1, f2, dt)
+    return table
+
+
+def database_size(conn: sqlite3.Connection) -> Dict[str, int | None]:
+    """Total file size and, when SQLite exposes dbstat, the bytes used by each object."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    sizes: Dict[str, int | None] = {"total": page_size * page_count,
+                                    "fingerprints": None, "idx_hash": None}
+    try:
+        for name, size in conn.execute(
+            "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN ('fingerprints', 'idx_hash') GROUP BY name"
+        ):
+            sizes[name] = size
+    except sqlite3.OperationalError:
+        logger.info("dbstat virtual table unavailable; reporting total file size only")
+    return sizes
+
+
+def time_lookups(db: Database, hashes: List, rounds: int = 20) -> float:
+    """Mean seconds per batched lookup of `hashes`."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        db.lookup(hashes)
+    return (time.perf_counter() - start) / rounds
+
+
+def migrate(src_path: str, dst_path: str, n_mels: int = 128,
+            t_min: int = Fingerprinter.DEFAULT_TARGET_T_MIN,
+            t_max: int = Fingerprinter.DEFAULT_TARGET_T_MAX,
+            f_range: int | None = Fingerprinter.DEFAULT_TARGET_F_RANGE,
+            sample_size: int = 500) -> Dict:
+    """
+    Copy the catalog at src_path into a new packed-hash catalog at dst_path.
+
+    The source is opened read-only and left untouched. Returns a report with row counts,
+    unmapped hashes, sizes and lookup timings.
+    """
+    if os.path.exists(dst_path):
+        raise FileExistsError(f"Refusing to overwrite existing database: {dst_path}")
+
+    src = Database(src_path, readonly=True)
+    if src.hash_mode != HASH_MODE_SHA1:
+        raise ValueError(f"{src_path} already uses {src.hash_mode} hashes")
+
+    logger.info("Enumerating hash domain: n_mels=%d, dt=[%d, %d], f_range=%s", n_mels, t_min, t_max, f_range)
+    reverse = build_reverse_table(n_mels, t_min, t_max, f_range)
+
+    dst = Database(dst_path, hash_mode=HASH_MODE_PACKED)
+    dst.conn.execute("DROP INDEX IF EXISTS idx_hash")
+    # Older sources lack some song columns and tables; the new catalog has them all.
+    src_columns = {row[1] for row in src.conn.execute("PRAGMA table_info(songs)")}
+    columns = [c for c in SONG_COLUMNS.split(", ") if c in src_columns]
+    dst.conn.executemany(
+        f"INSERT INTO songs ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+        src.conn.execute(f"SELECT {', '.join(columns)} FROM songs"),
+    )
+    src_tables = {name for (name,) in src.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "catalog_info" in src_tables:
+        dst.conn.executemany("INSERT INTO catalog_info (key, value) VALUES (?, ?)",
+                             src.conn.execute("SELECT key, value FROM catalog_info"))
+
+    copied, unmapped = 0, 0
+    rows = src.conn.execute("SELECT hash, song_id, anchor_time FROM fingerprints ORDER BY rowid")
+    while True:
+        batch = rows.fetchmany(BATCH_SIZE)
+        if not batch:
+            break
+        converted = []
+        for h, song_id, anchor_time in batch:
+            packed = reverse.get(h)
+            if packed is None:
+                unmapped += 1
+                continue
+            converted.append((packed, song_id, anchor_time))
+        dst.conn.executemany("INSERT INTO fingerprints (hash, song_id, anchor_time) VALUES (?, ?, ?)", converted)
+        copied += len(converted)
+    dst.conn.execute("CREATE INDEX IF NOT EXISTS idx_hash ON fingerprints (hash)")
+    dst.conn.executemany(
+        "INSERT INTO hash_stats (hash, df) VALUES (?, ?)",
+        ((reverse[h], df) for h, df in src.conn.execute(
+            "SELECT hash, df FROM hash_stats" if "hash_stats" in src_tables
+            else "SELECT hash, COUNT(DISTINCT song_id) FROM fingerprints GROUP BY hash") if h in reverse),
+    )
+    dst.conn.commit()
+    dst.conn.execute("VACUUM")
+
+    if unmapped:
+        logger.warning("%d fingerprints had hashes outside the enumerated domain and were dropped", unmapped)
+
+    sample = [h for (h,) in src.conn.execute(
+        "SELECT DISTINCT hash FROM fingerprints LIMIT ?", (sample_size * 10,))]
+    sample = random.sample(sample, min(sample_size, len(sample)))
+    report = {
+        "fingerprints_copied": copied,
+        "fingerprints_unmapped": unmapped,
+        "size_before": database_size(src.conn),
+        "size_after": database_size(dst.conn),
+        "lookup_seconds_before": time_lookups(src, sample),
+        "lookup_seconds_after": time_lookups(dst, [reverse[h] for h in sample if h in reverse]),
+    }
+    src.conn.close()
+    dst.conn.close()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert a SHA-1 hash catalog to packed integer hashes.")
+    parser.add_argument("src", help="Existing catalog (e.g. music.db)")
+    parser.add_argument("dst", help="Path of the converted catalog to create")
+    parser.add_argument("--n-mels", type=int, default=128)
+    parser.add_argument("--t-min", type=int, default=Fingerprinter.DEFAULT_TARGET_T_MIN)
+    parser.add_argument("--t-max", type=int, default=Fingerprinter.DEFAULT_TARGET_T_MAX)
+    parser.add_argument("--f-range", type=int, default=Fingerprinter.DEFAULT_TARGET_F_RANGE,
+                        help="Max frequency distance used at ingest; negative enumerates all pairs")
+    args = parser.parse_args()
+
+    report = migrate(args.src, args.dst, n_mels=args.n_mels, t_min=args.t_min, t_max=args.t_max,
+                     f_range=None if args.f_range < 0 else args.f_range)
+
+    before, after = report["size_before"], report["size_after"]
+    print(f"Fingerprints copied:   {report['fingerprints_copied']}")
+    print(f"Fingerprints unmapped: {report['fingerprints_unmapped']}")
+    for key in ("total", "fingerprints", "idx_hash"):
+        if before[key] is not None and after[key] is not None:
+            print(f"{key:<12} {before[key] / 1e6:10.2f} MB -> {after[key] / 1e6:10.2f} MB "
+                  f"({100 * (1 - after[key] / before[key]):.1f}% smaller)")
+    print(f"Batched lookup: {report['lookup_seconds_before'] * 1e3:.2f} ms -> "
+          f"{report['lookup_seconds_after'] * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
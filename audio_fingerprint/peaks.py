@@ -1,14 +1,20 @@
 import numpy as np
 import logging
-from scipy.ndimage import maximum_filter, median_filter
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+
+# Background estimators. "median" is the full 2-D median filter; "fast" takes the median of
+# decimated blocks, median-filters that coarse grid and expands it back.
+BACKGROUND_MEDIAN = "median"
+BACKGROUND_FAST = "fast"
+BACKGROUNDS = (BACKGROUND_MEDIAN, BACKGROUND_FAST)
+
 
 class PeakPicker:
     def __init__(self, neighborhood_size=(15, 7), median_filter_size=(41, 21),
                  offset_db=7.0, peaks_per_band=30, bands_split=6, time_window=60,
-                 max_peaks_per_second=35, sr=44100, hop_size=512):
+                 max_peaks_per_second=35, sr=44100, hop_size=512,
+                 background=BACKGROUND_MEDIAN, decimation=(4, 4)):
         """
         Finds spectral peaks in a log-mel spectrogram using an adaptive threshold.
 
@@ -22,11 +28,16 @@ class PeakPicker:
             max_peaks_per_second (int): Global cap of peaks per second.
             sr (int): Sample rate (for time conversion).
             hop_size (int): Hop size between STFT frames.
+            background (str): "median" for the exact median-filter background, "fast" for
+                              the decimated-grid estimate (much cheaper, approximate).
+            decimation (tuple): Block size (freq_bins, time_frames) of the "fast" background grid.
         """
+        if background not in BACKGROUNDS:
+            raise ValueError(f"Unknown background {background!r}, expected one of {BACKGROUNDS}")
         if not all(s % 2 == 1 for s in neighborhood_size):
-            logger.warning(f"neighborhood_size {neighborhood_size} should have odd dimensions for symmetry.")
+            logger.warning("neighborhood_size %s should have odd dimensions for symmetry.", neighborhood_size)
         if not all(s % 2 == 1 for s in median_filter_size):
-            logger.warning(f"median_filter_size {median_filter_size} should have odd dimensions for symmetry.")
+            logger.warning("median_filter_size %s should have odd dimensions for symmetry.", median_filter_size)
 
         self.neighborhood_size = neighborhood_size
         self.median_filter_size = median_filter_size
@@ -37,12 +48,14 @@ class PeakPicker:
         self.max_peaks_per_second = max_peaks_per_second
         self.sr = sr
         self.hop_size = hop_size
+        self.background = background
+        self.decimation = decimation
 
     def find_peaks(self, mel_log_spec):
         try:
-            logger.info(f"Running peak picking: neighborhood={self.neighborhood_size}, "
-                        f"offset_db={self.offset_db}, time_window={self.time_window}, "
-                        f"max_peaks_per_second={self.max_peaks_per_second}")
+            logger.debug("Running peak picking: neighborhood=%s, offset_db=%s, time_window=%s, "
+                         "max_peaks_per_second=%s", self.neighborhood_size, self.offset_db,
+                         self.time_window, self.max_peaks_per_second)
 
             if np.max(mel_log_spec) <= 0:
                 logger.warning("Spectrogram has zero or negative energy, no peaks found.")
@@ -50,11 +63,14 @@ class PeakPicker:
 
             spec_db = mel_log_spec
 
+            # scipy.ndimage takes ~0.4 s to import, so it is loaded on first use.
+            from scipy.ndimage import maximum_filter
+
             # 1. Local maxima
             local_max = maximum_filter(spec_db, size=self.neighborhood_size, mode='constant') == spec_db
 
             # 2. Local background
-            background = median_filter(spec_db, size=self.median_filter_size, mode='constant')
+            background = self._background(spec_db)
 
             # 3. Apply adaptive threshold
             detected_peaks = local_max & (spec_db > background + self.offset_db)
@@ -80,44 +96,68 @@ class PeakPicker:
                 return np.empty((0, 3))
 
             # 6. Distribute across frequency bands + time windows
-            final_peaks = []
-            total_freq_bins = mel_log_spec.shape[0]
-            band_step = total_freq_bins // self.bands_split if self.bands_split > 0 else total_freq_bins
+            final_peaks = self._limit_per_band(peaks, mel_log_spec.shape[0])
 
-            for start in range(0, total_freq_bins, band_step):
-                end = min(start + band_step, total_freq_bins)
-                band_peaks = peaks[(peaks[:, 1] >= start) & (peaks[:, 1] < end)]
+            # 7. Apply per-second cap
+            final_peaks = self._limit_per_second(final_peaks)
 
-                if band_peaks.shape[0] == 0:
-                    continue
+            logger.debug("Found %d peaks after band+time+per-second limiting", len(final_peaks))
+            return final_peaks
 
-                max_time = int(np.max(band_peaks[:, 0])) + 1
-                for t0 in range(0, max_time, self.time_window):
-                    t1 = t0 + self.time_window
-                    time_slice = band_peaks[(band_peaks[:, 0] >= t0) & (band_peaks[:, 0] < t1)]
-                    if time_slice.shape[0] == 0:
-                        continue
+        except Exception as e:
+            logger.error("Error in peak picking: %s", e)
+            raise
 
-                    sorted_time_peaks = time_slice[np.argsort(-time_slice[:, 2])]
-                    final_peaks.extend(sorted_time_peaks[:self.peaks_per_band])
+    def _background(self, spec_db: np.ndarray) -> np.ndarray:
+        from scipy.ndimage import median_filter
 
-            final_peaks = np.array(final_peaks)
+        if self.background == BACKGROUND_MEDIAN:
+            return median_filter(spec_db, size=self.median_filter_size, mode='constant')
 
-            # 7. Apply per-second cap
-            if final_peaks.shape[0] > 0:
-                times_sec = final_peaks[:, 0] * (self.hop_size / self.sr)
-                clipped = []
-                for sec in np.unique(times_sec.astype(int)):
-                    idxs = np.where(times_sec.astype(int) == sec)[0]
-                    if len(idxs) > self.max_peaks_per_second:
-                        # keep loudest N
-                        idxs = idxs[np.argsort(-final_peaks[idxs, 2])[:self.max_peaks_per_second]]
-                    clipped.extend(final_peaks[idxs])
-                final_peaks = np.array(clipped)
-
-            logger.info(f"Found {len(final_peaks)} peaks after band+time+per-second limiting")
-            return final_peaks
+        # Median of each decimation block, median-filtered on the coarse grid with a
+        # footprint scaled down accordingly, then repeated back to full resolution.
+        df, dt = self.decimation
+        n_freq, n_time = spec_db.shape
+        pad_f, pad_t = -n_freq % df, -n_time % dt
+        padded = np.pad(spec_db, ((0, pad_f), (0, pad_t)), mode='edge')
+        blocks = padded.reshape(padded.shape[0] // df, df, padded.shape[1] // dt, dt)
+        coarse = np.median(blocks.transpose(0, 2, 1, 3).reshape(blocks.shape[0], blocks.shape[2], -1), axis=-1)
 
-        except Exception as e:
-            logger.error(f"Error in peak picking: {e}")
-            raise
+        size = tuple(max(1, round(s / d)) | 1 for s, d in zip(self.median_filter_size, self.decimation))
+        coarse_bg = median_filter(coarse, size=size, mode='constant')
+        return np.repeat(np.repeat(coarse_bg, df, axis=0), dt, axis=1)[:n_freq, :n_time]
+
+    def _limit_per_band(self, peaks: np.ndarray, total_freq_bins: int) -> np.ndarray:
+        """
+        Keep the `peaks_per_band` loudest peaks of every (frequency band, time window) cell.
+
+        Output is ordered by band, then window, then decreasing amplitude.
+        """
+        band_step = max(1, total_freq_bins // self.bands_split) if self.bands_split > 0 else total_freq_bins
+        band = peaks[:, 1].astype(np.int64) // band_step
+        window = peaks[:, 0].astype(np.int64) // self.time_window
+        cell = band * (int(window.max()) + 1) + window
+
+        order = np.lexsort((-peaks[:, 2], cell))
+        return peaks[order[self._rank_in_group(cell[order]) < self.peaks_per_band]]
+
+    def _limit_per_second(self, peaks: np.ndarray) -> np.ndarray:
+        """
+        Cap every second at `max_peaks_per_second` peaks, keeping the loudest.
+
+        Output is ordered by second; seconds under the cap keep their input order, capped
+        seconds are ordered by decreasing amplitude.
+        """
+        if peaks.shape[0] == 0:
+            return peaks
+        second = (peaks[:, 0] * (self.hop_size / self.sr)).astype(int)
+        over_cap = np.bincount(second)[second] > self.max_peaks_per_second
+        within = np.where(over_cap, -peaks[:, 2], np.arange(peaks.shape[0]))
+
+        order = np.lexsort((within, second))
+        return peaks[order[self._rank_in_group(second[order]) < self.max_peaks_per_second]]
+
+    @staticmethod
+    def _rank_in_group(sorted_groups: np.ndarray) -> np.ndarray:
+        """Position of each element within its run of equal values in a sorted array."""
+        return np.arange(sorted_groups.size) - np.searchsorted(sorted_groups, sorted_groups, side='left')
@@ -1,60 +1,64 @@
-from collections import defaultdict
-from typing import List, Optional, Tuple
-from audio_fingerprint.fingerprint_extracter import FingerprintExtracter
+from typing import List
+from audio_fingerprint.fingerprint_extracter import DEFAULT_SAMPLE_RATE, ExtractionParams, FingerprintExtracter
 from audio_fingerprint.database import Database
+from audio_fingerprint.index import InMemoryIndex
+from audio_fingerprint.matcher import Match, OffsetHistogramMatcher, TwoStageMatcher
+from audio_fingerprint.metrics import metrics
+from audio_fingerprint.peaks import BACKGROUND_MEDIAN
 import numpy as np
 
 
 class Recognizer:
-    def __init__(self, db: Database) -> None:
+    def __init__(self, db: Database, index: InMemoryIndex | None = None, idf_weighting: bool = False,
+                 top_k: int | None = 10, sample_rate: int = DEFAULT_SAMPLE_RATE,
+                 params: ExtractionParams | None = None, peak_background: str = BACKGROUND_MEDIAN) -> None:
+        """
+        Args:
+            db (Database): The catalog. Its stop_df threshold also applies to queries.
+            index (InMemoryIndex | None): Optional in-memory index to serve lookups from
+                                          instead of querying SQLite.
+            idf_weighting (bool): Weight matching votes by how rare their hash is.
+            top_k (int | None): Verify offset alignment only for the top_k songs sharing the
+                                most hashes with the query (TwoStageMatcher); None scores
+                                every song that shares a hash.
+            sample_rate (int): Analysis sample rate; must be the one the catalog was built at
+                               (ValueError otherwise, if the catalog records it).
+            params (ExtractionParams | None): Extraction parameters the catalog was built with
+                                              (checked like sample_rate).
+            peak_background (str): Peak picker background estimate used on queries.
+        """
         self.db = db
-        self.extracter = FingerprintExtracter()
-
-    def recognize(self, audio: np.ndarray):
-        fingerprints = self.extracter.from_pcm(audio)
-        
-        return self._match(fingerprints)
-
-    def _match(self, fingerprints: List[Tuple[str, int]], tolerance_ms: int = 100) -> Tuple[Optional[int], int]:
-        match_scores = defaultdict(int)
-        query_by_hash = defaultdict(list)
-
-        for h, t in fingerprints:
-            query_by_hash[h].append(t)
-
-        for h, query_times in query_by_hash.items():
-            db_matches = self.db.find_matches([h])
-            if not db_matches:
-                continue
-
-            for song_id, song_hashes in db_matches.items():
-                if h not in song_hashes:
-                    continue
-                db_times = song_hashes[h]
-
-                for i in range(len(query_times)):
-                    for j in range(i + 1, len(query_times)):
-                        q_gap = abs(query_times[j] - query_times[i])
-                        for m in range(len(db_times)):
-                            for n in range(m + 1, len(db_times)):
-                                db_gap = abs(db_times[n] - db_times[m])
-                                if abs(q_gap - db_gap) <= tolerance_ms:
-                                    match_scores[song_id] += 1
-
-        # pick best
-        best_song, best_score = None, 0
-        for song_id, score in match_scores.items():
-            if score > best_score:
-                best_song, best_score = song_id, score
-
-        # if no song found, return None
-        if best_song is None:
-            return None, 0  
-
-        return best_song, best_score
-
-
-
-
-
-
+        self.index = index
+        self.extracter = FingerprintExtracter(hash_mode=db.hash_mode, peak_background=peak_background,
+                                              sample_rate=sample_rate, params=params)
+        db.check_extraction_settings(self.extracter.settings())
+        backend = index if index is not None else db
+        if top_k is None:
+            self.matcher = OffsetHistogramMatcher(backend, stop_df=db.stop_df, idf_weighting=idf_weighting)
+        else:
+            self.matcher = TwoStageMatcher(backend, top_k=top_k, stop_df=db.stop_df,
+                                           idf_weighting=idf_weighting)
+
+    def recognize(self, audio: np.ndarray, sample_rate: int | None = None) -> Match:
+        """
+        Args:
+            sample_rate (int | None): Rate of `audio` when it is not the analysis rate.
+        """
+        with metrics.timer("recognize"):
+            fingerprints = self.extracter.from_pcm(audio, sample_rate)
+
+            return self._match(fingerprints)
+
+    def recognize_batch(self, audios: List[np.ndarray], sample_rate: int | None = None) -> List[Match]:
+        """Recognize several clips, sharing one FFT and mel projection across them."""
+        audios = [self.extracter.resample(audio, sample_rate) for audio in audios]
+        return [self._match(fingerprints) for fingerprints in self.extracter.from_pcm_batch(audios)]
+
+    def warm_up(self) -> None:
+        """Prime the extraction pipeline and the lookup path (index or SQLite) once."""
+        if self.index is not None:
+            self.index.refresh()
+        self._match(self.extracter.warm_up())
+
+    def _match(self, fingerprints: np.ndarray) -> Match:
+        return self.matcher.match(fingerprints)
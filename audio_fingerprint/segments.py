@@ -0,0 +1,719 @@
+"""
+Segmented, append-only fingerprint storage.
+
+A segmented catalog is a directory holding:
+
+    segments.json        hash mode, live segments, current write log
+    catalog.db           the `songs` table (song metadata, song_id allocation)
+    seg-000001/ ...      immutable segments (keys, indptr, df, song_ids, anchor_times .npy)
+    write-000001.log     postings of the write segment, not yet sealed
+    writer.lock          held (flock) by the one process that has the catalog open for writing
+
+A segment is a CSR posting table like InMemoryIndex's: sorted distinct hashes, and for
+each hash a contiguous run of (song_id, anchor_time) postings sorted by song. Segments
+are never modified after they are written and are opened memory-mapped, so a lookup is a
+binary search over the keys plus a sequential read of each matching run, and the OS page
+cache shares them between processes.
+
+New postings go to a small in-memory write segment. Each committed transaction is
+appended to the write log before it becomes visible, and the write segment is sealed
+into a new segment once it holds `write_segment_size` postings (or on `flush()` and
+`close()`). Readers in other processes tail the same log, so a committed song can be
+looked up everywhere without waiting for the seal. A background thread merges segments of similar size, `merge_factor` at a
+time, into one larger segment and swaps it into the manifest; readers keep using the
+segments they already hold until then. Ingestion therefore never rewrites what queries
+are reading, and queries search a handful of sorted arrays.
+
+Every song's postings live in exactly one segment, so the document frequency of a hash
+is the sum of its per-segment df. With a stop_df threshold, postings of stop hashes are
+dropped when segments are sealed or merged; their df is kept.
+
+SegmentedDatabase exposes the parts of the Database interface used by UploadSong,
+bulk_ingest and Recognizer, so they work unchanged on a segmented catalog. Segmented
+catalogs are used through the command-line tools (bulk_ingest, monitor, this module);
+the API server only serves single-file catalogs.
+
+Usage:
+    python -m audio_fingerprint.segments music.db catalog_dir     # convert a catalog
+    python -m audio_fingerprint.segments catalog_dir --compact    # merge into one segment
+"""
+import argparse
+import fcntl
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from audio_fingerprint.database import SONG_COLUMNS, Database
+from audio_fingerprint.fingerprint import (HASH_MODE_PACKED, HASH_MODE_SHA1, HASH_MODES,
+                                           SHA1_HASH_DTYPE, fingerprint_dtype)
+from audio_fingerprint.index import LOAD_BATCH_SIZE, find_postings, key_frequencies
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "segments.json"
+CATALOG_NAME = "catalog.db"
+LOCK_NAME = "writer.lock"
+SEGMENT_ARRAYS = ("keys", "indptr", "df", "song_ids", "anchor_times")
+
+DEFAULT_WRITE_SEGMENT_SIZE = 500_000
+DEFAULT_MERGE_FACTOR = 4
+
+
+class Segment(NamedTuple):
+    """
+    CSR posting table: postings of keys[i] live in [indptr[i], indptr[i + 1]), sorted by
+    song_id; df[i] is the number of songs of this segment containing keys[i] (postings
+    of stop hashes may have been dropped, so a run can be empty).
+    """
+    name: str
+    keys: np.ndarray
+    indptr: np.ndarray
+    df: np.ndarray
+    song_ids: np.ndarray
+    anchor_times: np.ndarray
+
+    @property
+    def n_postings(self) -> int:
+        return int(self.indptr[-1])
+
+
+def build_segment(name: str, hashes: np.ndarray, song_ids: np.ndarray, anchor_times: np.ndarray,
+                  keys: np.ndarray | None = None, df: np.ndarray | None = None) -> Segment:
+    """
+    Sort postings into a segment.
+
+    Args:
+        keys, df: Distinct hashes and their document frequencies, when they are already
+                  known (merges); by default both are counted from the postings. Every
+                  posting's hash must be among the keys.
+    """
+    order = np.lexsort((song_ids, hashes))
+    hashes = hashes[order]
+    song_ids = song_ids[order]
+    anchor_times = anchor_times[order]
+    if keys is None:
+        keys, starts = np.unique(hashes, return_index=True)
+        # Postings are sorted by (hash, song_id), so each new song within a hash is a change.
+        new_song = np.ones(hashes.size, dtype=np.int64)
+        new_song[1:] = (hashes[1:] != hashes[:-1]) | (song_ids[1:] != song_ids[:-1])
+        df = np.add.reduceat(new_song, starts) if hashes.size else np.empty(0, dtype=np.int64)
+    indptr = np.append(np.searchsorted(hashes, keys), hashes.size).astype(np.int64)
+    return Segment(name, keys, indptr, np.asarray(df, dtype=np.int64), song_ids, anchor_times)
+
+
+def drop_postings(segment: Segment, stop: np.ndarray) -> Segment:
+    """Remove the postings of the keys flagged in `stop`, keeping their df."""
+    if not stop.any():
+        return segment
+    counts = np.diff(segment.indptr)
+    keep = np.repeat(~stop, counts)
+    indptr = np.concatenate(([0], np.cumsum(np.where(stop, 0, counts)))).astype(np.int64)
+    return segment._replace(indptr=indptr, song_ids=segment.song_ids[keep],
+                            anchor_times=segment.anchor_times[keep])
+
+
+def merge_segments(name: str, segments: Sequence[Segment]) -> Segment:
+    """One segment holding the postings and summed document frequencies of `segments`."""
+    keys, inverse = np.unique(np.concatenate([s.keys for s in segments]), return_inverse=True)
+    df = np.bincount(inverse, weights=np.concatenate([s.df for s in segments]), minlength=keys.size)
+    hashes = np.concatenate([np.repeat(s.keys, np.diff(s.indptr)) for s in segments])
+    return build_segment(name, hashes,
+                         np.concatenate([s.song_ids for s in segments]),
+                         np.concatenate([s.anchor_times for s in segments]),
+                         keys=keys, df=df.astype(np.int64))
+
+
+def write_segment(directory: Path, segment: Segment) -> None:
+    """Write a segment's arrays; the directory appears under its final name only once complete."""
+    final = directory / segment.name
+    tmp = directory / f"{segment.name}.tmp"
+    # Leftovers of a write interrupted before the manifest listed it.
+    shutil.rmtree(tmp, ignore_errors=True)
+    shutil.rmtree(final, ignore_errors=True)
+    tmp.mkdir()
+    for field in SEGMENT_ARRAYS:
+        np.save(tmp / f"{field}.npy", np.ascontiguousarray(getattr(segment, field)))
+    os.replace(tmp, final)
+
+
+def load_segment(directory: Path, name: str) -> Segment:
+    """Open a segment memory-mapped."""
+    arrays = {field: np.load(directory / name / f"{field}.npy", mmap_mode="r") for field in SEGMENT_ARRAYS}
+    return Segment(name, **arrays)
+
+
+def read_log(path: Path, offset: int = 0) -> Tuple[List[Tuple[np.ndarray, np.ndarray, np.ndarray]], int]:
+    """
+    The (hashes, song_ids, anchor_times) batches of a write log from `offset` on, and the
+    offset just past the last complete one.
+    """
+    batches = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            try:
+                batch = tuple(np.load(f) for _ in range(3))
+            except (EOFError, ValueError, OSError):
+                break  # end of log, or a record still being written (or torn by a crash)
+            batches.append(batch)
+            offset = f.tell()
+    return batches, offset
+
+
+def is_segmented(path: str | Path) -> bool:
+    return (Path(path) / MANIFEST_NAME).is_file()
+
+
+class SegmentedDatabase:
+    """
+    A catalog whose fingerprints are stored as immutable, memory-mapped sorted segments.
+
+    One process writes (the one opened with readonly=False, which holds writer.lock;
+    opening a second writer raises RuntimeError); any number of readonly instances, e.g.
+    in recognition worker processes, pick up sealed and merged segments by re-reading the
+    manifest when it changes, and the write segment's committed postings by reading the
+    write log from where they left off.
+    """
+
+    def __init__(self, directory: str | Path, hash_mode: str | None = None, wal: bool = False,
+                 stop_df: int | None = None, readonly: bool = False, compaction: bool = True,
+                 write_segment_size: int = DEFAULT_WRITE_SEGMENT_SIZE,
+                 merge_factor: int = DEFAULT_MERGE_FACTOR, compaction_interval: float = 30.0) -> None:
+        """
+        Args:
+            directory (str | Path): Catalog directory; created if it has no manifest yet.
+            hash_mode (str | None): Hash mode of a new catalog, checked like Database does.
+            wal (bool): Open catalog.db in write-ahead logging mode.
+            stop_df (int | None): Stop-hash threshold, as for Database.
+            readonly (bool): Only read: catalog.db is opened with mode=ro, and segments and
+                             the write log are never written. Writers (readonly=False)
+                             take the catalog's exclusive writer lock.
+            compaction (bool): Merge segments on a background thread (writers only).
+            write_segment_size (int): Postings held in memory before they are sealed.
+            merge_factor (int): Segments of one size tier merged together.
+            compaction_interval (float): Seconds between compaction checks when idle.
+        """
+        if merge_factor < 2:
+            raise ValueError("merge_factor must be at least 2")
+        self.directory = Path(directory)
+        self.stop_df = stop_df
+        self.readonly = readonly
+        self.write_segment_size = write_segment_size
+        self.merge_factor = merge_factor
+
+        manifest_path = self.directory / MANIFEST_NAME
+        if manifest_path.is_file():
+            manifest = json.loads(manifest_path.read_text())
+            if hash_mode is not None and hash_mode != manifest["hash_mode"]:
+                raise ValueError(f"{directory} stores {manifest['hash_mode']} hashes, not {hash_mode}")
+        else:
+            if readonly:
+                raise FileNotFoundError(f"No segmented catalog at {directory}")
+            if hash_mode is not None and hash_mode not in HASH_MODES:
+                raise ValueError(f"Unknown hash_mode {hash_mode!r}, expected one of {HASH_MODES}")
+            self.directory.mkdir(parents=True, exist_ok=True)
+            manifest = {"hash_mode": hash_mode or HASH_MODE_SHA1, "layout": "segments",
+                        "segments": [], "next_segment": 1, "write_log": 1}
+
+        self._lock_file = None if readonly else self._acquire_writer_lock()
+        self.hash_mode: str = manifest["hash_mode"]
+        self._hash_dtype = np.int64 if self.hash_mode == HASH_MODE_PACKED else SHA1_HASH_DTYPE
+        self.catalog = Database(str(self.directory / CATALOG_NAME), hash_mode=self.hash_mode,
+                                wal=wal, create_tables=not readonly, check_same_thread=False, readonly=readonly)
+        if not manifest_path.is_file():
+            # Written last so a half-created directory is never mistaken for a catalog.
+            self._write_manifest(manifest)
+
+        self._manifest = manifest
+        self._manifest_mtime = 0
+        self._segments: Tuple[Segment, ...] = ()
+        # Serializes changes to the manifest and the live segment list (seal, merge, reload).
+        self._manifest_lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        # Serializes writers: one transaction at a time.
+        self._writer_lock = threading.RLock()
+        self._depth = 0
+        self._pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        # Committed, unsealed postings and the sorted view queries read them through.
+        self._buffer_lock = threading.Lock()
+        self._buffer: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._buffered = 0
+        self._write_view: Segment | None = None
+        self._log = None
+        # Readers: write log generation whose postings are buffered, and how far it was read.
+        self._log_generation = manifest["write_log"]
+        self._log_offset = 0
+        self._load()
+
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._compactor = None
+        if not readonly:
+            self._replay_log()
+            for path in self.directory.glob("write-*.log"):
+                if path != self._log_path(self._manifest["write_log"]):
+                    path.unlink()  # already sealed; left behind by a crash before its removal
+            self._log = open(self._log_path(self._manifest["write_log"]), "ab")
+            if compaction:
+                self._compactor = threading.Thread(target=self._compaction_loop, args=(compaction_interval,),
+                                                   name="segment-compaction", daemon=True)
+                self._compactor.start()
+
+    def _acquire_writer_lock(self):
+        """Take writer.lock, released when the returned file is closed (or the process exits)."""
+        lock_file = open(self.directory / LOCK_NAME, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(f"{self.directory} is already open for writing by another SegmentedDatabase "
+                               f"(lock held on {LOCK_NAME}); open it with readonly=True to read") from None
+        return lock_file
+
+    # Manifest and segment files
+
+    def _log_path(self, generation: int) -> Path:
+        return self.directory / f"write-{generation:06d}.log"
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp = self.directory / f"{MANIFEST_NAME}.tmp"
+        tmp.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp, self.directory / MANIFEST_NAME)
+
+    def _load(self) -> None:
+        """Open the segments listed in the manifest."""
+        with self._manifest_lock:
+            for attempt in range(3):
+                path = self.directory / MANIFEST_NAME
+                mtime = path.stat().st_mtime_ns
+                manifest = json.loads(path.read_text())
+                try:
+                    # Segments already open are reused; only new ones are mapped.
+                    current = {s.name: s for s in self._segments}
+                    segments = tuple(current.get(entry["name"]) or load_segment(self.directory, entry["name"])
+                                     for entry in manifest["segments"])
+                    break
+                except FileNotFoundError:
+                    # A writer merged segments away between reading the manifest and opening them.
+                    if attempt == 2:
+                        raise
+            self._manifest = manifest
+            self._manifest_mtime = mtime
+            self._segments = segments
+
+    def refresh(self) -> bool:
+        """Re-read the manifest if another process changed it. Returns True if it did."""
+        try:
+            mtime = (self.directory / MANIFEST_NAME).stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._manifest_mtime:
+            return False
+        self._load()
+        return True
+
+    def segment_sizes(self) -> List[int]:
+        """Number of postings held by each live segment, oldest first."""
+        return [s.n_postings for s in self._segments]
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        if not self.readonly:
+            self.flush()
+            self._log.close()
+        self.catalog.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+    # Writes
+
+    @contextmanager
+    def transaction(self) -> Iterator["SegmentedDatabase"]:
+        """
+        Group writes; on exit the songs are committed, then the postings are appended to
+        the write log and become visible to lookups.
+        """
+        with self._writer_lock:
+            outermost = self._depth == 0
+            self._depth += 1
+            try:
+                with self.catalog.transaction():
+                    yield self
+            except BaseException:
+                if outermost:
+                    self._pending.clear()
+                raise
+            finally:
+                self._depth -= 1
+            if outermost:
+                self._commit_pending()
+
+    def drop_hash_index(self):
+        """Segments have no B-tree index; kept for interface compatibility with Database."""
+
+    def create_hash_index(self):
+        """Segments have no B-tree index; kept for interface compatibility with Database."""
+
+    def add_song(self, song_name: str, artists: list, youtube_url: str | None = None) -> int:
+        return self.catalog.add_song(song_name, artists, youtube_url)
+
+    def song_count(self) -> int:
+        return self.catalog.song_count()
+
+    def extraction_settings(self) -> Dict[str, Any]:
+        return self.catalog.extraction_settings()
+
+    def check_extraction_settings(self, settings: Dict[str, Any]) -> None:
+        self.catalog.check_extraction_settings(settings)
+
+    def get_song_by_id(self, song_id: int) -> Dict[str, Any]:
+        return self.catalog.get_song_by_id(song_id)
+
+    def get_song_id(self, name: str, artists: list) -> int:
+        return self.catalog.get_song_id(name, artists)
+
+    def set_youtube_url(self, song_id: int, youtube_url: str):
+        self.catalog.set_youtube_url(song_id, youtube_url)
+
+    def defer_youtube_lookup(self, song_id: int, retry_at: float):
+        self.catalog.defer_youtube_lookup(song_id, retry_at)
+
+    def get_stale_youtube_urls(self, max_age: float, limit: int = 100) -> List[Dict[str, Any]]:
+        return self.catalog.get_stale_youtube_urls(max_age, limit)
+
+    def add_fingerprints(self, fingerprints: np.ndarray | List[Tuple[str | int, int]], song_id: int):
+        """Stage a song's fingerprints for the write segment; they are stored on commit."""
+        if self.readonly:
+            raise PermissionError("Catalog was opened readonly")
+        if not isinstance(fingerprints, np.ndarray):
+            fingerprints = np.array(list(map(tuple, fingerprints)), dtype=fingerprint_dtype(self.hash_mode))
+        if len(fingerprints) == 0:
+            return
+        with self.transaction():
+            self._pending.append((
+                np.asarray(fingerprints["hash"], dtype=self._hash_dtype),
+                np.full(len(fingerprints), song_id, dtype=np.int64),
+                np.asarray(fingerprints["anchor_time"], dtype=np.int64),
+            ))
+
+    def _commit_pending(self) -> None:
+        if not self._pending:
+            return
+        batch = tuple(np.concatenate(arrays) for arrays in zip(*self._pending))
+        self._pending.clear()
+        for array in batch:
+            np.save(self._log, array)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        with self._buffer_lock:
+            self._buffer.append(batch)
+            self._buffered += batch[0].size
+            self._write_view = None
+        if self._buffered >= self.write_segment_size:
+            self.flush()
+
+    def _replay_log(self) -> None:
+        """Reload postings committed to the write log but not sealed before the last close."""
+        path = self._log_path(self._manifest["write_log"])
+        if not path.is_file():
+            return
+        batches, good = read_log(path)
+        for batch in batches:
+            self._buffer.append(batch)
+            self._buffered += batch[0].size
+        if good < path.stat().st_size:
+            logger.warning("Discarding %d bytes of an incomplete write log record", path.stat().st_size - good)
+            os.truncate(path, good)
+        if self._buffered:
+            logger.info("Replayed %d postings from %s", self._buffered, path.name)
+
+    def flush(self) -> None:
+        """Seal the write segment into an immutable segment."""
+        with self._writer_lock, self._manifest_lock:
+            if not self._buffer:
+                return
+            manifest = dict(self._manifest)
+            name = f"seg-{manifest['next_segment']:06d}"
+            with self._buffer_lock:
+                segment = self._write_view_locked()._replace(name=name)
+            segment = self._apply_stop_df(segment, extra=())
+            write_segment(self.directory, segment)
+
+            old_log = manifest["write_log"]
+            manifest.update(segments=manifest["segments"] + [{"name": name, "postings": segment.n_postings}],
+                            next_segment=manifest["next_segment"] + 1, write_log=old_log + 1)
+            self._log.close()
+            self._log = open(self._log_path(old_log + 1), "ab")
+            self._write_manifest(manifest)
+            with self._buffer_lock:
+                self._segments = self._segments + (load_segment(self.directory, name),)
+                self._buffer.clear()
+                self._buffered = 0
+                self._write_view = None
+            self._manifest = manifest
+            self._manifest_mtime = (self.directory / MANIFEST_NAME).stat().st_mtime_ns
+            self._log_path(old_log).unlink(missing_ok=True)
+            logger.info("Sealed %s: %d postings, %d hashes", name, segment.n_postings, segment.keys.size)
+        self._wake.set()
+
+    def _write_view_locked(self) -> Segment:
+        """Sorted view of the write segment, cached until the next commit. Needs _buffer_lock."""
+        if self._write_view is None:
+            hashes, song_ids, anchor_times = (np.concatenate(arrays) for arrays in zip(*self._buffer))
+            self._write_view = build_segment("write", hashes, song_ids, anchor_times)
+        return self._write_view
+
+    def _apply_stop_df(self, segment: Segment, extra: Sequence[Segment]) -> Segment:
+        """
+        Drop postings of hashes in more than stop_df songs. `extra` lists live segments the
+        new one replaces, whose df must not be counted twice.
+        """
+        if self.stop_df is None or segment.keys.size == 0:
+            return segment
+        df = segment.df.copy()
+        replaced = {s.name for s in extra}
+        for other in self._segments:
+            if other.name not in replaced:
+                df += key_frequencies(other.keys, other.df, segment.keys)
+        return drop_postings(segment, df > self.stop_df)
+
+    # Compaction
+
+    def _tier(self, segment: Segment) -> int:
+        return int(math.log(max(segment.n_postings, 1), self.merge_factor))
+
+    def _pick_merge(self) -> List[Segment]:
+        """The segments of the smallest size tier that has `merge_factor` of them."""
+        tiers: Dict[int, List[Segment]] = {}
+        for segment in self._segments:
+            tiers.setdefault(self._tier(segment), []).append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return tiers[tier]
+        return []
+
+    def compact(self, full: bool = False) -> int:
+        """
+        Merge segments until no size tier has `merge_factor` of them, or into a single
+        segment when full=True. Returns the number of merges done.
+        """
+        if self.readonly:
+            raise PermissionError("Catalog was opened readonly")
+        with self._compaction_lock:
+            return self._compact(full)
+
+    def _compact(self, full: bool) -> int:
+        merges = 0
+        while not self._stop.is_set() or full:
+            with self._manifest_lock:
+                group = list(self._segments) if full else self._pick_merge()
+                if len(group) < 2:
+                    return merges
+                name = f"seg-{self._manifest['next_segment']:06d}"
+                self._manifest = dict(self._manifest, next_segment=self._manifest["next_segment"] + 1)
+
+            # The merge itself runs without the lock: lookups and seals carry on meanwhile.
+            start = time.perf_counter()
+            merged = merge_segments(name, group)
+            with self._manifest_lock:
+                merged = self._apply_stop_df(merged, extra=group)
+                write_segment(self.directory, merged)
+                self._swap_merged(group, merged)
+            logger.info("Merged %d segments into %s (%d postings) in %.2fs",
+                        len(group), name, merged.n_postings, time.perf_counter() - start)
+            merges += 1
+            full = False
+        return merges
+
+    def _swap_merged(self, group: Sequence[Segment], merged: Segment) -> None:
+        replaced = {s.name for s in group}
+        manifest = dict(self._manifest)
+        manifest["segments"] = ([e for e in manifest["segments"] if e["name"] not in replaced]
+                                + [{"name": merged.name, "postings": merged.n_postings}])
+        self._write_manifest(manifest)
+        self._manifest = manifest
+        self._manifest_mtime = (self.directory / MANIFEST_NAME).stat().st_mtime_ns
+        self._segments = tuple(s for s in self._segments if s.name not in replaced) + (
+            load_segment(self.directory, merged.name),)
+        # Open maps stay valid after the files are unlinked (on POSIX), so readers holding
+        # the old segments finish their lookups undisturbed.
+        for name in replaced:
+            shutil.rmtree(self.directory / name, ignore_errors=True)
+
+    def _compaction_loop(self, interval: float) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.compact()
+            except Exception:
+                logger.exception("Segment compaction failed")
+
+    # Reads
+
+    def _tail_log(self) -> None:
+        """Readers: buffer the batches committed to the write log since the last read."""
+        generation = self._manifest["write_log"]
+        path = self._log_path(generation)
+        with self._buffer_lock:
+            if generation != self._log_generation:
+                # The writer sealed the old log into a segment of the manifest just loaded.
+                self._buffer.clear()
+                self._buffered = 0
+                self._write_view = None
+                self._log_generation, self._log_offset = generation, 0
+            try:
+                if path.stat().st_size == self._log_offset:
+                    return
+                batches, self._log_offset = read_log(path, self._log_offset)
+            except FileNotFoundError:
+                return  # sealed since the manifest was read; the next refresh loads the segment
+            if batches:
+                self._buffer.extend(batches)
+                self._buffered += sum(batch[0].size for batch in batches)
+                self._write_view = None
+
+    def _live_segments(self) -> Tuple[Segment, ...]:
+        if self.readonly:
+            self.refresh()
+            self._tail_log()
+        with self._buffer_lock:
+            if not self._buffer:
+                return self._segments
+            return self._segments + (self._write_view_locked(),)
+
+    def lookup(self, query_hashes: Sequence) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched posting lookup across every live segment and the write segment.
+
+        Same contract as Database.lookup: three aligned arrays (query_idx, song_ids,
+        anchor_times), where query_idx indexes into query_hashes.
+        """
+        query = np.asarray(query_hashes, dtype=self._hash_dtype)
+        empty = np.empty(0, dtype=np.int64)
+        query_idx, song_ids, anchor_times = [empty], [empty], [empty]
+        for segment in self._live_segments():
+            idx, rows = find_postings(segment.keys, segment.indptr, query)
+            query_idx.append(idx)
+            song_ids.append(segment.song_ids[rows])
+            anchor_times.append(segment.anchor_times[rows])
+        return np.concatenate(query_idx), np.concatenate(song_ids), np.concatenate(anchor_times)
+
+    def document_frequencies(self, query_hashes: Sequence) -> np.ndarray:
+        """Same contract as Database.document_frequencies; per-segment counts are summed."""
+        query = np.asarray(query_hashes, dtype=self._hash_dtype)
+        df = np.zeros(query.size, dtype=np.int64)
+        for segment in self._live_segments():
+            df += key_frequencies(segment.keys, segment.df, query)
+        return df
+
+    def find_matches(self, query_hashes: List[str | int]) -> Dict[int, Dict[str | int, List[int]]] | None:
+        """Same contract as Database.find_matches."""
+        if not query_hashes:
+            return None
+        query_idx, song_ids, anchor_times = self.lookup(query_hashes)
+        if query_idx.size == 0:
+            return None
+        matches: Dict[int, Dict[str | int, List[int]]] = {}
+        for i, song_id, anchor_time in zip(query_idx.tolist(), song_ids.tolist(), anchor_times.tolist()):
+            matches.setdefault(song_id, {}).setdefault(query_hashes[i], []).append(anchor_time)
+        return matches
+
+
+def convert(source: str | Path, destination: str | Path) -> Dict[str, Any]:
+    """
+    Copy a single-file catalog (music.db) into a new segmented catalog with one segment.
+    Song ids are preserved. The destination must not exist yet.
+    """
+    destination = Path(destination)
+    if destination.exists():
+        raise FileExistsError(f"Refusing to overwrite existing catalog: {destination}")
+
+    start = time.perf_counter()
+    src = Database(str(source), readonly=True)
+    dst = SegmentedDatabase(destination, hash_mode=src.hash_mode, compaction=False)
+    try:
+        with dst.catalog.transaction():
+            src_columns = {row[1] for row in src.conn.execute("PRAGMA table_info(songs)")}
+            columns = [c for c in SONG_COLUMNS.split(", ") if c in src_columns]
+            dst.catalog.conn.executemany(
+                f"INSERT INTO songs ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+                src.conn.execute(f"SELECT {', '.join(columns)} FROM songs"),
+            )
+            dst.catalog.conn.executemany("INSERT INTO catalog_info (key, value) VALUES (?, ?)",
+                                         src.conn.execute("SELECT key, value FROM catalog_info"))
+
+        def read_columns(query: str, dtypes: Sequence) -> List[np.ndarray]:
+            cursor = src.conn.execute(query)
+            columns: List[List[np.ndarray]] = [[np.empty(0, dtype=dtype)] for dtype in dtypes]
+            while True:
+                rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+                if not rows:
+                    break
+                for column, values, dtype in zip(columns, zip(*rows), dtypes):
+                    column.append(np.asarray(values, dtype=dtype))
+            return [np.concatenate(column) for column in columns]
+
+        blocks = list(src.iter_fingerprints(LOAD_BATCH_SIZE))
+        hashes = np.concatenate([np.empty(0, dtype=dst._hash_dtype)]
+                                + [b.fingerprints["hash"].astype(dst._hash_dtype) for b in blocks])
+        song_ids = np.concatenate([np.empty(0, dtype=np.int64)] + [b.song_ids for b in blocks])
+        anchor_times = np.concatenate([np.empty(0, dtype=np.int64)] + [b.fingerprints["anchor_time"] for b in blocks])
+        del blocks
+        # Document frequencies are copied rather than recomputed: with a stop-hash
+        # threshold, the stored postings undercount them.
+        keys, df = read_columns("SELECT hash, df FROM hash_stats", (dst._hash_dtype, np.int64))
+        order = np.argsort(keys, kind="stable")
+        segment = build_segment("seg-000001", hashes, song_ids, anchor_times, keys=keys[order], df=df[order])
+        write_segment(dst.directory, segment)
+        with dst._manifest_lock:
+            manifest = dict(dst._manifest, segments=[{"name": segment.name, "postings": segment.n_postings}],
+                            next_segment=2)
+            dst._write_manifest(manifest)
+            dst._load()
+    finally:
+        src.close()
+        dst.close()
+
+    return {"fingerprints": int(hashes.size), "hashes": int(keys.size), "seconds": time.perf_counter() - start}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert a catalog to segmented storage, or compact one.")
+    parser.add_argument("source", help="music.db to convert, or a segmented catalog directory with --compact")
+    parser.add_argument("destination", nargs="?", help="New segmented catalog directory")
+    parser.add_argument("--compact", action="store_true", help="Merge every segment of `source` into one")
+    args = parser.parse_args()
+
+    if args.compact:
+        db = SegmentedDatabase(args.source, compaction=False)
+        try:
+            db.flush()
+            db.compact(full=True)
+            print(f"{args.source}: segments of {db.segment_sizes()} postings")
+        finally:
+            db.close()
+        return
+
+    if not args.destination:
+        parser.error("destination is required to convert a catalog")
+    report = convert(args.source, args.destination)
+    print(f"Copied {report['fingerprints']} fingerprints ({report['hashes']} hashes) "
+          f"in {report['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,362 @@
+"""
+Hash-partitioned, sharded fingerprint storage.
+
+A sharded catalog is a directory holding:
+
+    manifest.json      hash mode and number of shards
+    catalog.db         the `songs` table (song metadata, song_id allocation)
+    shard-000.db ...   the `fingerprints` table, partitioned by hash range
+
+Every hash is mapped to a 32-bit partition key that is uniform over the key space (the
+leading 32 bits of a SHA-1 digest, or a multiplicative mix of a packed hash), and shard i
+of N owns the keys in [i * 2^32 / N, (i + 1) * 2^32 / N). All postings of a hash therefore
+live in exactly one shard, so a query is answered by sending each shard only its own
+hashes, in parallel, and concatenating the postings before scoring.
+
+ShardedDatabase exposes the parts of the Database interface used by UploadSong,
+bulk_ingest and Recognizer, so they work unchanged on a sharded catalog.
+
+Usage:
+    python -m audio_fingerprint.sharding music.db catalog_dir --shards 4      # split
+    python -m audio_fingerprint.sharding catalog_dir catalog_8 --shards 8     # rebalance
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from audio_fingerprint.database import SONG_COLUMNS, Database
+from audio_fingerprint.fingerprint import (HASH_MODE_PACKED, HASH_MODE_SHA1, HASH_MODES,
+                                           SHA1_HASH_DTYPE, fingerprint_dtype)
+from audio_fingerprint.segments import SegmentedDatabase, is_segmented
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+CATALOG_NAME = "catalog.db"
+COPY_BATCH_SIZE = 200_000
+
+# 64-bit golden-ratio constant (Fibonacci hashing) used to spread packed hashes, whose
+# high bits are the anchor frequency, evenly over the partition key space.
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def partition_keys(hashes: np.ndarray | Sequence, hash_mode: str) -> np.ndarray:
+    """Uniform 32-bit partition key (as uint64) of every hash."""
+    if hash_mode == HASH_MODE_PACKED:
+        h = np.asarray(hashes, dtype=np.int64).astype(np.uint64)
+        return (h * _MIX) >> np.uint64(32)
+
+    # SHA-1 hex digests: decode the first 8 hex characters, vectorized over the code points.
+    hashes = np.ascontiguousarray(hashes, dtype=SHA1_HASH_DTYPE)
+    codes = hashes.view(np.uint32).reshape(-1, 20)[:, :8]
+    codes = codes.astype(np.uint64)
+    digits = np.where(codes <= ord("9"), codes - ord("0"), (codes | 0x20) - ord("a") + 10)
+    shifts = np.arange(28, -1, -4, dtype=np.uint64)
+    return (digits << shifts).sum(axis=1, dtype=np.uint64)
+
+
+def shard_of(hashes: np.ndarray | Sequence, hash_mode: str, n_shards: int) -> np.ndarray:
+    """Index of the shard owning each hash."""
+    return ((partition_keys(hashes, hash_mode) * np.uint64(n_shards)) >> np.uint64(32)).astype(np.int64)
+
+
+def is_sharded(path: str | Path) -> bool:
+    return (Path(path) / MANIFEST_NAME).is_file()
+
+
+def open_database(path: str | Path, hash_mode: str | None = None,
+                  readonly: bool = True) -> "Database | ShardedDatabase | SegmentedDatabase":
+    """
+    Open a single-file catalog, or the sharded or segmented catalog directory at `path`.
+
+    A segmented catalog has a single writer, so it is opened as a reader unless
+    readonly=False is passed. Single-file and sharded catalogs are always writable.
+    """
+    if is_sharded(path):
+        return ShardedDatabase(path, hash_mode=hash_mode)
+    if is_segmented(path):
+        return SegmentedDatabase(path, hash_mode=hash_mode, readonly=readonly)
+    return Database(str(path), hash_mode=hash_mode)
+
+
+class ShardedDatabase:
+    """
+    A catalog whose fingerprints are partitioned by hash range across N SQLite files.
+
+    Lookups fan out to the shards on a thread pool (SQLite releases the GIL while it runs
+    a query) and each shard is used by one thread at a time. Writes go to every shard
+    inside `transaction()`; each file commits on its own, so a crash mid-commit can leave
+    a song's postings on only some shards.
+    """
+
+    def __init__(self, directory: str | Path, n_shards: int | None = None,
+                 hash_mode: str | None = None, wal: bool = False, stop_df: int | None = None) -> None:
+        """
+        Args:
+            directory (str | Path): Catalog directory; created with `n_shards` shards if it
+                                    has no manifest yet.
+            n_shards (int | None): Shard count of a new catalog. An existing catalog keeps its
+                                   own; passing a different count raises ValueError.
+            hash_mode (str | None): Hash mode of a new catalog, checked like Database does.
+            wal (bool): Open every file in write-ahead logging mode.
+            stop_df (int | None): Stop-hash threshold, as for Database.
+        """
+        self.directory = Path(directory)
+        self.stop_df = stop_df
+        manifest_path = self.directory / MANIFEST_NAME
+        if manifest_path.is_file():
+            manifest = json.loads(manifest_path.read_text())
+            if n_shards is not None and n_shards != manifest["n_shards"]:
+                raise ValueError(f"{directory} has {manifest['n_shards']} shards, not {n_shards}; "
+                                 "use the rebalance tool to change it")
+            if hash_mode is not None and hash_mode != manifest["hash_mode"]:
+                raise ValueError(f"{directory} stores {manifest['hash_mode']} hashes, not {hash_mode}")
+        else:
+            if not n_shards or n_shards < 1:
+                raise ValueError("n_shards is required to create a sharded catalog")
+            if hash_mode is not None and hash_mode not in HASH_MODES:
+                raise ValueError(f"Unknown hash_mode {hash_mode!r}, expected one of {HASH_MODES}")
+            self.directory.mkdir(parents=True, exist_ok=True)
+            manifest = {"n_shards": n_shards, "hash_mode": hash_mode or HASH_MODE_SHA1,
+                        "partition": "hash-range"}
+
+        self.n_shards: int = manifest["n_shards"]
+        self.hash_mode: str = manifest["hash_mode"]
+        self.catalog = Database(str(self.directory / CATALOG_NAME), hash_mode=self.hash_mode,
+                                wal=wal, check_same_thread=False)
+        self.shards = [
+            Database(str(self.shard_path(i)), hash_mode=self.hash_mode, wal=wal, check_same_thread=False,
+                     stop_df=stop_df)
+            for i in range(self.n_shards)
+        ]
+        if not manifest_path.is_file():
+            # Written last so a half-created directory is never mistaken for a catalog.
+            manifest_path.write_text(json.dumps(manifest, indent=2))
+
+        self._locks = [threading.Lock() for _ in range(self.n_shards)]
+        self._pool = ThreadPoolExecutor(max_workers=self.n_shards, thread_name_prefix="shard")
+
+    def shard_path(self, i: int) -> Path:
+        return self.directory / f"shard-{i:03d}.db"
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self.catalog.close()
+        for shard in self.shards:
+            shard.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator["ShardedDatabase"]:
+        """Group writes on the catalog and every shard; commit them together on exit."""
+        with ExitStack() as stack:
+            for db in [self.catalog, *self.shards]:
+                stack.enter_context(db.transaction())
+            yield self
+
+    def drop_hash_index(self):
+        for shard in self.shards:
+            shard.drop_hash_index()
+
+    def create_hash_index(self):
+        for shard in self.shards:
+            shard.create_hash_index()
+
+    def add_song(self, song_name: str, artists: list, youtube_url: str | None = None) -> int:
+        return self.catalog.add_song(song_name, artists, youtube_url)
+
+    def song_count(self) -> int:
+        return self.catalog.song_count()
+
+    def extraction_settings(self) -> Dict[str, Any]:
+        return self.catalog.extraction_settings()
+
+    def check_extraction_settings(self, settings: Dict[str, Any]) -> None:
+        self.catalog.check_extraction_settings(settings)
+
+    def get_song_by_id(self, song_id: int) -> Dict[str, Any]:
+        return self.catalog.get_song_by_id(song_id)
+
+    def get_song_id(self, name: str, artists: list) -> int:
+        return self.catalog.get_song_id(name, artists)
+
+    def set_youtube_url(self, song_id: int, youtube_url: str):
+        self.catalog.set_youtube_url(song_id, youtube_url)
+
+    def defer_youtube_lookup(self, song_id: int, retry_at: float):
+        self.catalog.defer_youtube_lookup(song_id, retry_at)
+
+    def get_stale_youtube_urls(self, max_age: float, limit: int = 100) -> List[Dict[str, Any]]:
+        return self.catalog.get_stale_youtube_urls(max_age, limit)
+
+    def add_fingerprints(self, fingerprints: np.ndarray | List[Tuple[str | int, int]], song_id: int):
+        """Route each fingerprint to the shard owning its hash."""
+        if not isinstance(fingerprints, np.ndarray):
+            fingerprints = np.array(list(map(tuple, fingerprints)), dtype=fingerprint_dtype(self.hash_mode))
+        if len(fingerprints) == 0:
+            return
+        owners = shard_of(fingerprints["hash"], self.hash_mode, self.n_shards)
+        for i in np.unique(owners).tolist():
+            with self._locks[i]:
+                self.shards[i].add_fingerprints(fingerprints[owners == i], song_id)
+
+    def lookup(self, query_hashes: Sequence) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched posting lookup, scattered to the owning shards in parallel.
+
+        Same contract as Database.lookup: three aligned arrays (query_idx, song_ids,
+        anchor_times), where query_idx indexes into query_hashes.
+        """
+        query = list(query_hashes)
+        empty = np.empty(0, dtype=np.int64)
+        if not query:
+            return empty, empty, empty
+
+        owners = shard_of(query, self.hash_mode, self.n_shards)
+        groups = [(i, np.flatnonzero(owners == i)) for i in range(self.n_shards)]
+        futures = [(positions, self._pool.submit(self._lookup_shard, i, [query[p] for p in positions]))
+                   for i, positions in groups if positions.size]
+
+        query_idx, song_ids, anchor_times = [empty], [empty], [empty]
+        for positions, future in futures:
+            local_idx, s, t = future.result()
+            query_idx.append(positions[local_idx])
+            song_ids.append(s)
+            anchor_times.append(t)
+        return np.concatenate(query_idx), np.concatenate(song_ids), np.concatenate(anchor_times)
+
+    def _lookup_shard(self, i: int, hashes: List) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        with self._locks[i]:
+            return self.shards[i].lookup(hashes)
+
+    def document_frequencies(self, query_hashes: Sequence) -> np.ndarray:
+        """Same contract as Database.document_frequencies; each shard counts its own hashes."""
+        query = list(query_hashes)
+        df = np.zeros(len(query), dtype=np.int64)
+        if not query:
+            return df
+        owners = shard_of(query, self.hash_mode, self.n_shards)
+        futures = []
+        for i in range(self.n_shards):
+            positions = np.flatnonzero(owners == i)
+            if positions.size:
+                futures.append((positions, self._pool.submit(
+                    self._document_frequencies_shard, i, [query[p] for p in positions])))
+        for positions, future in futures:
+            df[positions] = future.result()
+        return df
+
+    def _document_frequencies_shard(self, i: int, hashes: List) -> np.ndarray:
+        with self._locks[i]:
+            return self.shards[i].document_frequencies(hashes)
+
+    def find_matches(self, query_hashes: List[str | int]) -> Dict[int, Dict[str | int, List[int]]] | None:
+        """Same contract as Database.find_matches."""
+        if not query_hashes:
+            return None
+        query_idx, song_ids, anchor_times = self.lookup(query_hashes)
+        if query_idx.size == 0:
+            return None
+        matches: Dict[int, Dict[str | int, List[int]]] = {}
+        for i, song_id, anchor_time in zip(query_idx.tolist(), song_ids.tolist(), anchor_times.tolist()):
+            matches.setdefault(song_id, {}).setdefault(query_hashes[i], []).append(anchor_time)
+        return matches
+
+    def shard_sizes(self) -> List[int]:
+        """Number of postings held by each shard."""
+        return [shard.conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0] for shard in self.shards]
+
+
+def reshard(source: str | Path, destination: str | Path, n_shards: int) -> Dict[str, Any]:
+    """
+    Copy a catalog into a new sharded catalog with `n_shards` shards.
+
+    `source` is either a single-file catalog (music.db) or a sharded catalog directory,
+    so this both splits a catalog and rebalances one to a different shard count. Song ids
+    are preserved. The destination must not exist yet; point readers at it once done.
+    """
+    destination = Path(destination)
+    if destination.exists():
+        raise FileExistsError(f"Refusing to overwrite existing catalog: {destination}")
+
+    start = time.perf_counter()
+    if is_sharded(source):
+        src = ShardedDatabase(source)
+        src_catalog, src_shards = src.catalog, src.shards
+    else:
+        src = Database(str(source))
+        src_catalog, src_shards = src, [src]
+
+    dst = ShardedDatabase(destination, n_shards=n_shards, hash_mode=src.hash_mode)
+    dst.drop_hash_index()
+    copied = 0
+    try:
+        with dst.transaction():
+            dst.catalog.conn.executemany(
+                f"INSERT INTO songs ({SONG_COLUMNS}) VALUES ({', '.join(['?'] * len(SONG_COLUMNS.split(', ')))})",
+                src_catalog.conn.execute(f"SELECT {SONG_COLUMNS} FROM songs"),
+            )
+            dst.catalog.conn.executemany("INSERT INTO catalog_info (key, value) VALUES (?, ?)",
+                                         src_catalog.conn.execute("SELECT key, value FROM catalog_info"))
+            for shard in src_shards:
+                for song_ids, fingerprints in shard.iter_fingerprints(COPY_BATCH_SIZE):
+                    hashes, anchor_times = fingerprints["hash"], fingerprints["anchor_time"]
+                    owners = shard_of(hashes, dst.hash_mode, n_shards)
+                    for i in np.unique(owners).tolist():
+                        sel = owners == i
+                        dst.shards[i].conn.executemany(
+                            "INSERT INTO fingerprints (hash, song_id, anchor_time) VALUES (?, ?, ?)",
+                            zip(hashes[sel].tolist(), song_ids[sel].tolist(), anchor_times[sel].tolist()),
+                        )
+                    copied += len(song_ids)
+                    logger.info("Copied %d fingerprints", copied)
+
+                # Document frequencies are copied rather than recomputed: with a stop-hash
+                # threshold, the stored postings undercount them.
+                stats = shard.conn.execute("SELECT hash, df FROM hash_stats")
+                while True:
+                    batch = stats.fetchmany(COPY_BATCH_SIZE)
+                    if not batch:
+                        break
+                    owners = shard_of([h for h, _ in batch], dst.hash_mode, n_shards)
+                    for i in np.unique(owners).tolist():
+                        dst.shards[i].conn.executemany(
+                            "INSERT INTO hash_stats (hash, df) VALUES (?, ?)",
+                            [row for row, owner in zip(batch, owners.tolist()) if owner == i],
+                        )
+        dst.create_hash_index()
+        sizes = dst.shard_sizes()
+    finally:
+        src.close()
+        dst.close()
+
+    return {"fingerprints": copied, "shards": n_shards, "shard_sizes": sizes,
+            "seconds": time.perf_counter() - start}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Split a catalog into hash-range shards or rebalance "
+                                                 "a sharded catalog to a new shard count.")
+    parser.add_argument("source", help="music.db or a sharded catalog directory")
+    parser.add_argument("destination", help="New sharded catalog directory")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="Number of shards")
+    args = parser.parse_args()
+
+    report = reshard(args.source, args.destination, args.shards)
+    print(f"Copied {report['fingerprints']} fingerprints into {report['shards']} shards "
+          f"in {report['seconds']:.1f}s")
+    for i, size in enumerate(report["shard_sizes"]):
+        print(f"  shard-{i:03d}: {size} postings")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,27 +1,26 @@
-from audio_fingerprint.fingerprint_extracter import FingerprintExtracter
+from audio_fingerprint.fingerprint_extracter import DEFAULT_SAMPLE_RATE, ExtractionParams, FingerprintExtracter
 from audio_fingerprint.database import Database
+from audio_fingerprint.peaks import BACKGROUND_MEDIAN
 
 
 class UploadSong:
-    def __init__(self, db: Database) -> None:
+    def __init__(self, db: Database, sample_rate: int = DEFAULT_SAMPLE_RATE,
+                 params: ExtractionParams | None = None, peak_background: str = BACKGROUND_MEDIAN) -> None:
         self.db = db
-        self.extracter = FingerprintExtracter()
+        self.extracter = FingerprintExtracter(hash_mode=db.hash_mode, peak_background=peak_background,
+                                              sample_rate=sample_rate, params=params)
+        db.check_extraction_settings(self.extracter.settings())
 
-    def upload_new_song(self, filepath: str, song_name: str, artists: list) -> int:
-        # 1. Store metadata of the song
-        self.db.add_song(song_name, artists)
-
-        # 2. Fetch the song id
-        song_id = self.db.get_song_id(song_name, artists)
-        if not song_id:
-            raise ValueError(f"Failed to retrieve song_id for {song_name} - {artists}")
-        
-        # 3. Generate fingerprints
+    def upload_new_song(self, filepath: str, song_name: str, artists: list,
+                        youtube_url: str | None = None) -> int:
+        # 1. Generate fingerprints
         fingerprints = self.extracter.from_file(filepath)
-        if not fingerprints:
+        if len(fingerprints) == 0:
             raise ValueError("No fingerprints generated for file: " + filepath)
-        
-        # 4. Store fingerprints in the db
-        self.db.add_fingerprints(fingerprints, song_id)
+
+        # 2. Store metadata and fingerprints of the song in one transaction
+        with self.db.transaction():
+            song_id = self.db.add_song(song_name, artists, youtube_url)
+            self.db.add_fingerprints(fingerprints, song_id)
 
         return song_id
\ No newline at end of file
@@ -0,0 +1,125 @@
+import logging
+from typing import List, Optional
+import numpy as np
+import soxr
+
+from audio_fingerprint.matcher import Match, NO_MATCH
+from audio_fingerprint.metrics import metrics
+from audio_fingerprint.recognizer import Recognizer
+from audio_fingerprint.stft import StreamingSTFT
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingRecognizer:
+    """
+    Recognizes a song from audio that arrives in chunks (e.g. a live microphone).
+
+    Chunks are resampled to the extracter's analysis rate if `sample_rate` differs from
+    it. Each chunk is pushed through a StreamingSTFT and the mel filterbank as it arrives,
+    so every spectrogram frame is computed once. Every `match_interval` seconds of new
+    audio, peaks and fingerprints are taken from the accumulated log-mel spectrogram and
+    matched. Recognition stops as soon as a match reaches `confidence_threshold` (and
+    `min_score` aligned hashes), or when `max_duration` seconds have been heard.
+    """
+
+    def __init__(self, recognizer: Recognizer, sample_rate: int = 44100,
+                 match_interval: float = 1.0, min_duration: float = 2.0,
+                 max_duration: float = 15.0, confidence_threshold: float = 0.05,
+                 min_score: int = 20) -> None:
+        """
+        Args:
+            recognizer (Recognizer): Recognizer bound to the catalog.
+            sample_rate (int): Sample rate of the incoming PCM.
+            match_interval (float): Seconds of new audio between match attempts.
+            min_duration (float): Seconds of audio required before the first attempt.
+            max_duration (float): Give up (and report the best match so far) after this long.
+            confidence_threshold (float): Confidence at which a match is accepted early.
+            min_score (int): Aligned hashes required, on top of the confidence, to accept early.
+        """
+        self.recognizer = recognizer
+        self.sample_rate = sample_rate
+        self.match_interval = match_interval
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.confidence_threshold = confidence_threshold
+        self.min_score = min_score
+
+        stft = recognizer.extracter.stft
+        self._stft = StreamingSTFT(stft.fft_size, stft.hop_size, stft.window_type)
+        self._resampler = None
+        if sample_rate != recognizer.extracter.sample_rate:
+            self._resampler = soxr.ResampleStream(sample_rate, recognizer.extracter.sample_rate, 1,
+                                                  dtype="float32")
+        self._mel_blocks: List[np.ndarray] = []
+        self._n_samples = 0
+        self._next_attempt = int(min_duration * sample_rate)
+        self.best: Match = NO_MATCH
+        self.done = False
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds of audio received so far."""
+        return self._n_samples / self.sample_rate
+
+    def is_confident(self, match: Match) -> bool:
+        return (match.song_id is not None
+                and match.confidence >= self.confidence_threshold
+                and match.score >= self.min_score)
+
+    def feed(self, chunk: np.ndarray) -> Optional[Match]:
+        """
+        Add float PCM samples.
+
+        Returns:
+            Optional[Match]: The latest match when an attempt was made on this call, else None.
+        """
+        if self.done or chunk.size == 0:
+            return None
+
+        max_samples = int(self.max_duration * self.sample_rate)
+        chunk = chunk[:max_samples - self._n_samples]
+        self._n_samples += chunk.size
+        self._analyze(chunk, last=self._n_samples >= max_samples)
+
+        if self._n_samples >= max_samples:
+            return self.finish()
+        if self._n_samples < self._next_attempt:
+            return None
+        self._next_attempt = self._n_samples + int(self.match_interval * self.sample_rate)
+        return self._attempt()
+
+    def finish(self) -> Match:
+        """Run a final attempt on everything received and stop."""
+        if not self.done and self._n_samples > 0:
+            if self._resampler is not None:
+                self._analyze(np.zeros(0, dtype=np.float32), last=True)
+            self._attempt()
+        self.done = True
+        return self.best
+
+    def _analyze(self, chunk: np.ndarray, last: bool = False) -> None:
+        if self._resampler is not None:
+            chunk = self._resampler.resample_chunk(chunk.astype(np.float32, copy=False), last=last)
+            if last:
+                self._resampler = None
+        with metrics.timer("stft"):
+            spec = self._stft.process(chunk)
+        if spec.shape[0]:
+            self._mel_blocks.append(self.recognizer.extracter.log_mel(spec))
+
+    def _attempt(self) -> Match:
+        if not self._mel_blocks:
+            return self.best
+        mel_spec_db = np.concatenate(self._mel_blocks, axis=1)
+        self._mel_blocks = [mel_spec_db]
+
+        fingerprints = self.recognizer.extracter.from_log_mel(mel_spec_db)
+        match = self.recognizer._match(fingerprints)
+        if match.song_id is not None and match.score >= self.best.score:
+            self.best = match
+        logger.debug("Streaming attempt at %.1fs: %s", self.elapsed, match)
+
+        if self.is_confident(self.best):
+            self.done = True
+        return self.best
@@ -0,0 +1,205 @@
+"""
+Offline benchmark suite for the fingerprinting library.
+
+Measures, on synthetic audio only (no network, no sample files needed):
+  * per-stage timings of FingerprintExtracter._extract (STFT, mel, peaks, fingerprints),
+  * UploadSong ingest throughput,
+  * recognition p50/p99 latency and top-1 accuracy against catalog size, for clean and
+    noise-augmented query clips.
+
+Usage:
+    python -m benchmarks.run --sizes 10 50 100 --snr none 10 0 --output results.json
+
+Results are written as JSON so runs from different releases can be compared.
+"""
+import argparse
+import json
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from audio_fingerprint.database import Database
+from audio_fingerprint.fingerprint import HASH_MODE_SHA1, HASH_MODES
+from audio_fingerprint.fingerprint_extracter import FingerprintExtracter
+from audio_fingerprint.index import InMemoryIndex
+from audio_fingerprint.peaks import BACKGROUND_MEDIAN, BACKGROUNDS
+from audio_fingerprint.recognizer import Recognizer
+from audio_fingerprint.song_uploader import UploadSong
+from benchmarks.synthetic import add_noise, random_clip, synth_song, write_catalog
+
+SAMPLE_RATE = 44100
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Milliseconds statistics of a list of durations in seconds."""
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "n": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def bench_stages(extracter: FingerprintExtracter, clips: List[np.ndarray]) -> Dict[str, Dict[str, float]]:
+    """Time each stage of FingerprintExtracter._extract separately on every clip."""
+    timings: Dict[str, List[float]] = {"stft": [], "mel": [], "peaks": [], "fingerprints": [], "total": []}
+    for audio in clips:
+        audio = extracter.resample(audio, SAMPLE_RATE)
+        t0 = time.perf_counter()
+        spec = extracter.stft.compute_stft(audio)
+        t1 = time.perf_counter()
+        mel_spec_db = extracter.log_mel(spec)
+        t2 = time.perf_counter()
+        peaks = extracter.peak_picker.find_peaks(mel_spec_db)
+        t3 = time.perf_counter()
+        extracter.fingerprinter.generate_fingerprints(peaks)
+        t4 = time.perf_counter()
+        for stage, seconds in zip(timings, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t4 - t0)):
+            timings[stage].append(seconds)
+    return {stage: summarize(samples) for stage, samples in timings.items()}
+
+
+def ingest(uploader: UploadSong, paths: List[Path], song_seconds: float) -> Tuple[Dict[str, float], List[int]]:
+    """Upload files one by one, as the server does. Returns throughput and the new song_ids."""
+    fingerprints_before = uploader.db.conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+    start = time.perf_counter()
+    new_ids = [uploader.upload_new_song(str(path), path.stem, ["benchmark"]) for path in paths]
+    seconds = time.perf_counter() - start
+    fingerprints = uploader.db.conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0] - fingerprints_before
+    stats = {
+        "songs": len(paths),
+        "fingerprints": int(fingerprints),
+        "seconds": seconds,
+        "songs_per_second": len(paths) / seconds if seconds > 0 else 0.0,
+        "fingerprints_per_second": fingerprints / seconds if seconds > 0 else 0.0,
+        "realtime_factor": len(paths) * song_seconds / seconds if seconds > 0 else 0.0,
+    }
+    return stats, new_ids
+
+
+def bench_recognition(recognizer: Recognizer, song_ids: Dict[int, int], snr_db: float | None,
+                      queries: int, clip_seconds: float, song_seconds: float,
+                      rng: np.random.Generator) -> Dict:
+    """
+    Recognize `queries` random clips of catalog songs.
+
+    Args:
+        song_ids (Dict[int, int]): Seed of each catalog song -> its song_id.
+    """
+    seeds = list(song_ids)
+    latencies: List[float] = []
+    correct = 0
+    for _ in range(queries):
+        seed = seeds[int(rng.integers(len(seeds)))]
+        clip, _ = random_clip(synth_song(seed, song_seconds, SAMPLE_RATE), clip_seconds, SAMPLE_RATE, rng)
+        clip = add_noise(clip, snr_db, rng)
+
+        start = time.perf_counter()
+        match = recognizer.recognize(clip, SAMPLE_RATE)
+        latencies.append(time.perf_counter() - start)
+        correct += match.song_id == song_ids[seed]
+
+    return {"snr_db": snr_db, "queries": queries, "top1_accuracy": correct / queries,
+            "latency": summarize(latencies)}
+
+
+def parse_snr(value: str) -> float | None:
+    return None if value.lower() in ("none", "clean") else float(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for extraction, ingest and matching.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 50],
+                        help="Catalog sizes (songs) to measure recognition at")
+    parser.add_argument("--song-seconds", type=float, default=30.0, help="Length of each synthetic song")
+    parser.add_argument("--clip-seconds", type=float, default=7.0, help="Length of each query clip")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per catalog size and SNR")
+    parser.add_argument("--snr", type=parse_snr, nargs="+", default=[None, 10.0, 0.0],
+                        help="Query SNRs in dB ('none' for clean clips)")
+    parser.add_argument("--stage-clips", type=int, default=20, help="Clips used for the per-stage timings")
+    parser.add_argument("--hash-mode", choices=HASH_MODES, default=HASH_MODE_SHA1)
+    parser.add_argument("--peak-background", choices=BACKGROUNDS, default=BACKGROUND_MEDIAN)
+    parser.add_argument("--analysis-rate", type=int, default=SAMPLE_RATE,
+                        help="Sample rate audio is resampled to before fingerprinting")
+    parser.add_argument("--in-memory-index", action="store_true", help="Match against an InMemoryIndex")
+    parser.add_argument("--workdir", default=None, help="Where to keep generated audio and the catalog "
+                                                        "(default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON file to write")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    sizes = sorted(set(args.sizes))
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        db_path = workdir / "benchmark.db"
+        if db_path.exists():
+            db_path.unlink()
+
+        extracter = FingerprintExtracter(hash_mode=args.hash_mode, peak_background=args.peak_background,
+                                         sample_rate=args.analysis_rate)
+        stage_clips = [random_clip(synth_song(10_000 + i, args.song_seconds, SAMPLE_RATE),
+                                   args.clip_seconds, SAMPLE_RATE, rng)[0]
+                       for i in range(args.stage_clips)]
+        print(f"Timing extraction stages on {len(stage_clips)} clips...")
+        stages = bench_stages(extracter, stage_clips)
+
+        db = Database(str(db_path), hash_mode=args.hash_mode)
+        uploader = UploadSong(db, sample_rate=args.analysis_rate, peak_background=args.peak_background)
+        song_ids: Dict[int, int] = {}
+        ingest_runs = []
+        recognition = []
+        for size in sizes:
+            new_seeds = list(range(len(song_ids), size))
+            paths = write_catalog(workdir / "audio", new_seeds, args.song_seconds, SAMPLE_RATE)
+            print(f"Ingesting {len(paths)} songs (catalog -> {size})...")
+            stats, new_ids = ingest(uploader, paths, args.song_seconds)
+            ingest_runs.append(stats)
+            song_ids.update(zip(new_seeds, new_ids))
+
+            recognizer = Recognizer(db, index=InMemoryIndex(db) if args.in_memory_index else None,
+                                    sample_rate=args.analysis_rate, peak_background=args.peak_background)
+            recognizer.recognize(stage_clips[0], SAMPLE_RATE)  # warm-up
+            for snr_db in args.snr:
+                result = bench_recognition(recognizer, song_ids, snr_db, args.queries,
+                                           args.clip_seconds, args.song_seconds, rng)
+                result["catalog_size"] = size
+                recognition.append(result)
+                print(f"  size={size} snr={snr_db}: top1={result['top1_accuracy']:.3f} "
+                      f"p50={result['latency']['p50_ms']:.1f}ms p99={result['latency']['p99_ms']:.1f}ms")
+        db.close()
+
+    total_songs = sum(run["songs"] for run in ingest_runs)
+    total_seconds = sum(run["seconds"] for run in ingest_runs)
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "args": vars(args),
+        },
+        "stages": stages,
+        "ingest": {
+            "runs": ingest_runs,
+            "songs": total_songs,
+            "seconds": total_seconds,
+            "songs_per_second": total_songs / total_seconds if total_seconds > 0 else 0.0,
+        },
+        "recognition": recognition,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
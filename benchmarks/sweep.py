@@ -0,0 +1,269 @@
+"""
+Sweep of the fingerprint extraction parameters (ExtractionParams) over a local catalog.
+
+Every configuration of the grid fingerprints the same catalog into a fresh SQLite
+database and answers the same noisy query clips. For each one it records:
+  * fingerprints per second of audio and extraction time per second of audio (ingest cost),
+  * database bytes per song (fingerprint rows plus idx_hash),
+  * recognition latency (p50/p99) and top-1 accuracy over all query clips.
+
+The configurations that are Pareto-optimal for (bytes per song, p50 latency, accuracy)
+are reported. Given a budget (--max-bytes-per-song, --max-latency-ms), the most accurate
+of them within it is written to --best-params, a JSON file that bulk_ingest --params and
+AUDIODNA_FINGERPRINT_PARAMS accept.
+
+Usage:
+    python -m benchmarks.sweep --param fanout_size=3,5,10 --param offset_db=5,7,10 \\
+        --songs 20 --queries 40 --snr none 10 0 --output sweep.json --best-params params.json
+
+Without --audio-dir the catalog is synthetic (see benchmarks.synthetic).
+"""
+import argparse
+import itertools
+import json
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from audio_fingerprint.database import Database
+from audio_fingerprint.fingerprint import HASH_MODE_SHA1, HASH_MODES
+from audio_fingerprint.fingerprint_extracter import ExtractionParams, FingerprintExtracter
+from audio_fingerprint.loader import AudioLoader
+from audio_fingerprint.peaks import BACKGROUND_MEDIAN, BACKGROUNDS
+from audio_fingerprint.recognizer import Recognizer
+from benchmarks.run import parse_snr, summarize
+from benchmarks.synthetic import add_noise, random_clip, synth_song
+
+AUDIO_SUFFIXES = (".wav", ".flac", ".mp3", ".ogg", ".m4a", ".aac")
+
+# Swept when no --param is given: the knobs with the largest effect on fingerprint density.
+DEFAULT_GRID: Dict[str, List[Any]] = {
+    "fanout_size": [3, 5, 10],
+    "offset_db": [5.0, 7.0, 10.0],
+    "max_peaks_per_second": [20, 35, 50],
+}
+
+
+def parse_param(value: str) -> Tuple[str, List[Any]]:
+    """'name=v1,v2,...' -> (name, values); tuple fields take 'a:b' values, e.g. 15:7."""
+    name, _, values = value.partition("=")
+    if name not in ExtractionParams._fields or not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,... with NAME one of {ExtractionParams._fields}")
+    default = ExtractionParams._field_defaults[name]
+    parsed: List[Any] = []
+    for item in values.split(","):
+        if isinstance(default, tuple):
+            parsed.append(tuple(int(v) for v in item.split(":")))
+        else:
+            parsed.append(type(default)(item))
+    return name, parsed
+
+
+def grid_configs(grid: Dict[str, List[Any]]) -> List[ExtractionParams]:
+    """Cartesian product of the grid; fields not in it keep their defaults."""
+    names = list(grid)
+    return [ExtractionParams(**dict(zip(names, values))) for values in itertools.product(*grid.values())]
+
+
+def load_catalog(args: argparse.Namespace) -> List[Tuple[str, np.ndarray]]:
+    """(name, mono PCM at the analysis rate) of every catalog song."""
+    if args.audio_dir is None:
+        return [(f"song-{seed}", synth_song(seed, args.song_seconds, args.analysis_rate))
+                for seed in range(args.songs)]
+    loader = AudioLoader(sr=args.analysis_rate, mono=True)
+    paths = sorted(p for p in Path(args.audio_dir).iterdir() if p.suffix.lower() in AUDIO_SUFFIXES)
+    return [(path.stem, loader.load(path)[0]) for path in paths[:args.songs]]
+
+
+def make_queries(catalog: List[Tuple[str, np.ndarray]], args: argparse.Namespace,
+                 rng: np.random.Generator) -> List[Tuple[int, float | None, np.ndarray]]:
+    """(catalog position, snr, clip) for `queries` clips at every SNR, shared by all configurations."""
+    queries = []
+    for snr_db in args.snr:
+        for _ in range(args.queries):
+            song = int(rng.integers(len(catalog)))
+            clip, _ = random_clip(catalog[song][1], args.clip_seconds, args.analysis_rate, rng)
+            queries.append((song, snr_db, add_noise(clip, snr_db, rng)))
+    return queries
+
+
+def database_bytes(db: Database) -> int:
+    page_size, page_count, free = (db.conn.execute(f"PRAGMA {p}").fetchone()[0]
+                                   for p in ("page_size", "page_count", "freelist_count"))
+    return page_size * (page_count - free)
+
+
+def evaluate(params: ExtractionParams, catalog: List[Tuple[str, np.ndarray]],
+             queries: List[Tuple[int, float | None, np.ndarray]], args: argparse.Namespace,
+             workdir: Path) -> Dict[str, Any]:
+    """Ingest the catalog with `params` into a fresh database and run every query against it."""
+    extracter = FingerprintExtracter(hash_mode=args.hash_mode, peak_background=args.peak_background,
+                                     sample_rate=args.analysis_rate, params=params)
+    db_path = workdir / "sweep.db"
+    if db_path.exists():
+        db_path.unlink()
+    db = Database(str(db_path), hash_mode=args.hash_mode)
+    try:
+        db.check_extraction_settings(extracter.settings())
+        empty_bytes = database_bytes(db)
+        song_ids = []
+        fingerprints = 0
+        extract_seconds = 0.0
+        audio_seconds = sum(audio.size for _, audio in catalog) / args.analysis_rate
+        with db.transaction():
+            for name, audio in catalog:
+                start = time.perf_counter()
+                fps = extracter.from_pcm(audio)
+                extract_seconds += time.perf_counter() - start
+                song_id = db.add_song(name, ["sweep"])
+                db.add_fingerprints(fps, song_id)
+                song_ids.append(song_id)
+                fingerprints += len(fps)
+
+        recognizer = Recognizer(db, top_k=args.top_k, sample_rate=args.analysis_rate, params=params,
+                                peak_background=args.peak_background)
+        recognizer.warm_up()
+        latencies: List[float] = []
+        correct: Dict[str, List[bool]] = {}
+        for song, snr_db, clip in queries:
+            start = time.perf_counter()
+            match = recognizer.recognize(clip)
+            latencies.append(time.perf_counter() - start)
+            correct.setdefault(str(snr_db), []).append(match.song_id == song_ids[song])
+
+        return {
+            "params": params._asdict(),
+            "fingerprints_per_audio_second": fingerprints / audio_seconds,
+            "extract_seconds_per_audio_second": extract_seconds / audio_seconds,
+            "db_bytes_per_song": (database_bytes(db) - empty_bytes) / len(catalog),
+            "latency": summarize(latencies),
+            "top1_accuracy": float(np.mean([c for per_snr in correct.values() for c in per_snr])),
+            "top1_accuracy_by_snr": {snr: float(np.mean(c)) for snr, c in correct.items()},
+        }
+    finally:
+        db.close()
+
+
+def objectives(result: Dict[str, Any]) -> Tuple[float, float, float]:
+    """Minimized objectives: bytes per song, p50 latency, error rate."""
+    return result["db_bytes_per_song"], result["latency"]["p50_ms"], 1.0 - result["top1_accuracy"]
+
+
+def pareto_front(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Results no other result matches or beats on every objective while beating on one."""
+    points = [objectives(r) for r in results]
+    front = []
+    for i, p in enumerate(points):
+        dominated = any(all(a <= b for a, b in zip(q, p)) and q != p for j, q in enumerate(points) if j != i)
+        if not dominated:
+            front.append(results[i])
+    return sorted(front, key=objectives)
+
+
+def pick_best(front: List[Dict[str, Any]], max_bytes: float | None, max_latency_ms: float | None):
+    """Most accurate Pareto configuration within the budget (smallest index on ties), or None."""
+    eligible = [r for r in front
+                if (max_bytes is None or r["db_bytes_per_song"] <= max_bytes)
+                and (max_latency_ms is None or r["latency"]["p50_ms"] <= max_latency_ms)]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (-r["top1_accuracy"], r["db_bytes_per_song"], r["latency"]["p50_ms"]))
+
+
+def describe(params: Dict[str, Any]) -> str:
+    """The fields of a configuration that differ from the defaults."""
+    defaults = ExtractionParams._field_defaults
+    changed = [f"{k}={v}" for k, v in params.items()
+               if (tuple(v) if isinstance(v, list) else v) != defaults[k]]
+    return " ".join(changed) or "defaults"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sweep extraction parameters and report the Pareto front.")
+    parser.add_argument("--param", type=parse_param, action="append", default=None,
+                        help="NAME=V1,V2,... to sweep (repeatable; tuple fields as 15:7). "
+                             f"Default: {DEFAULT_GRID}")
+    parser.add_argument("--include-defaults", action="store_true",
+                        help="Also evaluate the default parameters as a baseline")
+    parser.add_argument("--audio-dir", default=None, help="Catalog of local audio files (default: synthetic songs)")
+    parser.add_argument("--songs", type=int, default=20, help="Catalog size")
+    parser.add_argument("--song-seconds", type=float, default=30.0, help="Length of each synthetic song")
+    parser.add_argument("--clip-seconds", type=float, default=7.0, help="Length of each query clip")
+    parser.add_argument("--queries", type=int, default=30, help="Query clips per SNR")
+    parser.add_argument("--snr", type=parse_snr, nargs="+", default=[None, 10.0, 0.0],
+                        help="Query SNRs in dB ('none' for clean clips)")
+    parser.add_argument("--hash-mode", choices=HASH_MODES, default=HASH_MODE_SHA1)
+    parser.add_argument("--peak-background", choices=BACKGROUNDS, default=BACKGROUND_MEDIAN)
+    parser.add_argument("--analysis-rate", type=int, default=44100,
+                        help="Sample rate audio is resampled to before fingerprinting")
+    parser.add_argument("--top-k", type=int, default=10, help="Candidates verified per query")
+    parser.add_argument("--max-bytes-per-song", type=float, default=None, help="Budget for --best-params")
+    parser.add_argument("--max-latency-ms", type=float, default=None, help="p50 budget for --best-params")
+    parser.add_argument("--best-params", default=None,
+                        help="Write the most accurate Pareto configuration within budget to this JSON file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="sweep-results.json", help="JSON file to write")
+    args = parser.parse_args()
+
+    grid = dict(args.param) if args.param else DEFAULT_GRID
+    configs = grid_configs(grid)
+    if args.include_defaults and ExtractionParams() not in configs:
+        configs.insert(0, ExtractionParams())
+
+    rng = np.random.default_rng(args.seed)
+    catalog = load_catalog(args)
+    if not catalog:
+        parser.error(f"No audio files in {args.audio_dir}")
+    queries = make_queries(catalog, args, rng)
+    print(f"{len(configs)} configurations, {len(catalog)} songs, {len(queries)} queries")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, params in enumerate(configs, 1):
+            result = evaluate(params, catalog, queries, args, Path(tmp))
+            results.append(result)
+            print(f"[{i}/{len(configs)}] {describe(result['params'])}: "
+                  f"{result['fingerprints_per_audio_second']:.0f} fp/s, "
+                  f"{result['db_bytes_per_song'] / 1024:.0f} KiB/song, "
+                  f"p50={result['latency']['p50_ms']:.1f}ms, top1={result['top1_accuracy']:.3f}")
+
+    front = pareto_front(results)
+    print(f"\nPareto-optimal configurations ({len(front)}):")
+    for result in front:
+        print(f"  {result['db_bytes_per_song'] / 1024:8.0f} KiB/song  p50={result['latency']['p50_ms']:7.1f}ms  "
+              f"top1={result['top1_accuracy']:.3f}  {describe(result['params'])}")
+
+    best = pick_best(front, args.max_bytes_per_song, args.max_latency_ms)
+    if args.best_params:
+        if best is None:
+            print("No configuration fits the budget; --best-params not written.")
+        else:
+            with open(args.best_params, "w") as f:
+                json.dump(best["params"], f, indent=2)
+            print(f"Wrote {describe(best['params'])} to {args.best_params}")
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "args": {k: v for k, v in vars(args).items() if k != "param"},
+            "grid": grid,
+        },
+        "results": results,
+        "pareto": front,
+        "best": best,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ export default function Microphone() {
   const [youtubeUrl, setYoutubeUrl] = useState<string | null>(null); 
   const audioCtxRef = useRef<AudioContext | null>(null);
   const workletNodeRef = useRef<AudioWorkletNode | null>(null);
+  const wsRef = useRef<WebSocket | null>(null);
 
   const toggleMic = async () => {
     if (listening) {
@@ -26,49 +27,53 @@ export default function Microphone() {
       const audioWorkletNode = new AudioWorkletNode(audioCtx, "linear-pcm-processor");
       workletNodeRef.current = audioWorkletNode;
 
-      source.connect(audioWorkletNode);
+      // Stream chunks to the server as they are captured; it answers as soon as it is confident.
+      // The context runs at the device rate (often 48000 Hz); the server resamples from it.
+      const ws = new WebSocket(
+        `ws://localhost:5000/api/v1/audiodna/stream?sample_rate=${audioCtx.sampleRate}`
+      );
+      ws.binaryType = "arraybuffer";
+      wsRef.current = ws;
 
-      const chunkBuffer: Int16Array[] = [];
-
-      audioWorkletNode.port.onmessage = (e: MessageEvent<Int16Array>) => {
-        if (e.data && e.data.length > 0) {
-          chunkBuffer.push(e.data);
-        }
-      };
-
-      setListening(true);
-      console.log("Recording started for 10s...");
-
-      // Stop after 10s
-      setTimeout(async () => {
+      const finish = () => {
         audioWorkletNode.disconnect();
         source.disconnect();
-        audioCtx.close();
+        if (audioCtx.state !== "closed") {
+          audioCtx.close();
+        }
         setListening(false);
+      };
 
-        // merge
-        if (chunkBuffer.length > 0) {
-          const totalLength = chunkBuffer.reduce((sum, c) => sum + c.length, 0);
-          const merged = new Int16Array(totalLength);
-          let offset = 0;
-          chunkBuffer.forEach((c) => {
-            merged.set(c, offset);
-            offset += c.length;
-          });
-
-          // send
-          const blob = new Blob([merged.buffer], { type: "application/octet-stream" });
-          const res = await fetch("http://localhost:5000/api/v1/audiodna", {
-            method: "POST",
-            body: blob, 
-          });
+      ws.onmessage = (e: MessageEvent<string>) => {
+        const data = JSON.parse(e.data);
+        if (data.status === "listening") {
+          return;
+        }
+        console.log("🎶 Recognition result:", data);
+        clearTimeout(stopTimer);
+        finish();
 
-          const data = await res.json();
-          console.log("🎶 Recognition result:", data);
+        if (data.status === "ok" && data.youtube_url) {
+          setYoutubeUrl(data.youtube_url);
+        }
+      };
 
-          if (data.status === "ok" && data.youtube_url) {
-            setYoutubeUrl(data.youtube_url);
+      ws.onopen = () => {
+        audioWorkletNode.port.onmessage = (e: MessageEvent<Int16Array>) => {
+          if (e.data && e.data.length > 0 && ws.readyState === WebSocket.OPEN) {
+            ws.send(e.data.slice().buffer);
           }
+        };
+        source.connect(audioWorkletNode);
+        setListening(true);
+        console.log("Streaming started (up to 10s)...");
+      };
+
+      // Give up after 10s and ask the server for its best guess
+      const stopTimer = setTimeout(() => {
+        finish();
+        if (ws.readyState === WebSocket.OPEN) {
+          ws.send("end");
         }
       }, 10000); // 10 seconds
 
@@ -84,6 +89,9 @@ export default function Microphone() {
     if (audioCtxRef.current) {
       audioCtxRef.current.close();
     }
+    if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+      wsRef.current.send("end");
+    }
     setListening(false);
     console.log("Recording stopped manually");
   };
@@ -102,7 +110,7 @@ export default function Microphone() {
       </button>
 
       <p className="mt-6 text-lg">
-        {listening ? "Recording 10s..." : "Tap to Start"}
+        {listening ? "Listening..." : "Tap to Start"}
       </p>
 
       {youtubeUrl && (
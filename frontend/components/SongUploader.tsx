@@ -5,14 +5,22 @@ import { Button } from "@/components/ui/button"
 import { Input } from "@/components/ui/input"
 import { toast } from "sonner"
 
+const API_URL = "http://localhost:5000/api/v1"
+const POLL_INTERVAL_MS = 1500
+
 export default function SongUploader() {
   const [url, setUrl] = useState("")
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
 
+    const toastId = toast.loading("Uploading song...", {
+      className: "text-black dark:text-white",
+    })
+
     try {
-      const res = await fetch("http://localhost:5000/api/v1/get-song-info", {
+      // Ingestion runs as a background job on the server; poll it until it finishes.
+      const res = await fetch(`${API_URL}/get-song-info`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -20,22 +28,37 @@ export default function SongUploader() {
         body: JSON.stringify({ url }),
       })
 
-      const data = await res.json()
+      let job = await res.json()
+      if (!res.ok) {
+        throw new Error(job.detail || "Something went wrong.")
+      }
+
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS))
+        const poll = await fetch(`${API_URL}/get-song-info/${job.job_id}`)
+        job = await poll.json()
+        if (!poll.ok) {
+          throw new Error(job.detail || "Something went wrong.")
+        }
+      }
 
-      if (data.status === "ok") {
+      if (job.status === "done") {
         toast.success("✅ Song Uploaded", {
-          description: `${data.song} by ${data.artists.join(", ")}`,
+          id: toastId,
+          description: `${job.result.song} by ${job.result.artists.join(", ")}`,
           className: "text-black dark:text-white",
         })
       } else {
         toast.error("❌ Upload Failed", {
-          description: data.message || "Something went wrong.",
+          id: toastId,
+          description: job.error || "Something went wrong.",
           className: "text-black dark:text-white",
         })
       }
     } catch (err) {
       toast.error("❌ Upload Failed", {
-        description: String(err),
+        id: toastId,
+        description: err instanceof Error ? err.message : String(err),
         className: "text-black dark:text-white",
       })
     }
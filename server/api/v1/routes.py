@@ -1,18 +1,36 @@
-from fastapi import APIRouter, HTTPException, Request
-from server.service.spotify_service import audiodna_endpoint, add_song_to_db, SpotifyLink
+from fastapi import APIRouter, HTTPException, Request, WebSocket
+from audio_fingerprint.metrics import metrics
+from server.service.recognition_service import audiodna_endpoint, audiodna_stream_endpoint
+from server.service.spotify_service import SpotifyLink
 
 router = APIRouter()
 
 @router.post("/audiodna")
 async def audio_recognizer(req: Request):
     try:
-        return await audiodna_endpoint(req)
+        # End-to-end latency, including time spent waiting for a recognition worker.
+        with metrics.timer("request"):
+            return await audiodna_endpoint(req)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/get-song-info")
-def song_info(link: SpotifyLink):
-    try:
-        return add_song_to_db(link.url)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+@router.websocket("/audiodna/stream")
+async def audio_recognizer_stream(websocket: WebSocket):
+    await audiodna_stream_endpoint(websocket)
+
+@router.post("/get-song-info", status_code=202)
+def song_info(link: SpotifyLink, req: Request):
+    """
+    Queue ingestion of a Spotify track and return its job right away. Poll
+    /get-song-info/{job_id} until its status is "done" or "failed".
+    """
+    return req.app.state.ingest_queue.submit(link.url).to_dict()
+
+@router.get("/get-song-info/{job_id}")
+def song_info_status(job_id: str, req: Request):
+    job = req.app.state.ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id")
+    return job.to_dict()
@@ -1 +1,85 @@
+from typing import Any, Dict
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from audio_fingerprint.fingerprint_extracter import ExtractionParams
 
+
+class ServerSettings(BaseSettings):
+    """
+    Runtime settings of the API server, read from AUDIODNA_* environment variables
+    or server/.env.
+    """
+    # A single-file catalog; sharded and segmented catalog directories are only
+    # supported by the command-line tools.
+    db_path: str = "music.db"
+    log_level: str = "INFO"
+    # Collect per-stage timings and counters and serve them on /metrics. With the "process"
+    # recognition executor, stages that run in the worker processes are not included.
+    metrics_enabled: bool = True
+    # Serve recognition lookups from an in-memory copy of the fingerprint index.
+    in_memory_index: bool = False
+    # Hashes found in more than stop_df songs are not stored for new songs and are ignored
+    # in queries; idf_weighting weights matching votes by hash rarity.
+    stop_df: int | None = None
+    idf_weighting: bool = False
+    # Candidate songs verified by offset alignment per query (unset: verify every song).
+    match_top_k: int | None = 10
+    # Rate audio is resampled to before fingerprinting. Lower rates are cheaper; the
+    # catalog must have been ingested at the same rate.
+    analysis_sample_rate: int = 44100
+    # JSON file of extraction parameters (see benchmarks.sweep); unset uses the defaults.
+    # Like the analysis rate, it must match the one the catalog was ingested with.
+    fingerprint_params: str | None = None
+    # Sample rate of the 16-bit PCM posted to /audiodna, unless the client passes a
+    # sample_rate query parameter.
+    pcm_sample_rate: int = 44100
+
+    # Recognition runs on a "thread" or "process" pool with this many workers; up to
+    # recognition_queue_size more requests wait for a slot, beyond that requests get 503.
+    recognition_executor: str = "thread"
+    recognition_workers: int = 4
+    recognition_queue_size: int = 16
+    # Prime recognition (filterbanks, FFT plans, lazy imports, index, worker processes)
+    # during startup instead of on the first request.
+    warm_up: bool = True
+    # Seconds allowed for a background YouTube search refreshing a song's stored URL.
+    youtube_timeout: float = 10.0
+    # Stored YouTube URLs older than this many seconds are refreshed in the background.
+    youtube_url_ttl: float = 30 * 24 * 3600
+    # Seconds before a failed or empty YouTube lookup of a song is retried.
+    youtube_retry_delay: float = 3600.0
+    # Every this many seconds, up to youtube_refresh_batch stale stored URLs are refreshed
+    # in the background (0 disables; URLs are then only refreshed when a song is recognized).
+    youtube_refresh_interval: float = 3600.0
+    youtube_refresh_batch: int = 100
+
+    # Song ingestion (/get-song-info) runs as background jobs on this many workers. Failed
+    # jobs are retried up to ingest_max_attempts times, waiting ingest_retry_delay seconds
+    # (doubling each time); finished jobs can be polled for ingest_job_ttl seconds.
+    ingest_workers: int = 2
+    ingest_max_attempts: int = 3
+    ingest_retry_delay: float = 5.0
+    ingest_job_ttl: float = 3600.0
+
+    # Streaming recognition (/audiodna/stream). stream_sample_rate is used when the
+    # client does not pass its capture rate as the sample_rate query parameter.
+    stream_sample_rate: int = 44100
+    stream_match_interval: float = 1.0
+    stream_min_duration: float = 2.0
+    stream_max_duration: float = 15.0
+    stream_confidence_threshold: float = 0.05
+    stream_min_score: int = 20
+
+    def recognizer_options(self) -> Dict[str, Any]:
+        """Keyword arguments for Recognizer."""
+        return {"idf_weighting": self.idf_weighting, "top_k": self.match_top_k,
+                "sample_rate": self.analysis_sample_rate, "params": self.extraction_params()}
+
+    def extraction_params(self) -> ExtractionParams | None:
+        return ExtractionParams.load(self.fingerprint_params) if self.fingerprint_params else None
+
+    model_config = SettingsConfigDict(
+            env_file="server/.env",
+            env_prefix="AUDIODNA_",
+            extra="ignore",
+            case_sensitive=False
+        )
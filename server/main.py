@@ -1,9 +1,100 @@
+import time
+
+# Start of the cold-start clock: module imports are part of startup time.
+_IMPORT_STARTED = time.perf_counter()
+
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import uvicorn
+from audio_fingerprint.database import Database, DatabasePool
+from audio_fingerprint.index import InMemoryIndex
+from audio_fingerprint.metrics import metrics
 from server.api.v1.routes import router
+from server.config.config import ServerSettings
+from server.service.ingest_jobs import IngestQueue
+from server.service.recognition_pool import RecognitionPool
+from server.service.spotify_service import add_song_to_db
+from server.service.youtube_cache import YouTubeUrlCache, YtDlpResolver
+
+logger = logging.getLogger(__name__)
+_IMPORTED = time.perf_counter()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Storage is opened once per worker and shared by all requests.
+    setup_started = time.perf_counter()
+    settings = ServerSettings()
+    app.state.settings = settings
+    logging.basicConfig(level=settings.log_level.upper())
+    app.state.db_pool = DatabasePool(settings.db_path, stop_df=settings.stop_df)
+    app.state.index = None
+    if settings.in_memory_index:
+        app.state.index = InMemoryIndex(
+            Database(settings.db_path, create_tables=False, check_same_thread=False, stop_df=settings.stop_df)
+        )
+    app.state.recognition_pool = RecognitionPool(
+        app.state.db_pool,
+        index=app.state.index,
+        kind=settings.recognition_executor,
+        workers=settings.recognition_workers,
+        max_queue=settings.recognition_queue_size,
+        recognizer_options=settings.recognizer_options(),
+    )
+    # Tests can set app.state.youtube_resolver (see tests/fakes.py) before startup.
+    resolver = getattr(app.state, "youtube_resolver", None) or YtDlpResolver(settings.youtube_timeout)
+    app.state.youtube_cache = YouTubeUrlCache(
+        app.state.db_pool, resolver, ttl=settings.youtube_url_ttl, timeout=settings.youtube_timeout,
+        retry_delay=settings.youtube_retry_delay,
+    )
+    if settings.youtube_refresh_interval > 0:
+        app.state.youtube_cache.start_refresh_loop(settings.youtube_refresh_interval,
+                                                   settings.youtube_refresh_batch)
+    # Likewise app.state.spotify_client and app.state.downloader (see tests/fakes.py)
+    # replace the real Spotify client and YouTube download.
+    spotify_client = getattr(app.state, "spotify_client", None)
+    downloader = getattr(app.state, "downloader", None)
+    params = settings.extraction_params()
+
+    def ingest(url: str):
+        return add_song_to_db(url, app.state.db_pool.get(), app.state.index,
+                              sample_rate=settings.analysis_sample_rate,
+                              spotify=spotify_client, downloader=downloader, params=params)
 
-app = FastAPI()
+    app.state.ingest_queue = IngestQueue(
+        ingest,
+        workers=settings.ingest_workers,
+        max_attempts=settings.ingest_max_attempts,
+        retry_delay=settings.ingest_retry_delay,
+        job_ttl=settings.ingest_job_ttl,
+    )
+
+    warm_up_started = time.perf_counter()
+    if settings.warm_up:
+        app.state.recognition_pool.warm_up()
+    ready = time.perf_counter()
+    # Enabled after warm-up so its timings do not count as requests.
+    if settings.metrics_enabled:
+        metrics.enable()
+        metrics.observe("startup", ready - setup_started)
+        metrics.observe("warm_up", ready - warm_up_started)
+    logger.info("Server ready: imports %.2fs, setup %.2fs, warm-up %.2fs",
+                _IMPORTED - _IMPORT_STARTED, warm_up_started - setup_started, ready - warm_up_started)
+    try:
+        yield
+    finally:
+        app.state.ingest_queue.close()
+        await app.state.youtube_cache.close()
+        app.state.recognition_pool.close()
+        if app.state.index is not None:
+            app.state.index.db.close()
+        app.state.db_pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS so React frontend can call the API
 app.add_middleware(
@@ -16,5 +107,11 @@ app.add_middleware(
 
 app.include_router(router, prefix="/api/v1", tags=["Spotify"])
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Stage latency histograms and counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run("server:app", host="0.0.0.0", port=5000, reload=True)
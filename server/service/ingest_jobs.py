@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Ingests one Spotify track URL and returns a JSON-able summary of the stored song.
+IngestFn = Callable[[str], Dict[str, Any]]
+# Downloads the audio for a search query to `output_path` (without extension) and
+# returns the path written and the URL of the video it came from.
+Downloader = Callable[[str, str], Tuple[str, Optional[str]]]
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def normalize_url(url: str) -> str:
+    """Identity of a track URL for deduplication: no surrounding spaces, query or fragment."""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), "", ""))
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether an ingest failure may succeed on a later attempt. Bad input (unknown
+    track, undecodable audio) is final; network and server errors are retried, as are
+    HTTP 429 responses from Spotify.
+    """
+    if isinstance(error, (LookupError, ValueError)):
+        return False
+    status = getattr(error, "http_status", None)
+    return not (status is not None and 400 <= status < 500 and status != 429)
+
+
+class IngestJob:
+    """State of one ingestion request, as reported by the status endpoint."""
+
+    def __init__(self, url: str) -> None:
+        self.job_id = uuid.uuid4().hex
+        self.url = url
+        self.status = JOB_QUEUED
+        self.attempts = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "url": self.url,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class IngestQueue:
+    """
+    Runs song ingestion (Spotify lookup, download, fingerprinting, DB writes) on a
+    local worker pool, off the request path.
+
+    `submit` returns a job immediately; while a job for the same track URL is queued or
+    running, submitting it again returns that job instead of starting a second download.
+    Failed attempts are retried up to `max_attempts` times with exponential backoff
+    when `is_retryable` allows it. Finished jobs stay queryable for `job_ttl` seconds.
+    """
+
+    def __init__(self, ingest: IngestFn, workers: int = 2, max_attempts: int = 3,
+                 retry_delay: float = 5.0, job_ttl: float = 3600.0) -> None:
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be >= 1")
+        self.ingest = ingest
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.job_ttl = job_ttl
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, IngestJob] = {}
+        self._in_flight: Dict[str, IngestJob] = {}
+        self._closed = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+
+    def submit(self, url: str) -> IngestJob:
+        key = normalize_url(url)
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("IngestQueue is closed")
+            self._prune()
+            job = self._in_flight.get(key)
+            if job is not None:
+                return job
+            job = IngestJob(url.strip())
+            self._jobs[job.job_id] = job
+            self._in_flight[key] = job
+        self._executor.submit(self._run, job, key)
+        logger.info("Queued ingest job %s for %s", job.job_id, job.url)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.job_ttl
+        for job_id in [j.job_id for j in self._jobs.values() if j.finished and j.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _update(self, job: IngestJob, **fields) -> None:
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = time.time()
+
+    def _run(self, job: IngestJob, key: str) -> None:
+        try:
+            while True:
+                self._update(job, status=JOB_RUNNING, attempts=job.attempts + 1)
+                try:
+                    result = self.ingest(job.url)
+                except Exception as e:
+                    retry = is_retryable(e) and job.attempts < self.max_attempts
+                    logger.warning("Ingest job %s attempt %d failed%s: %s", job.job_id, job.attempts,
+                                   ", retrying" if retry else "", e)
+                    if not retry:
+                        self._update(job, status=JOB_FAILED, error=str(e))
+                        return
+                    self._update(job, status=JOB_QUEUED, error=str(e))
+                    if self._closed.wait(self.retry_delay * 2 ** (job.attempts - 1)):
+                        self._update(job, status=JOB_FAILED, error="Server shutting down")
+                        return
+                    continue
+                self._update(job, status=JOB_DONE, result=result, error=None)
+                logger.info("Ingest job %s done: %s", job.job_id, result)
+                return
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def close(self) -> None:
+        """
+        Stop the workers: running attempts finish, jobs waiting to be retried or still
+        queued are marked failed.
+        """
+        self._closed.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        # Jobs whose worker was cancelled before it started never reach _run's cleanup.
+        with self._lock:
+            now = time.time()
+            for job in self._in_flight.values():
+                if not job.finished:
+                    job.status = JOB_FAILED
+                    job.error = "Server shutting down"
+                    job.updated_at = now
+            self._in_flight.clear()
+
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+import numpy as np
+from fastapi import HTTPException
+from audio_fingerprint.database import Database, DatabasePool
+from audio_fingerprint.index import InMemoryIndex
+from audio_fingerprint.matcher import Match
+from audio_fingerprint.recognizer import Recognizer
+from audio_fingerprint.streaming import StreamingRecognizer
+
+T = TypeVar("T")
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+
+# Per-process state of process-pool workers.
+_process_recognizer: Optional[Recognizer] = None
+
+
+def _init_process_worker(db_path: str, in_memory_index: bool, stop_df: Optional[int],
+                         recognizer_options: Dict[str, Any]) -> None:
+    global _process_recognizer
+    db = Database(db_path, create_tables=False, stop_df=stop_df)
+    _process_recognizer = Recognizer(db, index=InMemoryIndex(db) if in_memory_index else None,
+                                     **recognizer_options)
+    _process_recognizer.warm_up()
+
+
+def _ping() -> None:
+    pass
+
+
+def _recognize_in_process(audio: np.ndarray, sample_rate: Optional[int]) -> Match:
+    assert _process_recognizer is not None
+    if _process_recognizer.index is not None:
+        # Cheap when nothing changed; picks up songs ingested by the server process.
+        _process_recognizer.index.refresh()
+    return _process_recognizer.recognize(audio, sample_rate)
+
+
+class RecognitionPool:
+    """
+    Runs CPU-bound recognition off the event loop with bounded concurrency.
+
+    At most `workers` jobs run at once and at most `max_queue` more wait for a slot;
+    anything beyond that is rejected immediately with 503 so an overloaded worker sheds
+    load instead of letting latency grow without bound.
+
+    One-shot recognition runs on a thread pool (sharing the server's DatabasePool and
+    in-memory index) or on a process pool (each process opens its own catalog).
+    Stateful work such as streaming sessions always runs on the thread pool: `stream`
+    runs a session's feed()/finish() with the pool thread's recognizer, so sessions share
+    the pool's connections and index instead of opening their own.
+    """
+
+    def __init__(self, db_pool: DatabasePool, index: Optional[InMemoryIndex] = None,
+                 kind: str = EXECUTOR_THREAD, workers: int = 4, max_queue: int = 16,
+                 recognizer_options: Optional[Dict[str, Any]] = None) -> None:
+        if kind not in (EXECUTOR_THREAD, EXECUTOR_PROCESS):
+            raise ValueError(f"Unknown executor kind {kind!r}")
+        self.db_pool = db_pool
+        self.index = index
+        self.kind = kind
+        self.recognizer_options = recognizer_options or {}
+        self.capacity = workers + max_queue
+
+        self._pending = 0
+        self._local = threading.local()
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recognition")
+        self._processes: Optional[Executor] = None
+        if kind == EXECUTOR_PROCESS:
+            self._processes = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_process_worker,
+                initargs=(db_pool.db_name, index is not None, db_pool.stop_df, self.recognizer_options),
+            )
+
+    def warm_up(self) -> None:
+        """
+        Prepare recognition before the first request: prime a recognizer (mel filterbank,
+        FFT plans, lazy imports, index lookup path) in this process, and start the worker
+        processes of a process pool, which warm up their own recognizer.
+        """
+        Recognizer(self.db_pool.get(), index=self.index, **self.recognizer_options).warm_up()
+        if self._processes is not None:
+            self._processes.submit(_ping).result()
+
+    async def recognize(self, audio: np.ndarray, sample_rate: Optional[int] = None) -> Match:
+        """Recognize a clip; `sample_rate` is its rate if not the analysis rate."""
+        if self._processes is not None:
+            return await self._submit(self._processes, _recognize_in_process, audio, sample_rate)
+        return await self._submit(self._threads, self._recognize_in_thread, audio, sample_rate)
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """Run an arbitrary blocking call on the thread pool under the same admission limit."""
+        return await self._submit(self._threads, fn, *args)
+
+    async def stream(self, session: StreamingRecognizer, method: str, *args) -> Any:
+        """Call `method` ("feed" or "finish") of a streaming session on the thread pool."""
+        return await self._submit(self._threads, self._stream_in_thread, session, method, *args)
+
+    async def _submit(self, executor: Executor, fn: Callable[..., T], *args) -> T:
+        # The event loop is single-threaded, so this counter needs no lock.
+        if self._pending >= self.capacity:
+            raise HTTPException(status_code=503, detail="Recognition queue is full, retry later.")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    def recognizer(self) -> Recognizer:
+        """The calling thread's recognizer, on its DatabasePool connection and the shared index."""
+        recognizer = getattr(self._local, "recognizer", None)
+        if recognizer is None:
+            recognizer = Recognizer(self.db_pool.get(), index=self.index, **self.recognizer_options)
+            self._local.recognizer = recognizer
+        return recognizer
+
+    def _recognize_in_thread(self, audio: np.ndarray, sample_rate: Optional[int]) -> Match:
+        return self.recognizer().recognize(audio, sample_rate)
+
+    def _stream_in_thread(self, session: StreamingRecognizer, method: str, *args) -> Any:
+        # Calls of one session may land on different threads; each matches on its own connection.
+        session.recognizer = self.recognizer()
+        return getattr(session, method)(*args)
+
+    def close(self) -> None:
+        self._threads.shutdown(wait=True, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,138 @@
+import numpy as np
+from fastapi import HTTPException, Request, WebSocket, WebSocketDisconnect
+from starlette.datastructures import QueryParams
+from audio_fingerprint.streaming import StreamingRecognizer
+
+# Accepted range of client-declared capture rates.
+MIN_CLIENT_SAMPLE_RATE = 8000
+MAX_CLIENT_SAMPLE_RATE = 192000
+
+
+def client_sample_rate(query_params: QueryParams, default: int) -> int:
+    """
+    Rate of the PCM a client sends, from its `sample_rate` query parameter (browsers
+    capture at the device rate, usually 48000), or `default` if it did not send one.
+    """
+    value = query_params.get("sample_rate")
+    if value is None:
+        return default
+    try:
+        rate = int(float(value))
+    except ValueError:
+        raise ValueError(f"Invalid sample_rate {value!r}") from None
+    if not MIN_CLIENT_SAMPLE_RATE <= rate <= MAX_CLIENT_SAMPLE_RATE:
+        raise ValueError(f"sample_rate must be between {MIN_CLIENT_SAMPLE_RATE} and {MAX_CLIENT_SAMPLE_RATE}")
+    return rate
+
+
+async def audiodna_endpoint(request: Request):
+    try: 
+        try:
+            sample_rate = client_sample_rate(request.query_params, request.app.state.settings.pcm_sample_rate)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        body = await request.body()
+
+        pcm_data = np.frombuffer(body, dtype=np.int16)
+        
+        audio = pcm_data.astype(np.float32) / 32768.0
+
+        db = request.app.state.db_pool.get()
+        match = await request.app.state.recognition_pool.recognize(
+            audio, sample_rate=sample_rate)
+        song_id = match.song_id
+
+        if song_id is None:
+            return {"status": "error", "message": "Song could not be recognized."}
+
+        song = db.get_song_by_id(song_id)
+        youtube_url = request.app.state.youtube_cache.get(song)
+
+        return {
+                "status": "ok",
+                "song_id": song_id,
+                "confidence": match.confidence,
+                "score": match.score,
+                "offset": match.offset,
+                "youtube_url": youtube_url
+            }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    
+
+async def audiodna_stream_endpoint(websocket: WebSocket):
+    """
+    Streaming recognition over a WebSocket.
+
+    The client sends binary messages of 16-bit PCM as it is captured, and may send the
+    text message "end" when it stops recording. The capture rate is given as the
+    `sample_rate` query parameter (default AUDIODNA_STREAM_SAMPLE_RATE). The server answers with interim
+    {"status": "listening"} messages after each match attempt and one final "ok" or
+    "error" message, sent as soon as a match is confident, after which it closes.
+    """
+    await websocket.accept()
+    settings = websocket.app.state.settings
+    try:
+        sample_rate = client_sample_rate(websocket.query_params, settings.stream_sample_rate)
+    except ValueError as e:
+        await websocket.send_json({"status": "error", "message": str(e)})
+        await websocket.close(code=1003)  # Unsupported data
+        return
+    pool = websocket.app.state.recognition_pool
+    # feed() and finish() run through the pool (and its 503 admission limit) on the pool
+    # threads' recognizers, which share the DatabasePool connections and in-memory index.
+    stream = StreamingRecognizer(
+        pool.recognizer(),
+        sample_rate=sample_rate,
+        match_interval=settings.stream_match_interval,
+        min_duration=settings.stream_min_duration,
+        max_duration=settings.stream_max_duration,
+        confidence_threshold=settings.stream_confidence_threshold,
+        min_score=settings.stream_min_score,
+    )
+
+    try:
+        while not stream.done:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("text") == "end":
+                break
+            if message.get("bytes"):
+                pcm_data = np.frombuffer(message["bytes"], dtype=np.int16)
+                match = await pool.stream(stream, "feed", pcm_data.astype(np.float32) / 32768.0)
+                if match is not None and not stream.done:
+                    await websocket.send_json({
+                        "status": "listening",
+                        "elapsed": stream.elapsed,
+                        "song_id": match.song_id,
+                        "confidence": match.confidence,
+                    })
+
+        match = await pool.stream(stream, "finish")
+        if match.song_id is None or match.score < settings.stream_min_score:
+            await websocket.send_json({"status": "error", "message": "Song could not be recognized."})
+        else:
+            song = websocket.app.state.db_pool.get().get_song_by_id(match.song_id)
+            await websocket.send_json({
+                "status": "ok",
+                "song_id": match.song_id,
+                "confidence": match.confidence,
+                "score": match.score,
+                "offset": match.offset,
+                "elapsed": stream.elapsed,
+                "youtube_url": websocket.app.state.youtube_cache.get(song),
+            })
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        return
+    except HTTPException as e:
+        await websocket.send_json({"status": "error", "message": e.detail})
+        await websocket.close(code=1013)  # Try again later
+    except Exception as e:
+        await websocket.send_json({"status": "error", "message": str(e)})
+        await websocket.close()
@@ -1,15 +1,17 @@
 import os
 import re
-import numpy as np
-import spotipy
-import yt_dlp
-from fastapi import HTTPException, Request
-from spotipy.oauth2 import SpotifyClientCredentials 
+from functools import lru_cache
+from typing import Any, Dict, Tuple
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from audio_fingerprint.database import Database
-from audio_fingerprint.recognizer import Recognizer
+from audio_fingerprint.fingerprint_extracter import DEFAULT_SAMPLE_RATE, ExtractionParams
+from audio_fingerprint.index import InMemoryIndex
 from audio_fingerprint.song_uploader import UploadSong
+from server.service.ingest_jobs import Downloader
+
+# Song ingestion. spotipy and yt_dlp are imported, and the Spotify client is built, on
+# first use, so the recognition side of the server starts without them or credentials.
 
 
 class SpotifyLink(BaseModel):
@@ -25,86 +27,73 @@ class Settings(BaseSettings):
             case_sensitive=False
         )
 
-settings = Settings()  # type: ignore
-
-sp = spotipy.Spotify(
-    auth_manager=SpotifyClientCredentials(
-        client_id=settings.client_id,
-        client_secret=settings.client_secret,
-    )
-)
-
-async def audiodna_endpoint(request: Request):
-    try: 
-        body = await request.body()
-
-        pcm_data = np.frombuffer(body, dtype=np.int16)
-        
-        audio = pcm_data.astype(np.float32) / 32768.0
-
-        db = Database()
-        recognizer = Recognizer(db)
-        
-        song_id, score = recognizer.recognize(audio)
 
-        if song_id is None:
-            return {"status": "error", "message": "Song could not be recognized."}
+@lru_cache(maxsize=None)
+def get_spotify_client():
+    """The shared spotipy client, built from CLIENT_ID / CLIENT_SECRET on first call."""
+    import spotipy
+    from spotipy.oauth2 import SpotifyClientCredentials
 
-        song = db.get_song_by_id(song_id)  # You must implement this
-        song_name = song["name"]
-        artists = song["artists"]
+    settings = Settings()  # type: ignore
+    return spotipy.Spotify(
+        auth_manager=SpotifyClientCredentials(
+            client_id=settings.client_id,
+            client_secret=settings.client_secret,
+        )
+    )
 
-        youtube_url = get_youtube_url(f"{song_name} {artists}")
 
-        return {
-                "status": "ok",
-                "song_id": song_id,
-                "confidence": score,
-                "youtube_url": youtube_url
-            }
-    
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
-    
-
-def add_song_to_db(link: str):
-    try:
-        track = sp.track(link)
-        if not track:
-            raise HTTPException(status_code=404, detail="Track not found or invalid Spotify URL")
-        
-        db = Database()
+def add_song_to_db(link: str, db: Database, index: InMemoryIndex | None = None,
+                   sample_rate: int = DEFAULT_SAMPLE_RATE, spotify: Any = None,
+                   downloader: Downloader | None = None,
+                   params: ExtractionParams | None = None) -> Dict[str, Any]:
+    """
+    Look a track up on Spotify, download its audio from YouTube and fingerprint it into `db`.
 
-        song_name = track.get("name")
-        artists = [artist["name"] for artist in track.get("artists", [])]
+    `spotify` (anything with a spotipy-style `track(url)`) and `downloader` default to the
+    real Spotify client and `download_song_from_yt`; tests pass local fakes instead.
+    Raises LookupError when the link does not resolve to a track.
+    """
+    spotify = spotify if spotify is not None else get_spotify_client()
+    downloader = downloader or download_song_from_yt
 
-        artists_str = ", ".join(artists)
+    track = spotify.track(link)
+    if not track:
+        raise LookupError("Track not found or invalid Spotify URL")
 
-        query = f"{song_name} {artists_str}"
+    song_name = track.get("name")
+    artists = [artist["name"] for artist in track.get("artists", [])]
 
-        filename = f"{sanitize_filename(artists_str)} - {sanitize_filename(song_name)}"
-        filepath = os.path.join("downloads", filename)
+    artists_str = ", ".join(artists)
 
-        final_filepath = download_song_from_yt(query, output_path=filepath)
+    query = f"{song_name} {artists_str}"
 
-        upload = UploadSong(db)
-        upload.upload_new_song(final_filepath, song_name, artists)
+    filename = f"{sanitize_filename(artists_str)} - {sanitize_filename(song_name)}"
+    filepath = os.path.join("downloads", filename)
 
-        if os.path.exists(final_filepath): 
+    final_filepath, youtube_url = downloader(query, filepath)
+    try:
+        upload = UploadSong(db, sample_rate=sample_rate, params=params)
+        song_id = upload.upload_new_song(final_filepath, song_name, artists, youtube_url=youtube_url)
+    finally:
+        if os.path.exists(final_filepath):
             os.remove(final_filepath)
 
+    if index is not None:
+        index.refresh()
 
-        return {"status": "ok", "song": song_name, "artists": artists}
-
-    except Exception as e:
-        print("Error in add_song_to_db:", e)  # <-- debug log
-        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "ok", "song_id": song_id, "song": song_name, "artists": artists}
 
 def sanitize_filename(name: str):
     # Remove invalid characters for Windows/Linux/macOS
     return re.sub(r'[\\/*?:"<>|]', "", name)
 
-def download_song_from_yt(query: str, output_path="downloads/%(title)s.%(ext)s") -> str:
+def download_song_from_yt(query: str, output_path="downloads/%(title)s.%(ext)s") -> Tuple[str, str | None]:
+    """
+    Download the first YouTube result for `query` as mp3.
+
+    Returns the path of the file and the URL of the video it came from.
+    """
     ydl_opts = {
         'format': 'bestaudio/best',
         'outtmpl': output_path,
@@ -118,14 +107,19 @@ def download_song_from_yt(query: str, output_path="downloads/%(title)s.%(ext)s")
         'noplaylist': True,
     }
     
+    import yt_dlp
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         # ytsearch1: limits to first search result
-        ydl.download([f"ytsearch1:{query}"])
+        result = ydl.extract_info(f"ytsearch1:{query}", download=True)
+
+    youtube_url = None
+    if result and isinstance(result, dict) and result.get("entries"):
+        youtube_url = f"https://www.youtube.com/watch?v={result['entries'][0]['id']}"
 
     final_path = output_path + ".mp3"
-    return final_path
+    return final_path, youtube_url
 
-def get_youtube_url(query: str) -> str | None:
+def get_youtube_url(query: str, socket_timeout: float | None = None) -> str | None:
     """
     Search YouTube for a song using yt_dlp and return the first video URL.
     """
@@ -134,7 +128,10 @@ def get_youtube_url(query: str) -> str | None:
         "skip_download": True,
         "extract_flat": "in_playlist",  # Only extract metadata
     }
+    if socket_timeout is not None:
+        ydl_opts["socket_timeout"] = socket_timeout
 
+    import yt_dlp
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         result = ydl.extract_info(f"ytsearch1:{query}", download=False)
         if result and isinstance(result, dict) and "entries" in result and len(result["entries"]) > 0:
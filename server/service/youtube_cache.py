@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Set
+from audio_fingerprint.database import DatabasePool
+
+logger = logging.getLogger(__name__)
+
+# Resolves a search query ("Title Artist1, Artist2") to a video URL, or None.
+Resolver = Callable[[str], Optional[str]]
+
+
+class YtDlpResolver:
+    """Resolves queries with a yt-dlp `ytsearch1:` search (blocking; run it off the event loop)."""
+
+    def __init__(self, socket_timeout: float | None = None) -> None:
+        self.socket_timeout = socket_timeout
+
+    def __call__(self, query: str) -> Optional[str]:
+        # Imported here so the cache can be used (e.g. with a test resolver) without the Spotify service.
+        from server.service.spotify_service import get_youtube_url
+        return get_youtube_url(query, socket_timeout=self.socket_timeout)
+
+
+def song_query(song: Dict[str, Any]) -> str:
+    """The search query used for a song, the same one ingestion downloads with."""
+    artists = song["artists"]
+    if isinstance(artists, str):
+        artists = json.loads(artists)
+    return f"{song['name']} {', '.join(artists)}"
+
+
+class YouTubeUrlCache:
+    """
+    Serves song → YouTube URL from the `songs` table.
+
+    URLs are stored when a song is ingested, so recognition answers with no external
+    search. A URL that is missing (rows ingested before URLs were recorded) or older
+    than `ttl` seconds is returned as-is while a lookup bounded by `timeout` refreshes
+    the row in the background, once per song at a time. A failed or empty lookup leaves
+    the row as it was and is retried after `retry_delay` seconds, not after a full `ttl`.
+
+    `start_refresh_loop` additionally re-resolves stale rows in batches every
+    `refresh_interval` seconds, so songs that are never recognized also stay fresh.
+    """
+
+    def __init__(self, db_pool: DatabasePool, resolver: Resolver,
+                 ttl: float = 30 * 24 * 3600, timeout: float = 10.0,
+                 retry_delay: float = 3600.0) -> None:
+        self.db_pool = db_pool
+        self.resolver = resolver
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self._refreshing: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def get(self, song: Dict[str, Any]) -> Optional[str]:
+        """
+        The stored URL of a song (a row from Database.get_song_by_id); schedules a
+        refresh if it is missing or expired. Must be called from the event loop.
+        """
+        if self._is_stale(song):
+            self._refresh_in_background(song)
+        return song.get("youtube_url")
+
+    def _is_stale(self, song: Dict[str, Any]) -> bool:
+        now = time.time()
+        updated_at = song.get("youtube_url_updated_at")
+        retry_at = song.get("youtube_url_retry_at")
+        expired = updated_at is None or now - updated_at >= self.ttl
+        return expired and (retry_at is None or now >= retry_at)
+
+    async def _resolve(self, song: Dict[str, Any]) -> Optional[str]:
+        song_id = song["song_id"]
+        try:
+            url = await asyncio.wait_for(asyncio.to_thread(self.resolver, song_query(song)), self.timeout)
+        except Exception as e:
+            logger.warning("YouTube lookup for song %s failed: %s", song_id, e)
+            url = None
+        if url is None:
+            await asyncio.to_thread(self._defer, song_id)
+            return song.get("youtube_url")
+        await asyncio.to_thread(self._store, song_id, url)
+        return url
+
+    def _store(self, song_id: int, url: str) -> None:
+        self.db_pool.get().set_youtube_url(song_id, url)
+
+    def _defer(self, song_id: int) -> None:
+        self.db_pool.get().defer_youtube_lookup(song_id, time.time() + self.retry_delay)
+
+    def _refresh_in_background(self, song: Dict[str, Any]) -> None:
+        song_id = song["song_id"]
+        if song_id in self._refreshing:
+            return
+        self._refreshing.add(song_id)
+        self._spawn(self._resolve(song), lambda: self._refreshing.discard(song_id))
+
+    def _spawn(self, coro, on_done=None) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+
+        def done(t: asyncio.Task) -> None:
+            self._tasks.discard(t)
+            if on_done is not None:
+                on_done()
+        task.add_done_callback(done)
+        return task
+
+    async def refresh_stale(self, limit: int = 100) -> int:
+        """
+        Re-resolve up to `limit` missing or expired URLs, oldest first, skipping songs
+        already being refreshed. Returns how many were tried.
+        """
+        songs = await asyncio.to_thread(lambda: self.db_pool.get().get_stale_youtube_urls(self.ttl, limit))
+        tried = 0
+        for song in songs:
+            song_id = song["song_id"]
+            if song_id in self._refreshing:
+                continue
+            self._refreshing.add(song_id)
+            try:
+                await self._resolve(song)
+            finally:
+                self._refreshing.discard(song_id)
+            tried += 1
+        return tried
+
+    def start_refresh_loop(self, interval: float, limit: int = 100) -> None:
+        """Run refresh_stale every `interval` seconds until close(). Must be called from the event loop."""
+        async def loop() -> None:
+            while True:
+                try:
+                    tried = await self.refresh_stale(limit)
+                    if tried:
+                        logger.info("Refreshed %d stale YouTube URLs", tried)
+                except Exception as e:
+                    logger.warning("Stale YouTube URL refresh failed: %s", e)
+                await asyncio.sleep(interval)
+        self._spawn(loop())
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,59 @@
+from typing import Dict, List, Tuple
+import numpy as np
+import pytest
+from audio_fingerprint.fingerprint import HASH_MODE_PACKED, HASH_MODE_SHA1
+from audio_fingerprint.fingerprint_extracter import FingerprintExtracter
+from audio_fingerprint.peaks import BACKGROUND_FAST
+from benchmarks.synthetic import synth_song
+
+SAMPLE_RATE = 44100
+N_SONGS = 6
+SONG_SECONDS = 12.0
+
+_cache: Dict[Tuple[str, str], List] = {}
+
+
+def song_audio(seed: int) -> np.ndarray:
+    return synth_song(seed, SONG_SECONDS, SAMPLE_RATE)
+
+
+def clip(seed: int, start: float = 3.0, seconds: float = 6.0) -> np.ndarray:
+    """An excerpt of catalog song `seed`."""
+    return song_audio(seed)[int(start * SAMPLE_RATE):int((start + seconds) * SAMPLE_RATE)]
+
+
+def extracter(hash_mode: str) -> FingerprintExtracter:
+    # The fast background keeps the suite quick; matching does not depend on which one is used.
+    return FingerprintExtracter(hash_mode=hash_mode, peak_background=BACKGROUND_FAST)
+
+
+def song_fingerprints(hash_mode: str) -> List[Tuple[str, np.ndarray]]:
+    """(name, fingerprints) of the synthetic test songs, computed once per hash mode."""
+    if ("songs", hash_mode) not in _cache:
+        ex = extracter(hash_mode)
+        _cache["songs", hash_mode] = [(f"song-{seed}", ex.from_pcm(song_audio(seed))) for seed in range(N_SONGS)]
+    return _cache["songs", hash_mode]
+
+
+def clip_fingerprints(hash_mode: str) -> List[np.ndarray]:
+    """Fingerprints of one excerpt of every test song (clip(i) for song i)."""
+    if ("clips", hash_mode) not in _cache:
+        ex = extracter(hash_mode)
+        _cache["clips", hash_mode] = [ex.from_pcm(clip(seed)) for seed in range(N_SONGS)]
+    return _cache["clips", hash_mode]
+
+
+def fill_catalog(db, hash_mode: str) -> List[int]:
+    """Store the test songs in `db` (song i is seed i) and return their song ids."""
+    song_ids = []
+    with db.transaction():
+        for name, fingerprints in song_fingerprints(hash_mode):
+            song_id = db.add_song(name, ["Test Artist"])
+            db.add_fingerprints(fingerprints, song_id)
+            song_ids.append(song_id)
+    return song_ids
+
+
+@pytest.fixture(params=[HASH_MODE_SHA1, HASH_MODE_PACKED])
+def hash_mode(request) -> str:
+    return request.param
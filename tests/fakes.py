@@ -0,0 +1,59 @@
+import hashlib
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from server.service.ingest_jobs import normalize_url
+
+
+class FakeSpotifyClient:
+    """
+    Spotify client for tests: `track(url)` answers from a fixed mapping of track URLs
+    to Spotify-style track dicts ({"name": ..., "artists": [{"name": ...}]}).
+    """
+
+    def __init__(self, tracks: Dict[str, Dict[str, Any]]) -> None:
+        self.tracks = {normalize_url(url): track for url, track in tracks.items()}
+        self.calls: list = []
+
+    def track(self, url: str) -> Optional[Dict[str, Any]]:
+        self.calls.append(url)
+        return self.tracks.get(normalize_url(url))
+
+
+class FakeDownloader:
+    """
+    Downloader for tests: copies a local audio file chosen by search query instead of
+    downloading, and records every query. Queries not in `files` fail with LookupError.
+    """
+
+    def __init__(self, files: Dict[str, str]) -> None:
+        self.files = files
+        self.calls: list = []
+
+    def __call__(self, query: str, output_path: str) -> Tuple[str, Optional[str]]:
+        self.calls.append(query)
+        source = self.files.get(query)
+        if source is None:
+            raise LookupError(f"No audio found for {query!r}")
+        target = output_path + Path(source).suffix
+        Path(target).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, target)
+        return target, f"https://www.youtube.com/watch?v=fake-{uuid.uuid5(uuid.NAMESPACE_URL, query).hex[:11]}"
+
+
+class FakeResolver:
+    """
+    Resolver for tests: answers from a fixed mapping (or a URL derived from the query)
+    and records every query it was asked, without touching the network.
+    """
+
+    def __init__(self, urls: Dict[str, Optional[str]] | None = None) -> None:
+        self.urls = urls
+        self.calls: list = []
+
+    def __call__(self, query: str) -> Optional[str]:
+        self.calls.append(query)
+        if self.urls is not None:
+            return self.urls.get(query)
+        return f"https://www.youtube.com/watch?v={hashlib.md5(query.encode()).hexdigest()[:11]}"
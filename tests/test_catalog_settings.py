@@ -0,0 +1,73 @@
+import pytest
+from starlette.datastructures import QueryParams
+from audio_fingerprint.database import Database
+from audio_fingerprint.fingerprint_extracter import ExtractionParams
+from audio_fingerprint.peaks import BACKGROUND_FAST
+from audio_fingerprint.recognizer import Recognizer
+from audio_fingerprint.sharding import ShardedDatabase, reshard
+from audio_fingerprint.song_uploader import UploadSong
+from server.service.recognition_service import client_sample_rate
+from tests.conftest import fill_catalog
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "music.db"), hash_mode="packed")
+    yield db
+    db.close()
+
+
+def test_new_catalog_records_the_analysis_rate(db):
+    UploadSong(db, sample_rate=11025)
+    assert db.extraction_settings()["sample_rate"] == 11025
+    Recognizer(db, sample_rate=11025)
+    with pytest.raises(ValueError, match="sample_rate=11025"):
+        Recognizer(db)
+    with pytest.raises(ValueError, match="sample_rate=11025"):
+        UploadSong(db, sample_rate=22050)
+
+
+def test_new_catalog_records_the_extraction_params(db):
+    params = ExtractionParams(fanout_size=5, neighborhood_size=(11, 5))
+    UploadSong(db, params=params)
+    assert ExtractionParams.from_dict(db.extraction_settings()["params"]) == params
+    Recognizer(db, params=params, peak_background=BACKGROUND_FAST)
+    with pytest.raises(ValueError, match="params"):
+        Recognizer(db)
+
+
+def test_recognizer_uses_the_given_peak_background(db):
+    assert Recognizer(db, peak_background=BACKGROUND_FAST).extracter.peak_picker.background == BACKGROUND_FAST
+
+
+def test_recorded_rate_survives_reopen_and_reshard(tmp_path, db):
+    Recognizer(db, sample_rate=22050)
+    fill_catalog(db, "packed")
+    reopened = Database(db.db_name)
+    with pytest.raises(ValueError):
+        Recognizer(reopened)
+    reopened.close()
+
+    reshard(db.db_name, tmp_path / "sharded", 2)
+    sharded = ShardedDatabase(tmp_path / "sharded")
+    try:
+        assert sharded.extraction_settings() == db.extraction_settings()
+        with pytest.raises(ValueError):
+            Recognizer(sharded)
+    finally:
+        sharded.close()
+
+
+def test_catalog_filled_before_recording_is_not_checked(db):
+    fill_catalog(db, "packed")
+    Recognizer(db, sample_rate=11025)
+    Recognizer(db)
+    assert db.extraction_settings() == {}
+
+
+def test_client_sample_rate():
+    assert client_sample_rate(QueryParams(""), 44100) == 44100
+    assert client_sample_rate(QueryParams("sample_rate=48000"), 44100) == 48000
+    for bad in ("abc", "0", "1000000"):
+        with pytest.raises(ValueError):
+            client_sample_rate(QueryParams(f"sample_rate={bad}"), 44100)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from audio_fingerprint.database import Database
+from tests.conftest import fill_catalog, song_fingerprints
+
+
+@pytest.fixture
+def db(tmp_path, hash_mode):
+    db = Database(str(tmp_path / "music.db"), hash_mode=hash_mode)
+    yield db
+    db.close()
+
+
+def rows_of(blocks):
+    return [(h, s, t) for b in blocks
+            for h, s, t in zip(b.fingerprints["hash"].tolist(), b.song_ids.tolist(),
+                               b.fingerprints["anchor_time"].tolist())]
+
+
+def test_export_blocks_cover_the_table(db, hash_mode):
+    fill_catalog(db, hash_mode)
+    table = db.conn.execute("SELECT hash, song_id, anchor_time FROM fingerprints ORDER BY rowid").fetchall()
+    blocks = list(db.iter_fingerprints(block_size=1000))
+    assert all(len(b.song_ids) <= 1000 for b in blocks)
+    assert rows_of(blocks) == table
+
+
+def test_export_by_song_groups_each_song_once(db, hash_mode):
+    # Interleave two songs' rows so song_id order differs from rowid order.
+    first, second = (fps for _, fps in song_fingerprints(hash_mode)[:2])
+    a, b = db.add_song("a", ["x"]), db.add_song("b", ["x"])
+    db.add_fingerprints(first[:100], a)
+    db.add_fingerprints(second, b)
+    db.add_fingerprints(first[100:], a)
+
+    blocks = list(db.iter_fingerprints(block_size=64, by_song=True))
+    assert [b.song_ids[0] for b in blocks] == [a, b]
+    assert all(np.all(block.song_ids == block.song_ids[0]) for block in blocks)
+    assert blocks[0].fingerprints.tolist() == np.concatenate((first[:100], first[100:])).tolist()
+    assert blocks[1].fingerprints.tolist() == second.tolist()
+
+
+def test_song_index_is_built_by_the_first_by_song_export(db, hash_mode):
+    fill_catalog(db, hash_mode)
+    assert not db._has_index("idx_song_id")
+    list(db.iter_fingerprints(by_song=True))
+    assert db._has_index("idx_song_id")
+    plan = db.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT song_id, rowid, hash, song_id, anchor_time FROM fingerprints "
+        "WHERE (song_id, rowid) > (?, ?) ORDER BY song_id, rowid LIMIT ?", (0, 0, 10)).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert "idx_song_id" in details and "TEMP B-TREE" not in details
+
+
+def test_read_only_by_song_export_without_the_index(db, hash_mode):
+    fill_catalog(db, hash_mode)
+    readonly = Database(db.db_name, readonly=True)
+    try:
+        blocks = list(readonly.iter_fingerprints(block_size=100, by_song=True))
+        assert not readonly._has_index("idx_song_id")
+    finally:
+        readonly.close()
+    assert rows_of(blocks) == rows_of(db.iter_fingerprints(block_size=100, by_song=True))
+
+
+def test_rebuild_restores_the_song_index_only_if_it_was_built(db):
+    db.drop_hash_index()
+    db.create_hash_index()
+    assert db._has_index("idx_hash") and not db._has_index("idx_song_id")
+    db.create_song_index()
+    db.drop_hash_index()
+    assert not db._has_index("idx_hash") and not db._has_index("idx_song_id")
+    db.create_hash_index()
+    assert db._has_index("idx_hash") and db._has_index("idx_song_id")
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from audio_fingerprint.fingerprint import HASH_MODE_PACKED, Fingerprinter, pack_hash, sha1_hash
+from tests.conftest import extracter, song_audio
+
+
+def reference_fingerprints(fp: Fingerprinter, peaks: np.ndarray):
+    """The original per-anchor loop generate_fingerprints must reproduce exactly."""
+    peaks = peaks[peaks[:, 0].argsort()]
+    create_hash = pack_hash if fp.hash_mode == HASH_MODE_PACKED else sha1_hash
+    fingerprints = []
+    for i in range(len(peaks)):
+        anchor_time, anchor_freq, _ = peaks[i]
+        targets_found = 0
+        for j in range(i + 1, len(peaks)):
+            target_time, target_freq, _ = peaks[j]
+            dt = target_time - anchor_time
+            if dt > fp.target_t_max:
+                break
+            if fp.target_t_min <= dt <= fp.target_t_max and abs(target_freq - anchor_freq) <= fp.target_f_range:
+                fingerprints.append((create_hash(anchor_freq, target_freq, dt), int(anchor_time)))
+                targets_found += 1
+                if targets_found >= fp.fanout_size:
+                    break
+    return fingerprints
+
+
+def random_peaks(seed: int, n: int = 400) -> np.ndarray:
+    # Few distinct frames, so many peaks share a time index.
+    rng = np.random.default_rng(seed)
+    return np.column_stack((rng.integers(0, 300, n), rng.integers(0, 128, n), rng.random(n)))
+
+
+@pytest.mark.parametrize("options", [{}, {"fanout_size": 1}, {"target_t_min": 0, "target_t_max": 7},
+                                     {"target_f_range": 0, "fanout_size": 10}])
+def test_vectorized_pairs_match_the_reference_loop(hash_mode, options):
+    fp = Fingerprinter(hash_mode=hash_mode, **options)
+    for seed in range(3):
+        peaks = random_peaks(seed)
+        assert fp.generate_fingerprints(peaks).tolist() == reference_fingerprints(fp, peaks)
+
+
+def test_song_peaks_match_the_reference_loop(hash_mode):
+    ex = extracter(hash_mode)
+    peaks = ex.peak_picker.find_peaks(ex.log_mel(ex.stft.compute_stft(song_audio(0))))
+    fingerprints = ex.fingerprinter.generate_fingerprints(peaks)
+    assert len(fingerprints) > 500
+    assert fingerprints.tolist() == reference_fingerprints(ex.fingerprinter, peaks)
+
+
+def test_too_few_peaks_give_no_fingerprints(hash_mode):
+    fp = Fingerprinter(hash_mode=hash_mode)
+    assert fp.generate_fingerprints(np.array([[3, 10, 1.0]])).size == 0
+    assert fp.generate_fingerprints(np.array([[3, 10, 1.0], [3, 11, 1.0]])).size == 0
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from audio_fingerprint.database import Database
+from audio_fingerprint.index import InMemoryIndex
+from audio_fingerprint.recognizer import Recognizer
+from tests.conftest import N_SONGS, clip_fingerprints, fill_catalog, song_fingerprints
+
+
+def all_hashes(db):
+    return [h for (h,) in db.conn.execute("SELECT hash FROM hash_stats ORDER BY hash")]
+
+
+def assert_same_matches(db, index, hash_mode, **options):
+    for fps in clip_fingerprints(hash_mode):
+        expected = Recognizer(db, **options).matcher.match(fps)
+        got = Recognizer(db, index=index, **options).matcher.match(fps)
+        assert (got.song_id, got.score, got.offset) == (expected.song_id, expected.score, expected.offset)
+
+
+@pytest.mark.parametrize("stop_df", [None, 2])
+def test_index_matches_database(tmp_path, hash_mode, stop_df):
+    db = Database(str(tmp_path / "music.db"), hash_mode=hash_mode, stop_df=stop_df)
+    fill_catalog(db, hash_mode)
+    index = InMemoryIndex(db)
+
+    hashes = all_hashes(db)
+    expected_df = db.document_frequencies(hashes)
+    if stop_df is not None:
+        # The catalog has stop hashes, whose stored postings undercount their df.
+        assert expected_df.max() > stop_df
+    assert index.document_frequencies(hashes).tolist() == expected_df.tolist()
+    assert index.song_count() == db.song_count() == N_SONGS
+
+    query = np.unique(clip_fingerprints(hash_mode)[0]["hash"]).tolist()
+    got, expected = index.lookup(query), db.lookup(query)
+    assert sorted(zip(*(a.tolist() for a in got))) == sorted(zip(*(a.tolist() for a in expected)))
+
+    assert_same_matches(db, index, hash_mode, idf_weighting=True)
+    assert_same_matches(db, index, hash_mode, top_k=None)
+    db.close()
+
+
+def test_incremental_refresh_keeps_df_in_sync(tmp_path, hash_mode):
+    db = Database(str(tmp_path / "music.db"), hash_mode=hash_mode, stop_df=2)
+    songs = song_fingerprints(hash_mode)
+    with db.transaction():
+        for name, fps in songs[:2]:
+            db.add_fingerprints(fps, db.add_song(name, ["Test Artist"]))
+    index = InMemoryIndex(db)
+    with db.transaction():
+        for name, fps in songs[2:]:
+            db.add_fingerprints(fps, db.add_song(name, ["Test Artist"]))
+    assert index.refresh() > 0
+
+    hashes = all_hashes(db)
+    assert index.document_frequencies(hashes).tolist() == db.document_frequencies(hashes).tolist()
+    assert_same_matches(db, index, hash_mode, idf_weighting=True)
+    db.close()
+
+
+def assert_same_postings(index, db):
+    rebuilt = InMemoryIndex(db)._postings
+    for name in ("keys", "indptr", "song_ids", "anchor_times", "df", "songs"):
+        assert getattr(index._postings, name).tolist() == getattr(rebuilt, name).tolist(), name
+
+
+def test_refresh_merges_like_a_full_build(tmp_path, hash_mode):
+    db = Database(str(tmp_path / "music.db"), hash_mode=hash_mode, stop_df=3)
+    songs = song_fingerprints(hash_mode)
+    song_ids = [db.add_song(name, ["Test Artist"]) for name, _ in songs]
+    index = InMemoryIndex(db)
+
+    # One song at a time, the last one split across two refreshes.
+    for (_, fps), song_id in zip(songs[:-1], song_ids[:-1]):
+        db.add_fingerprints(fps, song_id)
+        assert index.refresh() > 0
+        assert_same_postings(index, db)
+    last = songs[-1][1]
+    db.add_fingerprints(last[:len(last) // 2], song_ids[-1])
+    index.refresh()
+    db.add_fingerprints(last[len(last) // 2:], song_ids[-1])
+    index.refresh()
+    assert_same_postings(index, db)
+
+    # Rows of an older song arriving late fall back to a rebuild.
+    late = songs[0][1][:100].copy()
+    late["anchor_time"] += 100_000
+    db.add_fingerprints(late, song_ids[0])
+    assert index.refresh() > 0
+    assert_same_postings(index, db)
+
+    hashes = all_hashes(db)
+    assert index.document_frequencies(hashes).tolist() == db.document_frequencies(hashes).tolist()
+    assert index.song_count() == N_SONGS
+    db.close()
@@ -0,0 +1,167 @@
+import threading
+import time
+import pytest
+import soundfile as sf
+from fastapi.testclient import TestClient
+from audio_fingerprint.database import Database
+from server.service.ingest_jobs import JOB_DONE, JOB_FAILED, IngestQueue, is_retryable
+from tests.conftest import SAMPLE_RATE, song_audio
+from tests.fakes import FakeDownloader, FakeResolver, FakeSpotifyClient
+
+TRACK_URL = "https://open.spotify.com/track/abc123"
+
+
+def wait_finished(job, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not job.finished:
+        assert time.monotonic() < deadline, f"job still {job.status}"
+        time.sleep(0.01)
+    return job
+
+
+class FlakyIngest:
+    """Fails with each of `errors` in turn, then succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, url):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"status": "ok", "url": url}
+
+
+class HttpError(Exception):
+    def __init__(self, http_status):
+        super().__init__(f"HTTP {http_status}")
+        self.http_status = http_status
+
+
+def test_in_flight_submissions_share_a_job():
+    release = threading.Event()
+    calls = []
+
+    def ingest(url):
+        calls.append(url)
+        release.wait(10)
+        return {"status": "ok"}
+
+    queue = IngestQueue(ingest, workers=2)
+    try:
+        job = queue.submit(TRACK_URL)
+        assert queue.submit(f" {TRACK_URL}/?si=xyz ") is job
+        release.set()
+        wait_finished(job)
+        assert job.status == JOB_DONE and calls == [TRACK_URL]
+
+        again = queue.submit(TRACK_URL)
+        assert again is not job
+        wait_finished(again)
+        assert len(calls) == 2
+    finally:
+        release.set()
+        queue.close()
+
+
+def test_retryable_failures_are_retried_with_backoff():
+    ingest = FlakyIngest(ConnectionError("reset"), HttpError(429))
+    queue = IngestQueue(ingest, max_attempts=3, retry_delay=0.05)
+    try:
+        start = time.monotonic()
+        job = wait_finished(queue.submit(TRACK_URL))
+        assert job.status == JOB_DONE and job.attempts == 3 and job.error is None
+        assert time.monotonic() - start >= 0.05 + 0.1  # delays double per attempt
+    finally:
+        queue.close()
+
+
+def test_retries_stop_after_max_attempts():
+    queue = IngestQueue(FlakyIngest(*[ConnectionError("down")] * 5), max_attempts=2, retry_delay=0.01)
+    try:
+        job = wait_finished(queue.submit(TRACK_URL))
+        assert job.status == JOB_FAILED and job.attempts == 2 and job.error == "down"
+    finally:
+        queue.close()
+
+
+@pytest.mark.parametrize("error", [LookupError("Track not found"), ValueError("bad audio"), HttpError(404)])
+def test_non_retryable_failures_fail_at_once(error):
+    assert not is_retryable(error)
+    ingest = FlakyIngest(error)
+    queue = IngestQueue(ingest, max_attempts=3, retry_delay=0.01)
+    try:
+        job = wait_finished(queue.submit(TRACK_URL))
+        assert job.status == JOB_FAILED and job.attempts == 1 and ingest.calls == 1
+    finally:
+        queue.close()
+
+
+def test_finished_jobs_expire_after_ttl():
+    queue = IngestQueue(FlakyIngest(), job_ttl=0.05)
+    try:
+        job = wait_finished(queue.submit(TRACK_URL))
+        assert queue.get(job.job_id) is job
+        time.sleep(0.1)
+        other = wait_finished(queue.submit("https://open.spotify.com/track/other"))
+        assert queue.get(job.job_id) is None
+        assert queue.get(other.job_id) is other
+    finally:
+        queue.close()
+
+
+def test_get_song_info_ingests_through_fakes(tmp_path, monkeypatch):
+    from server.main import app
+
+    sf.write(tmp_path / "song.wav", song_audio(0), SAMPLE_RATE)
+    spotify = FakeSpotifyClient({TRACK_URL: {"name": "Song", "artists": [{"name": "Artist"}]}})
+    downloader = FakeDownloader({"Song Artist": str(tmp_path / "song.wav")})
+    monkeypatch.chdir(tmp_path)  # ingestion downloads into ./downloads
+    for name, value in {"DB_PATH": str(tmp_path / "music.db"), "WARM_UP": "false",
+                        "METRICS_ENABLED": "false", "YOUTUBE_REFRESH_INTERVAL": "0"}.items():
+        monkeypatch.setenv(f"AUDIODNA_{name}", value)
+    for name, value in {"spotify_client": spotify, "downloader": downloader,
+                        "youtube_resolver": FakeResolver()}.items():
+        monkeypatch.setattr(app.state, name, value, raising=False)
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/get-song-info", json={"url": TRACK_URL})
+        assert response.status_code == 202
+        job = response.json()
+        deadline = time.monotonic() + 60
+        while job["status"] not in (JOB_DONE, JOB_FAILED):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+            job = client.get(f"/api/v1/get-song-info/{job['job_id']}").json()
+
+    assert job["status"] == JOB_DONE, job["error"]
+    assert job["result"]["song"] == "Song" and job["result"]["artists"] == ["Artist"]
+    assert spotify.calls == [TRACK_URL] and downloader.calls == ["Song Artist"]
+    db = Database(str(tmp_path / "music.db"))
+    try:
+        song = db.get_song_by_id(job["result"]["song_id"])
+        assert song["name"] == "Song" and song["youtube_url"].startswith("https://www.youtube.com/")
+        assert db.conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0] > 0
+    finally:
+        db.close()
+    assert not (tmp_path / "downloads" / "Artist - Song.wav").exists()
+
+
+def test_close_fails_jobs_that_never_ran():
+    release = threading.Event()
+
+    def ingest(url):
+        release.wait(10)
+        return {"status": "ok"}
+
+    queue = IngestQueue(ingest, workers=1)
+    running = queue.submit(TRACK_URL)
+    queued = queue.submit("https://open.spotify.com/track/other")
+    threading.Timer(0.1, release.set).start()
+    queue.close()
+    assert running.status == JOB_DONE
+    assert queued.status == JOB_FAILED and queued.error == "Server shutting down"
+    assert queue.get(queued.job_id) is queued
+    with pytest.raises(RuntimeError):
+        queue.submit(TRACK_URL)
@@ -0,0 +1,38 @@
+import hashlib
+import sqlite3
+from audio_fingerprint.database import Database
+from audio_fingerprint.migrate import migrate
+from tests.conftest import fill_catalog, song_fingerprints
+
+
+def file_digest(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_migrate_leaves_the_source_untouched_and_copies_every_song_column(tmp_path):
+    src_path, dst_path = tmp_path / "music.db", tmp_path / "packed.db"
+    src = Database(str(src_path), hash_mode="sha1")
+    song_ids = fill_catalog(src, "sha1")
+    src.set_youtube_url(song_ids[0], "https://www.youtube.com/watch?v=a")
+    src.defer_youtube_lookup(song_ids[1], retry_at=1234.5)
+    songs = src.conn.execute("SELECT * FROM songs ORDER BY song_id").fetchall()
+    src.close()
+    # An older catalog: no hash_stats, catalog_info or secondary indexes yet.
+    conn = sqlite3.connect(src_path)
+    conn.executescript("DROP TABLE hash_stats; DROP TABLE catalog_info; DROP INDEX IF EXISTS idx_song_id;")
+    conn.close()
+    before = file_digest(src_path)
+
+    report = migrate(str(src_path), str(dst_path), sample_size=20)
+
+    assert file_digest(src_path) == before
+    assert report["fingerprints_unmapped"] == 0
+    dst = Database(str(dst_path))
+    try:
+        assert dst.hash_mode == "packed"
+        assert dst.conn.execute("SELECT * FROM songs ORDER BY song_id").fetchall() == songs
+        n_rows = sum(len(fps) for _, fps in song_fingerprints("sha1"))
+        assert report["fingerprints_copied"] == n_rows
+        assert dst.conn.execute("SELECT MAX(df) FROM hash_stats").fetchone()[0] >= 1
+    finally:
+        dst.close()
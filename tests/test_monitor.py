@@ -0,0 +1,44 @@
+import json
+import sys
+import pytest
+import soundfile as sf
+from audio_fingerprint.database import Database
+from audio_fingerprint.fingerprint_extracter import ExtractionParams
+from audio_fingerprint.monitor import catalog_recognizer, main
+from audio_fingerprint.song_uploader import UploadSong
+from tests.conftest import SAMPLE_RATE, song_audio
+
+PARAMS = ExtractionParams(fanout_size=4, peaks_per_band=20)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """A catalog built with non-default extraction settings, holding song 0."""
+    sf.write(tmp_path / "song.wav", song_audio(0), SAMPLE_RATE)
+    db = Database(str(tmp_path / "music.db"), hash_mode="packed")
+    UploadSong(db, sample_rate=22050, params=PARAMS).upload_new_song(str(tmp_path / "song.wav"), "Song", ["A"])
+    db.close()
+    return tmp_path
+
+
+def test_recognizer_defaults_to_the_recorded_settings(catalog):
+    db = Database(str(catalog / "music.db"), readonly=True)
+    try:
+        recognizer = catalog_recognizer(db)
+        assert recognizer.extracter.sample_rate == 22050 and recognizer.extracter.params == PARAMS
+        with pytest.raises(ValueError):
+            catalog_recognizer(db, params=ExtractionParams())
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("with_params_file", [False, True])
+def test_cli_scans_a_catalog_built_with_custom_params(catalog, monkeypatch, capsys, with_params_file):
+    argv = ["monitor", str(catalog / "music.db"), str(catalog / "song.wav"), "--json"]
+    if with_params_file:
+        (catalog / "params.json").write_text(json.dumps(PARAMS._asdict()))
+        argv += ["--params", str(catalog / "params.json")]
+    monkeypatch.setattr(sys, "argv", argv)
+    main()
+    detections = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert detections and {d["song_id"] for d in detections} == {1}
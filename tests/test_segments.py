@@ -0,0 +1,129 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from audio_fingerprint.database import DatabasePool
+from audio_fingerprint.segments import SegmentedDatabase
+from audio_fingerprint.sharding import open_database
+from tests.conftest import N_SONGS, fill_catalog, song_fingerprints
+
+
+def all_hashes():
+    return np.unique(np.concatenate([fps["hash"] for _, fps in song_fingerprints("packed")])).tolist()
+
+
+def postings(db, hashes):
+    return sorted(zip(*(a.tolist() for a in db.lookup(hashes))))
+
+
+def test_second_writer_is_refused(tmp_path):
+    writer = SegmentedDatabase(tmp_path / "catalog", hash_mode="packed", compaction=False)
+    try:
+        with pytest.raises(RuntimeError, match="already open for writing"):
+            SegmentedDatabase(tmp_path / "catalog", compaction=False)
+        with pytest.raises(RuntimeError, match="already open for writing"):
+            open_database(tmp_path / "catalog", readonly=False)
+    finally:
+        writer.close()
+    SegmentedDatabase(tmp_path / "catalog", compaction=False).close()
+
+
+def test_open_database_reads_alongside_the_writer(tmp_path):
+    writer = SegmentedDatabase(tmp_path / "catalog", hash_mode="packed", compaction=False)
+    try:
+        song_ids = fill_catalog(writer, "packed")
+        writer.flush()
+        reader = open_database(tmp_path / "catalog")
+        try:
+            assert reader.readonly
+            hashes = song_fingerprints("packed")[0][1]["hash"].tolist()
+            _, found, _ = reader.lookup(hashes)
+            assert song_ids[0] in found.tolist()
+        finally:
+            reader.close()
+    finally:
+        writer.close()
+
+
+def test_server_pool_rejects_catalog_directories(tmp_path):
+    SegmentedDatabase(tmp_path / "catalog", compaction=False).close()
+    with pytest.raises(ValueError, match="command-line only"):
+        DatabasePool(str(tmp_path / "catalog"))
+
+
+def test_compaction_keeps_every_posting(tmp_path):
+    db = SegmentedDatabase(tmp_path / "catalog", hash_mode="packed", stop_df=3, compaction=False,
+                           write_segment_size=1, merge_factor=2)
+    try:
+        fill_catalog(db, "packed")
+        for name, fps in song_fingerprints("packed")[:2]:
+            db.add_fingerprints(fps, db.add_song(f"{name} (live)", ["Test Artist"]))
+        hashes = all_hashes()
+        expected, expected_df = postings(db, hashes), db.document_frequencies(hashes).tolist()
+        assert len(db.segment_sizes()) > 1
+
+        assert db.compact(full=True) == 1
+        assert len(db.segment_sizes()) == 1
+        # The merge drops the postings of hashes that became stop hashes after they were sealed.
+        stop = {hashes[i] for i in np.flatnonzero(np.asarray(expected_df) > 3)}
+        assert postings(db, hashes) == [p for p in expected if hashes[p[0]] not in stop]
+        assert db.document_frequencies(hashes).tolist() == expected_df
+    finally:
+        db.close()
+
+
+def test_unclean_close_replays_the_write_log(tmp_path):
+    writer = SegmentedDatabase(tmp_path / "catalog", hash_mode="packed", compaction=False)
+    fill_catalog(writer, "packed")
+    hashes = all_hashes()
+    expected = postings(writer, hashes)
+    # Crash: nothing sealed, and the last log record torn mid-write.
+    log_path = writer._log_path(writer._manifest["write_log"])
+    writer._log.write(b"\x93NUMPY")
+    writer._log.close()
+    writer.catalog.close()
+    writer._lock_file.close()
+    size = log_path.stat().st_size
+
+    db = SegmentedDatabase(tmp_path / "catalog", compaction=False)
+    try:
+        assert db.segment_sizes() == []
+        assert postings(db, hashes) == expected
+        assert log_path.stat().st_size == size - len(b"\x93NUMPY")
+        db.flush()
+        assert postings(db, hashes) == expected
+    finally:
+        db.close()
+
+
+def test_readers_see_committed_songs_before_they_are_sealed(tmp_path):
+    writer = SegmentedDatabase(tmp_path / "catalog", hash_mode="packed", compaction=False)
+    reader = SegmentedDatabase(tmp_path / "catalog", readonly=True)
+    try:
+        with pytest.raises(Exception, match="readonly"):
+            reader.catalog.add_song("Nope", ["Test Artist"])
+        song_ids = fill_catalog(writer, "packed")
+        hashes = all_hashes()
+        expected, expected_df = postings(writer, hashes), writer.document_frequencies(hashes).tolist()
+        assert writer.segment_sizes() == []
+        assert postings(reader, hashes) == expected
+        assert reader.song_count() == N_SONGS
+
+        # Another process, e.g. a recognition worker.
+        script = ("import sys; from audio_fingerprint.segments import SegmentedDatabase; "
+                  "from tests.test_segments import all_hashes; "
+                  "db = SegmentedDatabase(sys.argv[1], readonly=True); "
+                  "print(sorted(set(db.lookup(all_hashes())[1].tolist())))")
+        out = subprocess.run([sys.executable, "-c", script, str(tmp_path / "catalog")], check=True,
+                             capture_output=True, text=True, cwd=Path(__file__).parent.parent).stdout
+        assert out.strip() == str(sorted(song_ids))
+
+        # Once sealed, the postings come from the new segment instead, not from both.
+        writer.flush()
+        assert postings(reader, hashes) == expected
+        assert reader.document_frequencies(hashes).tolist() == expected_df
+    finally:
+        reader.close()
+        writer.close()
@@ -0,0 +1,108 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+import pytest
+from audio_fingerprint.database import Database
+from audio_fingerprint.recognizer import Recognizer
+from audio_fingerprint.sharding import ShardedDatabase, open_database, reshard
+from tests.conftest import N_SONGS, clip_fingerprints, fill_catalog, song_fingerprints
+
+
+def postings(query_idx, song_ids, anchor_times):
+    return sorted(zip(query_idx.tolist(), song_ids.tolist(), anchor_times.tolist()))
+
+
+def query_hashes(hash_mode):
+    """Distinct hashes of a few songs plus some that are not in the catalog."""
+    hashes = np.unique(np.concatenate([fps["hash"] for _, fps in song_fingerprints(hash_mode)[:3]]))
+    unknown = ["f" * 20, "0" * 20] if hash_mode == "sha1" else [2 ** 31 - 1, 0]
+    return hashes.tolist() + unknown
+
+
+def stats(db):
+    return sorted(db.conn.execute("SELECT hash, df FROM hash_stats").fetchall())
+
+
+@pytest.fixture
+def single(tmp_path, hash_mode):
+    db = Database(str(tmp_path / "single.db"), hash_mode=hash_mode)
+    fill_catalog(db, hash_mode)
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize("n_shards", [1, 3])
+def test_resharded_catalog_answers_like_the_single_file(tmp_path, single, hash_mode, n_shards):
+    reshard(single.db_name, tmp_path / "sharded", n_shards)
+    sharded = ShardedDatabase(tmp_path / "sharded")
+    try:
+        query = query_hashes(hash_mode)
+        assert postings(*sharded.lookup(query)) == postings(*single.lookup(query))
+        assert sharded.document_frequencies(query).tolist() == single.document_frequencies(query).tolist()
+        assert sharded.find_matches(query) == single.find_matches(query)
+
+        for backend in (single, sharded):
+            assert backend.song_count() == N_SONGS
+        expected = [Recognizer(single).matcher.match(fps) for fps in clip_fingerprints(hash_mode)]
+        got = [Recognizer(sharded).matcher.match(fps) for fps in clip_fingerprints(hash_mode)]
+        assert [m.song_id for m in got] == [m.song_id for m in expected] == list(range(1, N_SONGS + 1))
+        assert [(m.score, m.offset) for m in got] == [(m.score, m.offset) for m in expected]
+    finally:
+        sharded.close()
+
+
+def test_writes_route_to_owning_shards(tmp_path, single, hash_mode):
+    sharded = ShardedDatabase(tmp_path / "sharded", n_shards=4, hash_mode=hash_mode)
+    try:
+        fill_catalog(sharded, hash_mode)
+        assert sum(sharded.shard_sizes()) == single.conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+        query = query_hashes(hash_mode)
+        assert postings(*sharded.lookup(query)) == postings(*single.lookup(query))
+        assert sorted(sum((stats(shard) for shard in sharded.shards), [])) == stats(single)
+    finally:
+        sharded.close()
+
+
+def test_reshard_preserves_song_ids_and_hash_stats(tmp_path, hash_mode):
+    # With a stop-hash threshold the stored postings undercount df, so hash_stats must be copied.
+    source = Database(str(tmp_path / "source.db"), hash_mode=hash_mode, stop_df=1)
+    fill_catalog(source, hash_mode)
+    source.conn.execute("DELETE FROM songs WHERE song_id = 2")  # leave a gap in the ids
+    source.conn.commit()
+    songs = source.conn.execute("SELECT song_id, name, artists FROM songs ORDER BY song_id").fetchall()
+    assert max(df for _, df in stats(source)) > 1
+
+    reshard(source.db_name, tmp_path / "three", 3)
+    reshard(tmp_path / "three", tmp_path / "two", 2)
+    for directory in ("three", "two"):
+        sharded = ShardedDatabase(tmp_path / directory)
+        try:
+            assert sharded.catalog.conn.execute(
+                "SELECT song_id, name, artists FROM songs ORDER BY song_id").fetchall() == songs
+            assert sorted(sum((stats(shard) for shard in sharded.shards), [])) == stats(source)
+            rows = sorted(r for shard in sharded.shards
+                          for r in shard.conn.execute("SELECT hash, song_id, anchor_time FROM fingerprints"))
+            assert rows == sorted(source.conn.execute("SELECT hash, song_id, anchor_time FROM fingerprints"))
+        finally:
+            sharded.close()
+    source.close()
+
+
+def _lookup_in_worker(path, query):
+    db = open_database(path)
+    try:
+        return postings(*db.lookup(query)), db.document_frequencies(query).tolist()
+    finally:
+        db.close()
+
+
+def test_lookup_from_worker_processes(tmp_path, single, hash_mode):
+    reshard(single.db_name, tmp_path / "sharded", 3)
+    query = query_hashes(hash_mode)
+    chunks = [query[i::4] for i in range(4)]
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=2, mp_context=ctx) as pool:
+        results = list(pool.map(_lookup_in_worker, [str(tmp_path / "sharded")] * len(chunks), chunks))
+    for chunk, (got_postings, got_df) in zip(chunks, results):
+        assert got_postings == postings(*single.lookup(chunk))
+        assert got_df == single.document_frequencies(chunk).tolist()
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from audio_fingerprint.stft import STFT, StreamingSTFT
+
+
+def chunked(audio, sizes):
+    """Split `audio` into consecutive chunks cycling through `sizes` (the last may be short)."""
+    chunks, start, i = [], 0, 0
+    while start < audio.size:
+        chunks.append(audio[start:start + sizes[i % len(sizes)]])
+        start += sizes[i % len(sizes)]
+        i += 1
+    return chunks
+
+
+@pytest.mark.parametrize("fft_size, hop_size", [(2048, 512), (1024, 1024), (256, 300)])
+def test_streaming_stft_is_bit_identical_to_compute_stft(fft_size, hop_size):
+    audio = np.random.default_rng(0).standard_normal(20_000)
+    expected = STFT(fft_size, hop_size).compute_stft(audio)
+    chunkings = [[audio.size], [1], [7], [hop_size - 1], [hop_size + 1], [fft_size + 3],
+                 [100, 5000, 3, 2047, 1]]
+    for sizes in chunkings:
+        stream = StreamingSTFT(fft_size, hop_size)
+        spec = np.concatenate([stream.process(chunk) for chunk in chunked(audio, sizes)])
+        assert np.array_equal(spec, expected), sizes
+        assert stream.frames_emitted == expected.shape[0]
+
+
+def test_streaming_stft_reset_starts_a_new_signal():
+    audio = np.random.default_rng(1).standard_normal(5000)
+    stream = StreamingSTFT(512, 128)
+    stream.process(audio[:777])
+    stream.reset()
+    assert np.array_equal(stream.process(audio), STFT(512, 128).compute_stft(audio))
+
+
+def test_batch_matches_per_clip_stft():
+    stft = STFT(1024, 256)
+    rng = np.random.default_rng(2)
+    clips = [rng.standard_normal(n) for n in (5000, 500, 1024, 9000)]
+    spec, counts = stft.compute_stft_batch(clips)
+    expected = [stft.compute_stft(c) if c.size >= 1024 else np.empty((0, 513)) for c in clips]
+    assert counts == [e.shape[0] for e in expected]
+    assert np.array_equal(spec, np.concatenate(expected))
@@ -0,0 +1,22 @@
+import argparse
+from audio_fingerprint.database import Database
+from audio_fingerprint.fingerprint_extracter import ExtractionParams
+from audio_fingerprint.peaks import BACKGROUND_FAST
+from benchmarks.sweep import evaluate
+from tests.conftest import SAMPLE_RATE, clip, song_audio
+
+
+def test_evaluate_queries_with_the_swept_params(tmp_path):
+    params = ExtractionParams(fanout_size=5, peaks_per_band=20)
+    args = argparse.Namespace(hash_mode="packed", peak_background=BACKGROUND_FAST,
+                              analysis_rate=SAMPLE_RATE, top_k=10)
+    catalog = [(f"song-{seed}", song_audio(seed)) for seed in range(3)]
+    queries = [(seed, None, clip(seed)) for seed in range(3)]
+    result = evaluate(params, catalog, queries, args, tmp_path)
+    assert result["top1_accuracy"] == 1.0
+
+    db = Database(str(tmp_path / "sweep.db"))
+    try:
+        assert ExtractionParams.from_dict(db.extraction_settings()["params"]) == params
+    finally:
+        db.close()
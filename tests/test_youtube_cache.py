@@ -0,0 +1,123 @@
+import asyncio
+import time
+import pytest
+from audio_fingerprint.database import DatabasePool
+from server.service.youtube_cache import YouTubeUrlCache, song_query
+from tests.fakes import FakeResolver
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = DatabasePool(str(tmp_path / "music.db"))
+    yield pool
+    pool.close()
+
+
+def add_song(pool, name, youtube_url=None):
+    song_id = pool.get().add_song(name, ["Artist"], youtube_url=youtube_url)
+    return pool.get().get_song_by_id(song_id)
+
+
+class FailingResolver(FakeResolver):
+    def __call__(self, query):
+        super().__call__(query)
+        raise ConnectionError("network down")
+
+
+def test_missing_url_is_resolved_once_and_stored(pool):
+    resolver = FakeResolver()
+    cache = YouTubeUrlCache(pool, resolver)
+    song = add_song(pool, "Song")
+
+    async def body():
+        # Both requests find the URL missing; only one lookup runs.
+        assert cache.get(song) is None
+        assert cache.get(song) is None
+        await asyncio.gather(*cache._tasks)
+        await cache.close()
+
+    asyncio.run(body())
+    assert resolver.calls == [song_query(song)]
+    stored = pool.get().get_song_by_id(song["song_id"])
+    assert stored["youtube_url"] == resolver(song_query(song))
+    assert stored["youtube_url_updated_at"] is not None
+
+
+def test_fresh_url_is_not_refreshed_and_expired_one_is(pool):
+    resolver = FakeResolver()
+    cache = YouTubeUrlCache(pool, resolver, ttl=60)
+    song = add_song(pool, "Song", youtube_url="https://www.youtube.com/watch?v=old")
+
+    async def body():
+        assert cache.get(song) == "https://www.youtube.com/watch?v=old"
+        assert not cache._tasks
+        expired = dict(song, youtube_url_updated_at=time.time() - 61)
+        assert cache.get(expired) == "https://www.youtube.com/watch?v=old"
+        await asyncio.gather(*cache._tasks)
+        await cache.close()
+
+    asyncio.run(body())
+    assert len(resolver.calls) == 1
+    assert pool.get().get_song_by_id(song["song_id"])["youtube_url"] != "https://www.youtube.com/watch?v=old"
+
+
+@pytest.mark.parametrize("resolver", [FailingResolver(), FakeResolver(urls={})])
+def test_failed_lookup_backs_off_without_stamping(pool, resolver):
+    cache = YouTubeUrlCache(pool, resolver, retry_delay=600)
+    song = add_song(pool, "Song")
+
+    async def body():
+        cache.get(song)
+        await asyncio.gather(*cache._tasks)
+        deferred = pool.get().get_song_by_id(song["song_id"])
+        # Backing off: neither recognition nor the stale refresh retries it yet.
+        cache.get(deferred)
+        assert not cache._tasks
+        assert await cache.refresh_stale() == 0
+        await cache.close()
+        return deferred
+
+    deferred = asyncio.run(body())
+    assert len(resolver.calls) == 1
+    assert deferred["youtube_url"] is None
+    assert deferred["youtube_url_updated_at"] is None
+    assert deferred["youtube_url_retry_at"] > time.time() + 500
+
+
+def test_failed_lookup_is_retried_after_backoff(pool):
+    song = add_song(pool, "Song")
+    failing = YouTubeUrlCache(pool, FailingResolver(), retry_delay=0)
+    resolver = FakeResolver()
+    cache = YouTubeUrlCache(pool, resolver)
+
+    async def body():
+        failing.get(song)
+        await asyncio.gather(*failing._tasks)
+        cache.get(pool.get().get_song_by_id(song["song_id"]))
+        await asyncio.gather(*cache._tasks)
+        await cache.close()
+
+    asyncio.run(body())
+    assert resolver.calls == [song_query(song)]
+    stored = pool.get().get_song_by_id(song["song_id"])
+    assert stored["youtube_url"] is not None and stored["youtube_url_retry_at"] is None
+
+
+def test_refresh_loop_resolves_stale_rows(pool):
+    resolver = FakeResolver()
+    cache = YouTubeUrlCache(pool, resolver, ttl=60)
+    missing = add_song(pool, "Missing")
+    fresh = add_song(pool, "Fresh", youtube_url="https://www.youtube.com/watch?v=fresh")
+
+    async def body():
+        cache.start_refresh_loop(interval=3600)
+        for _ in range(100):
+            if pool.get().get_song_by_id(missing["song_id"])["youtube_url"]:
+                break
+            await asyncio.sleep(0.01)
+        await cache.close()
+
+    asyncio.run(body())
+    assert resolver.calls == [song_query(missing)]
+    assert pool.get().get_song_by_id(missing["song_id"])["youtube_url"] is not None
+    assert pool.get().get_song_by_id(fresh["song_id"])["youtube_url"] == "https://www.youtube.com/watch?v=fresh"